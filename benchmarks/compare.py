@@ -0,0 +1,54 @@
+"""Compares two result files written by run.py, step by step.
+
+Exits with status 1 if any step got slower (by median time) or used more memory than the
+threshold allows, so it can gate a change in CI.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+def load_results(path: Path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def get_change(old: float, new: float) -> float:
+    return (new - old) / old if old else 0.0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old", type=Path, help="Results from before the change")
+    parser.add_argument("new", type=Path, help="Results from after the change")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown or memory growth counted as a regression (default: 0.1)")
+    args = parser.parse_args()
+    old_report = load_results(args.old)
+    new_report = load_results(args.new)
+    if old_report["meta"].get("hash_algorithm", "sha256") != new_report["meta"].get("hash_algorithm", "sha256"):
+        print("warning: the repositories were created with different hash algorithms", file=sys.stderr)
+    if old_report["meta"]["params"] != new_report["meta"]["params"]:
+        print("warning: the results were measured on differently generated repositories", file=sys.stderr)
+
+    regressions = []
+    print(f"{'step':<24} {'old':>9} {'new':>9} {'change':>8} {'old RSS':>10} {'new RSS':>10}")
+    for step, new_result in new_report["results"].items():
+        old_result = old_report["results"].get(step)
+        if old_result is None:
+            print(f"{step:<24} {'':>9} {new_result['median_seconds']:>8.3f}s {'(new)':>8}")
+            continue
+        time_change = get_change(old_result["median_seconds"], new_result["median_seconds"])
+        rss_change = get_change(old_result["peak_rss_kb"], new_result["peak_rss_kb"])
+        flag = ""
+        if time_change > args.threshold or rss_change > args.threshold:
+            regressions.append(step)
+            flag = "  <- regression"
+        print(
+            f"{step:<24} {old_result['median_seconds']:>8.3f}s {new_result['median_seconds']:>8.3f}s {time_change:>+8.1%}"
+            f" {old_result['peak_rss_kb'] / 1024:>6.1f} MiB {new_result['peak_rss_kb'] / 1024:>6.1f} MiB{flag}"
+        )
+    if regressions:
+        print(f"\n{len(regressions)} step(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Deterministic synthetic history for benchmarks.
+
+The history is written as a fast-import stream, so the same output can build a pig repository
+(`pig fast-import`) or a git repository (`git fast-import`) for benchmarking `git-convert`.
+
+Shape of the generated history:
+- main starts with `file_count` files of about `file_size` bytes spread over directories under src/,
+  followed by `depth - 1` commits that each change `files_per_commit` of them by a few lines
+- `branches` side branches fork from random points of main; each adds and edits its own files under
+  branches/b<k>/, so merging them never conflicts
+- after a branch forks, each main commit merges one of the waiting branches with probability
+  `merge_density`; the last branch is never merged so there is always something left to merge
+"""
+import argparse
+import random
+import sys
+from dataclasses import dataclass, asdict
+from typing import BinaryIO
+
+BASE_TIMESTAMP = 1_600_000_000
+FILES_PER_DIRECTORY = 100
+LINE_WIDTH = 48
+
+@dataclass
+class RepoParams:
+    file_count: int = 200
+    file_size: int = 2048
+    depth: int = 100
+    branches: int = 4
+    merge_density: float = 0.1
+    files_per_commit: int = 5
+    seed: int = 0
+
+    def branch_depth(self) -> int:
+        return max(1, self.depth // 10)
+
+def get_source_path(index: int) -> str:
+    return f"src/d{index // FILES_PER_DIRECTORY:03d}/file{index:05d}.txt"
+
+def get_file_content(params: RepoParams, path: str, version: int) -> bytes:
+    # every version differs from the previous one in a handful of lines, like real edits
+    rng = random.Random(f"{params.seed}:{path}")
+    line_count = max(1, params.file_size // LINE_WIDTH)
+    lines = [f"{path} line {i:05d} {rng.getrandbits(128):032x}" for i in range(line_count)]
+    for edit in range(1, version + 1):
+        edit_rng = random.Random(f"{params.seed}:{path}:{edit}")
+        for _ in range(3):
+            lines[edit_rng.randrange(line_count)] = f"{path} edit {edit:05d} {edit_rng.getrandbits(128):032x}"
+    return ("\n".join(lines) + "\n").encode()
+
+class StreamWriter:
+    def __init__(self, params: RepoParams, out: BinaryIO) -> None:
+        self.params = params
+        self.out = out
+        self.next_mark = 1
+        self.commit_count = 0
+
+    def write_data(self, content: bytes) -> None:
+        self.out.write(f"data {len(content)}\n".encode())
+        self.out.write(content)
+        self.out.write(b"\n")
+
+    def write_commit(self, ref: str, message: str, parents: list[int], files: dict[str, int]) -> int:
+        # files maps path -> version to write; returns the commit's mark
+        mark = self.next_mark
+        self.next_mark += 1
+        identity = f"Bench <bench@example.com> {BASE_TIMESTAMP + 60 * self.commit_count} +0000"
+        self.commit_count += 1
+        self.out.write(f"commit {ref}\nmark :{mark}\nauthor {identity}\ncommitter {identity}\n".encode())
+        self.write_data(message.encode())
+        if parents:
+            self.out.write(f"from :{parents[0]}\n".encode())
+        for parent in parents[1:]:
+            self.out.write(f"merge :{parent}\n".encode())
+        for path, version in sorted(files.items()):
+            self.out.write(f"M 100644 inline {path}\n".encode())
+            self.write_data(get_file_content(self.params, path, version))
+        self.out.write(b"\n")
+        return mark
+
+def write_history(params: RepoParams, out: BinaryIO) -> int:
+    # returns the number of commits written
+    rng = random.Random(params.seed)
+    writer = StreamWriter(params, out)
+    versions = {get_source_path(index): 0 for index in range(params.file_count)}
+    main_marks = [writer.write_commit("refs/heads/main", "Initial files", [], versions)]
+
+    fork_points = sorted(rng.randrange(params.depth) for _ in range(params.branches))
+    branch_tips: dict[int, tuple[int, dict[str, int]]] = {}     # branch -> (tip mark, its files' versions)
+    waiting_branches: list[int] = []
+    next_branch = 0
+    for commit_index in range(params.depth):
+        if commit_index > 0:
+            changed = {path: versions[path] + 1 for path in rng.sample(sorted(versions), min(params.files_per_commit, len(versions)))}
+            versions.update(changed)
+            parents = [main_marks[-1]]
+            message = f"Change {len(changed)} files"
+            mergeable = [branch for branch in waiting_branches if branch != params.branches - 1]
+            if mergeable and rng.random() < params.merge_density:
+                branch = mergeable[0]
+                waiting_branches.remove(branch)
+                branch_mark, branch_files = branch_tips[branch]
+                parents.append(branch_mark)
+                changed.update(branch_files)
+                versions.update(branch_files)
+                message = f"Merge branch b{branch} into main"
+            main_marks.append(writer.write_commit("refs/heads/main", message, parents, changed))
+        while next_branch < params.branches and fork_points[next_branch] <= commit_index:
+            branch_files: dict[str, int] = {}
+            tip = main_marks[-1]
+            for branch_commit in range(params.branch_depth()):
+                path = f"branches/b{next_branch}/f{rng.randrange(params.files_per_commit + 1):03d}.txt"
+                branch_files[path] = branch_files.get(path, -1) + 1
+                tip = writer.write_commit(f"refs/heads/b{next_branch}", f"Work on b{next_branch} ({branch_commit})", [tip], {path: branch_files[path]})
+            branch_tips[next_branch] = (tip, branch_files)
+            waiting_branches.append(next_branch)
+            next_branch += 1
+    out.write(b"done\n")
+    out.flush()
+    return writer.commit_count
+
+def add_params_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = RepoParams()
+    for name, value in asdict(defaults).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=None, help=f"default: {value}")
+
+def params_from_args(args: argparse.Namespace, base: RepoParams | None = None) -> RepoParams:
+    params = asdict(base or RepoParams())
+    for name in params:
+        value = getattr(args, name)
+        if value is not None:
+            params[name] = value
+    return RepoParams(**params)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic history as a fast-import stream to stdout")
+    add_params_arguments(parser)
+    params = params_from_args(parser.parse_args())
+    commit_count = write_history(params, sys.stdout.buffer)
+    print(f"Wrote {commit_count} commits", file=sys.stderr)
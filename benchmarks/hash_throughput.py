@@ -0,0 +1,65 @@
+"""Measures how fast each hash algorithm pig supports names content, in MiB/s.
+
+Every algorithm hashes the same random buffers, fed in the chunk size pig reads files with, so
+the numbers show what `pig init --hash` (or `pig migrate-hash`) would buy on this machine:
+
+    python benchmarks/hash_throughput.py
+    python benchmarks/hash_throughput.py --sizes 4096 1048576 --total-mib 512 -o hashes.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.hashing import HASH_ALGORITHMS, new_hasher  # noqa: E402
+
+CHUNK_SIZE = 1 << 16    # what file_helpers.get_file_hash reads at a time
+DEFAULT_SIZES = [1024, 16 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+
+def hash_buffer(algorithm: str, buffer: bytes) -> str:
+    hasher = new_hasher(algorithm)
+    view = memoryview(buffer)
+    for offset in range(0, len(buffer), CHUNK_SIZE):
+        hasher.update(view[offset:offset + CHUNK_SIZE])
+    return hasher.hexdigest()
+
+def measure(algorithm: str, size: int, total_bytes: int) -> float:
+    # hashes `size`-byte buffers until about total_bytes went through; returns MiB/s
+    buffer = os.urandom(size)
+    iterations = max(1, total_bytes // size)
+    hash_buffer(algorithm, buffer)      # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        hash_buffer(algorithm, buffer)
+    elapsed = time.perf_counter() - start
+    return iterations * size / 1024 / 1024 / elapsed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the throughput of pig's hash algorithms")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Sizes in bytes of the content to hash (default: 1 KiB, 16 KiB, 1 MiB, 16 MiB)")
+    parser.add_argument("--total-mib", type=int, default=256, help="How much content to hash per algorithm and size (default: 256)")
+    parser.add_argument("-o", "--output", type=Path, required=False, help="File to also write the JSON results to")
+    args = parser.parse_args()
+    if args.total_mib < 1 or any(size < 1 for size in args.sizes):
+        parser.error("sizes and --total-mib must be positive")
+
+    results: dict[str, dict[str, float]] = {}
+    print(f"{'size':>10} " + " ".join(f"{algorithm:>12}" for algorithm in HASH_ALGORITHMS))
+    for size in args.sizes:
+        row = {algorithm: measure(algorithm, size, args.total_mib * 1024 * 1024) for algorithm in HASH_ALGORITHMS}
+        results[str(size)] = {algorithm: round(mib_per_second, 1) for algorithm, mib_per_second in row.items()}
+        print(f"{size:>10} " + " ".join(f"{mib_per_second:>7.0f} MiB/s" for mib_per_second in row.values()))
+
+    if args.output:
+        report = {
+            "meta": {"python": platform.python_version(), "platform": platform.platform(), "chunk_size": CHUNK_SIZE},
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
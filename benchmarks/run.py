@@ -0,0 +1,167 @@
+"""Times pig commands against synthetic repositories and writes the results as JSON.
+
+Every repeat builds a fresh repository from the same generated history and runs each step as a
+separate `main.py` process, the same way a user would, recording its wall time and peak RSS.
+Use compare.py to compare two result files, e.g. from before and after a change:
+
+    python benchmarks/run.py --preset medium -o before.json
+    python benchmarks/run.py --preset medium -o after.json
+    python benchmarks/compare.py before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from generate_repo import RepoParams, add_params_arguments, params_from_args, get_source_path, write_history
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MAIN_PATH = REPO_ROOT / "main.py"
+
+PRESETS = {
+    "small": RepoParams(file_count=100, file_size=1024, depth=50, branches=2),
+    "medium": RepoParams(),
+    "large": RepoParams(file_count=5000, file_size=4096, depth=1000, branches=16, files_per_commit=20),
+}
+
+@dataclass
+class StepResult:
+    seconds: float
+    peak_rss_kb: int
+
+def run_timed(command: list[str], cwd: Path, stdin_path: Path | None = None) -> StepResult:
+    # os.wait4 gives the resource usage of just this child, so peak RSS isn't mixed up with other steps
+    stdin = open(stdin_path, "rb") if stdin_path is not None else subprocess.DEVNULL
+    try:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        assert process.stdout is not None
+        output = process.stdout.read()     # pig reports errors on stdout
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+    finally:
+        if stdin_path is not None:
+            stdin.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}:\n{output.decode(errors='replace')}")
+    peak_rss_kb = usage.ru_maxrss if sys.platform != "darwin" else usage.ru_maxrss // 1024    # bytes on macOS
+    return StepResult(seconds=seconds, peak_rss_kb=peak_rss_kb)
+
+def pig_command(*args: str) -> list[str]:
+    return [sys.executable, str(MAIN_PATH), *args]
+
+def modify_files(repo_root: Path, params: RepoParams) -> None:
+    for index in range(min(params.files_per_commit, params.file_count)):
+        with open(repo_root / get_source_path(index), "a") as f:
+            f.write("benchmark edit\n")
+
+def run_pig_steps(work_dir: Path, stream_path: Path, params: RepoParams, hash_algorithm: str) -> dict[str, StepResult]:
+    repo_root = work_dir / "pig-repo"
+    repo_root.mkdir()
+    results = {}
+    last_branch = f"b{params.branches - 1}"
+    run_timed(pig_command("init", "--hash", hash_algorithm), repo_root)
+    results["fast-import"] = run_timed(pig_command("fast-import"), repo_root, stdin_path=stream_path)
+    results["checkout (full)"] = run_timed(pig_command("checkout", "main"), repo_root)
+    results["status (clean)"] = run_timed(pig_command("status"), repo_root)
+    modify_files(repo_root, params)
+    results["status (modified)"] = run_timed(pig_command("status"), repo_root)
+    results["diff --stat (worktree)"] = run_timed(pig_command("diff", "--stat"), repo_root)
+    results["add"] = run_timed(pig_command("add", "*.txt"), repo_root)
+    results["commit"] = run_timed(pig_command("commit", "-m", "Benchmark commit"), repo_root)
+    results["log"] = run_timed(pig_command("log", "-n", "1000"), repo_root)
+    results["log --graph"] = run_timed(pig_command("log", "--graph", "-n", "200"), repo_root)
+    results["log -- <dir>"] = run_timed(pig_command("log", "-n", "20", "--", "src/d000"), repo_root)
+    results["blame"] = run_timed(pig_command("blame", get_source_path(0)), repo_root)
+    if params.branches > 0:
+        results["diff --stat (commits)"] = run_timed(pig_command("diff", "main", "b0", "--stat"), repo_root)
+        results["merge"] = run_timed(pig_command("merge", last_branch), repo_root)
+        results["switch"] = run_timed(pig_command("switch", "b0"), repo_root)
+    results["fsck"] = run_timed(pig_command("fsck"), repo_root)
+    return results
+
+def run_git_convert(work_dir: Path, stream_path: Path, hash_algorithm: str) -> StepResult:
+    git_root = work_dir / "git-repo"
+    subprocess.run(["git", "init", "-q", "-b", "main", str(git_root)], check=True)
+    with open(stream_path, "rb") as stream:
+        subprocess.run(["git", "fast-import", "--quiet"], cwd=git_root, stdin=stream, check=True)
+    subprocess.run(["git", "checkout", "-q", "main"], cwd=git_root, check=True)
+    repo_root = work_dir / "converted-repo"
+    repo_root.mkdir()
+    return run_timed(pig_command("git-convert", str(git_root), "--hash", hash_algorithm), repo_root)
+
+def get_git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark pig commands on a synthetic repository")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="Repository size to start from (default: small)")
+    add_params_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Number of fresh repositories to time every step on (default: 3)")
+    parser.add_argument("--hash", choices=["sha256", "blake2b"], default="sha256", help="Hash algorithm the repositories are created with (default: sha256)")
+    parser.add_argument("--skip-git", action="store_true", help="Don't benchmark git-convert (which needs git installed)")
+    parser.add_argument("--stream", type=Path, required=False, help="Keep the generated fast-import stream at this path")
+    parser.add_argument("-o", "--output", type=Path, required=False, help="File to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    params = params_from_args(args, PRESETS[args.preset])
+    run_git = not args.skip_git and shutil.which("git") is not None
+
+    with tempfile.TemporaryDirectory(prefix="pig-bench-") as tmp_dir:
+        stream_path = args.stream or Path(tmp_dir) / "history.stream"
+        with open(stream_path, "wb") as stream:
+            commit_count = write_history(params, stream)
+        print(f"Generated {commit_count} commits ({stream_path.stat().st_size / 1024 / 1024:.1f} MiB stream)", file=sys.stderr)
+
+        step_runs: dict[str, list[StepResult]] = {}
+        for repeat in range(args.repeat):
+            work_dir = Path(tmp_dir) / f"run-{repeat}"
+            work_dir.mkdir()
+            results = run_pig_steps(work_dir, stream_path, params, args.hash)
+            if run_git:
+                results["git-convert"] = run_git_convert(work_dir, stream_path, args.hash)
+            for step, result in results.items():
+                step_runs.setdefault(step, []).append(result)
+            shutil.rmtree(work_dir)
+            print(f"Finished run {repeat + 1}/{args.repeat}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "git_commit": get_git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "preset": args.preset,
+            "params": asdict(params),
+            "hash_algorithm": args.hash,
+            "commit_count": commit_count,
+            "repeat": args.repeat,
+        },
+        "results": {
+            step: {
+                "seconds": [round(run.seconds, 4) for run in runs],
+                "median_seconds": round(statistics.median(run.seconds for run in runs), 4),
+                "peak_rss_kb": max(run.peak_rss_kb for run in runs),
+            }
+            for step, runs in step_runs.items()
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    for step, result in report["results"].items():
+        print(f"{step:<24} {result['median_seconds']:>9.3f}s {result['peak_rss_kb'] / 1024:>8.1f} MiB", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+from pathlib import Path
+from .repo_utils import get_common_dir
+from .warm_cache import invalidate, warm_cached
+
+# Like git's objects/info/alternates: .pig/alternates lists other compressed-files directories,
+# one per line, that object reads fall back to when an object isn't in the repository's own store.
+# Relative entries are resolved against this repository's compressed-files directory.
+
+MAX_ALTERNATE_DEPTH = 5     # alternates of alternates are followed, up to the same depth as git
+ALTERNATES_NAMESPACE = "alternates"
+
+def get_alternates_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "alternates"
+
+def read_alternates(pig_root: Path) -> list[Path]:
+    alternates_path = get_alternates_path(pig_root)
+    if not alternates_path.exists():
+        return []
+    objects_dir = get_common_dir(pig_root) / "compressed-files"
+    return [(objects_dir / line.strip()).resolve() for line in alternates_path.read_text().splitlines() if line.strip()]
+
+def write_alternates(pig_root: Path, object_dirs: list[Path]) -> None:
+    get_alternates_path(pig_root).write_text("".join(f"{object_dir.resolve()}\n" for object_dir in object_dirs))
+    invalidate(ALTERNATES_NAMESPACE)
+
+# every object read that misses the local store asks for this, so like the hash algorithm it is
+# cached in every process; the daemon drops it with the rest of its state when .pig changes
+@warm_cached(ALTERNATES_NAMESPACE, always=True)
+def get_alternate_object_dirs(pig_root: Path) -> tuple[Path, ...]:
+    # every alternate object directory reachable from the repository, nearest first;
+    # an alternate's own alternates live next to it in its .pig directory
+    object_dirs: list[Path] = []
+    frontier = read_alternates(pig_root)
+    for _ in range(MAX_ALTERNATE_DEPTH):
+        next_frontier = []
+        for object_dir in frontier:
+            if object_dir in object_dirs or not object_dir.is_dir():
+                continue
+            object_dirs.append(object_dir)
+            next_frontier.extend(read_alternates(object_dir.parent.parent))
+        frontier = next_frontier
+    return tuple(object_dirs)
@@ -0,0 +1,115 @@
+from pathlib import Path
+import json
+import time
+from .errors import PigError
+from .repo_utils import get_common_dir, get_sharded_path
+from .commit_helpers import get_commit_data
+from .commit_graph import CommitGraph
+from .file_helpers import read_compressed_bytes
+from .diff_engine import get_opcodes
+
+# Blame walks back through history from the commit being blamed, but only diffs at the commits
+# where the file's hash actually changed. For each of those (blob hash, commit) pairs the commit
+# every line came from is cached in .pig/blame-cache/, so later blames stop as soon as they reach
+# a point some earlier blame already resolved.
+
+def get_blame_cache_dir(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "blame-cache"
+
+def get_blame_cache_path(pig_root: Path, file_hash: str, commit_hash: str) -> Path:
+    return get_sharded_path(get_blame_cache_dir(pig_root), f"{file_hash}-{commit_hash}.json")
+
+def read_blame_cache(pig_root: Path, file_hash: str, commit_hash: str) -> list[str] | None:
+    cache_path = get_blame_cache_path(pig_root, file_hash, commit_hash)
+    if not cache_path.exists():
+        return None
+    origins = []
+    for origin, count in json.loads(cache_path.read_text()):     # run-length encoded
+        origins.extend([origin] * count)
+    return origins
+
+def write_blame_cache(pig_root: Path, file_hash: str, commit_hash: str, origins: list[str]) -> None:
+    runs: list[list] = []
+    for origin in origins:
+        if runs and runs[-1][0] == origin:
+            runs[-1][1] += 1
+        else:
+            runs.append([origin, 1])
+    cache_path = get_blame_cache_path(pig_root, file_hash, commit_hash)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_text(json.dumps(runs, separators=(",", ":")))
+
+def read_blob_lines(pig_root: Path, file_hash: str) -> list[str]:
+    content = read_compressed_bytes(pig_root, file_hash)
+    if b"\0" in content[:8000]:
+        raise PigError("cannot blame a binary file")
+    return content.decode("utf-8", "replace").splitlines(keepends=True)
+
+def get_path_hash(pig_root: Path, commit_hash: str, filepath: str) -> str | None:
+    file_info = get_commit_data(pig_root, commit_hash)["files"].get(filepath)
+    return file_info["hash"] if file_info else None
+
+def find_introducing_commit(pig_root: Path, commit_graph: CommitGraph, commit_hash: str, filepath: str, file_hash: str) -> tuple[str, str | None]:
+    # follows history while the file keeps the same hash; returns the commit that introduced
+    # file_hash and the hash the file had in that commit's first parent (None if it didn't exist)
+    while True:
+        parents = commit_graph.parents(commit_hash)
+        if not parents:
+            return commit_hash, None
+        if not commit_graph.may_have_changed(commit_hash, filepath):
+            commit_hash = parents[0]    # Bloom filter says unchanged, no need to open any JSON
+            continue
+        parent_hashes = [get_path_hash(pig_root, parent_hash, filepath) for parent_hash in parents]
+        if file_hash in parent_hashes:
+            commit_hash = parents[parent_hashes.index(file_hash)]
+            continue
+        return commit_hash, parent_hashes[0]
+
+def blame_file(pig_root: Path, commit_hash: str, filepath: str) -> tuple[list[str], list[str]]:
+    # returns (lines, commit each line originated in)
+    file_hash = get_path_hash(pig_root, commit_hash, filepath)
+    if file_hash is None:
+        raise PigError(f"{filepath} does not exist in commit {commit_hash}")
+    commit_graph = CommitGraph(pig_root)
+
+    # walk down to the first (blob, commit) point that is cached or where the file was created
+    chain: list[tuple[str, str, str | None]] = []   # (file hash, introducing commit, parent file hash)
+    origins: list[str] | None = None
+    current_commit, current_hash = commit_hash, file_hash
+    while True:
+        introducing_commit, parent_hash = find_introducing_commit(pig_root, commit_graph, current_commit, filepath, current_hash)
+        origins = read_blame_cache(pig_root, current_hash, introducing_commit)
+        if origins is not None:
+            break
+        chain.append((current_hash, introducing_commit, parent_hash))
+        if parent_hash is None:
+            break
+        current_commit, current_hash = commit_graph.parents(introducing_commit)[0], parent_hash
+
+    # then resolve back up, carrying line origins through the diff at each change
+    lines = read_blob_lines(pig_root, current_hash) if origins is not None else []
+    for blob_hash, introducing_commit, parent_hash in reversed(chain):
+        blob_lines = read_blob_lines(pig_root, blob_hash)
+        blob_origins = [introducing_commit] * len(blob_lines)    # lines not carried over from the parent are new here
+        if parent_hash is not None and origins is not None:
+            for tag, i1, i2, j1, j2 in get_opcodes(lines, blob_lines):
+                if tag == "equal":
+                    blob_origins[j1:j2] = origins[i1:i2]
+        write_blame_cache(pig_root, blob_hash, introducing_commit, blob_origins)
+        lines, origins = blob_lines, blob_origins
+    commit_graph.flush()
+    assert origins is not None
+    return lines, origins
+
+def format_blame(pig_root: Path, lines: list[str], origins: list[str]) -> str:
+    # one line per source line: "<short hash> (<author> <date> <line number>) <line>"
+    commit_data = {origin: get_commit_data(pig_root, origin) for origin in set(origins)}
+    author_width = max((len(data["author"]) for data in commit_data.values()), default=0)
+    number_width = len(str(len(lines)))
+    output = []
+    for line_number, (line, origin) in enumerate(zip(lines, origins), start=1):
+        data = commit_data[origin]
+        text = line.rstrip("\n")
+        date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(data["timestamp"]))
+        output.append(f"{origin[:7]} ({data['author'].ljust(author_width)} {date} {line_number:>{number_width}}) {text}\n")
+    return "".join(output)
@@ -0,0 +1,81 @@
+from pathlib import Path
+import hashlib
+from .repo_utils import get_common_dir, append_lines_atomically, write_file_atomically
+from .warm_cache import warm_cached
+
+# Changed-path Bloom filters, one per commit, like git's commit-graph "BDAT" chunk.
+# Each filter holds every path that differs from the commit's first parent plus all of
+# their parent directories. A miss means the path definitely did not change in that commit.
+# Stored next to the commit graph as "<commit hash> <filter as hex>" lines, where "*" marks
+# a commit that changed too many paths to be worth filtering.
+
+BITS_PER_ENTRY = 10
+NUM_HASHES = 7
+MAX_CHANGED_PATHS = 512
+
+type BloomFilter = bytes | None   # None: too many changes, every path may have changed
+
+def get_bloom_filters_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "commit-graph-bloom"
+
+def get_bit_positions(path: str, num_bits: int) -> list[int]:
+    # double hashing: h1 + i * h2 gives NUM_HASHES independent-enough positions from one digest
+    digest = hashlib.blake2b(path.encode(), digest_size=8).digest()
+    h1 = int.from_bytes(digest[:4], "little")
+    h2 = int.from_bytes(digest[4:], "little") | 1
+    return [(h1 + i * h2) % num_bits for i in range(NUM_HASHES)]
+
+def with_parent_directories(filepaths: set[str]) -> set[str]:
+    changed_paths = set(filepaths)
+    for filepath in filepaths:
+        while "/" in filepath:
+            filepath = filepath.rsplit("/", 1)[0]
+            changed_paths.add(filepath)
+    return changed_paths
+
+def get_changed_paths(old_files: dict[str, str], new_files: dict[str, str]) -> set[str]:
+    # takes path -> hash maps and returns the paths that differ between them
+    return {filepath for filepath in old_files.keys() | new_files.keys() if old_files.get(filepath) != new_files.get(filepath)}
+
+def build_bloom_filter(changed_filepaths: set[str]) -> BloomFilter:
+    changed_paths = with_parent_directories(changed_filepaths)
+    if len(changed_paths) > MAX_CHANGED_PATHS:
+        return None
+    num_bytes = max(1, (len(changed_paths) * BITS_PER_ENTRY + 7) // 8)
+    bits = bytearray(num_bytes)
+    for changed_path in changed_paths:
+        for position in get_bit_positions(changed_path, num_bytes * 8):
+            bits[position // 8] |= 1 << (position % 8)
+    return bytes(bits)
+
+def bloom_filter_may_contain(bloom_filter: BloomFilter, path: str) -> bool:
+    if bloom_filter is None:
+        return True
+    num_bits = len(bloom_filter) * 8
+    return all(bloom_filter[position // 8] & (1 << (position % 8)) for position in get_bit_positions(path, num_bits))
+
+@warm_cached("commit-graph-bloom", copy=dict)
+def read_bloom_filters(pig_root: Path) -> dict[str, BloomFilter]:
+    bloom_filters_path = get_bloom_filters_path(pig_root)
+    if not bloom_filters_path.exists():
+        return {}
+    bloom_filters: dict[str, BloomFilter] = {}
+    with open(bloom_filters_path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                continue    # torn by an append that was interrupted; the filter is built again when needed
+            try:
+                commit_hash, encoded = line.split()
+                bloom_filters[commit_hash] = None if encoded == "*" else bytes.fromhex(encoded)
+            except ValueError:
+                continue
+    return bloom_filters
+
+def format_bloom_line(commit_hash: str, bloom_filter: BloomFilter) -> str:
+    return f"{commit_hash} {'*' if bloom_filter is None else bloom_filter.hex()}\n"
+
+def append_bloom_filters(pig_root: Path, bloom_filters: dict[str, BloomFilter]) -> None:
+    append_lines_atomically(get_bloom_filters_path(pig_root), "".join(format_bloom_line(commit_hash, bloom_filter) for commit_hash, bloom_filter in bloom_filters.items()))
+
+def write_bloom_filters(pig_root: Path, bloom_filters: dict[str, BloomFilter]) -> None:
+    write_file_atomically(get_bloom_filters_path(pig_root), "".join(format_bloom_line(commit_hash, bloom_filter) for commit_hash, bloom_filter in bloom_filters.items()))
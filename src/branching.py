@@ -1,25 +1,16 @@
 from pathlib import Path
-import json
 from .errors import PigError
 from .repo_utils import get_head_info, update_head
 from .commit_helpers import current_commit_hash
-from .models import HeadInfo, BranchInfo
+from .models import HeadInfo
 from .recreatedirectory import recreate_directory
-
-def get_branch_heads_path(pig_root: Path) -> Path:
-    return pig_root / ".pig" / "BRANCH_HEADS.json"
-
-def get_branch_heads(pig_root: Path) -> BranchInfo:
-    branch_heads_path = get_branch_heads_path(pig_root)
-    if not branch_heads_path.exists():
-        return {}
-    return json.loads(branch_heads_path.read_text())
-
-def update_branch_head(pig_root: Path, branch_name: str, new_commit_hash: str) -> None:
-    branch_heads = get_branch_heads(pig_root)
-    branch_heads[branch_name] = new_commit_hash
-    branch_heads_path = get_branch_heads_path(pig_root)
-    branch_heads_path.write_text(json.dumps(branch_heads, indent=4))
+from .worktrees import check_branch_not_checked_out_elsewhere
+from .refs import (
+    get_branch_heads,
+    get_branch_head,
+    update_branch_head,
+    delete_branch_head,
+)
 
 def get_current_branch(pig_root: Path) -> str | None:
     head_info = get_head_info(pig_root)
@@ -27,29 +18,28 @@ def get_current_branch(pig_root: Path) -> str | None:
         return head_info.value
     return None
 
-def switch_branch(pig_root: Path, branch_name: str) -> None:
-    branch_heads = get_branch_heads(pig_root)
-    if branch_name not in branch_heads:
+def switch_branch(pig_root: Path, branch_name: str, jobs: int | None = None) -> None:
+    new_commit_hash = get_branch_head(pig_root, branch_name)
+    if new_commit_hash is None:
         raise PigError(f"branch '{branch_name}' does not exist")
-    new_commit_hash = branch_heads[branch_name]
-    recreate_directory(pig_root, new_commit_hash)
+    check_branch_not_checked_out_elsewhere(pig_root, branch_name)
+    recreate_directory(pig_root, new_commit_hash, jobs)
     update_head(pig_root, HeadInfo(type="branch", value=branch_name))
 
 def create_branch(pig_root: Path, branch_name: str, start_commit: str | None = None) -> None:
     if start_commit is None:
         start_commit = current_commit_hash(pig_root)
-    branch_heads = get_branch_heads(pig_root)
-    if branch_name in branch_heads:
+    if branch_name.endswith(".lock"):
+        raise PigError("branch names cannot end with '.lock'")
+    if get_branch_head(pig_root, branch_name) is not None:
         raise PigError(f"branch '{branch_name}' already exists")
     update_branch_head(pig_root, branch_name, start_commit)
 
 def delete_branch(pig_root: Path, branch_name: str) -> None:
-    branch_heads = get_branch_heads(pig_root)
-    if branch_name not in branch_heads:
+    if get_branch_head(pig_root, branch_name) is None:
         raise PigError(f"branch '{branch_name}' does not exist")
     current_branch = get_current_branch(pig_root)
     if current_branch == branch_name:
         raise PigError("Cannot delete the current checked out branch")
-    del branch_heads[branch_name]
-    branch_heads_path = get_branch_heads_path(pig_root)
-    branch_heads_path.write_text(json.dumps(branch_heads, indent=4))
\ No newline at end of file
+    check_branch_not_checked_out_elsewhere(pig_root, branch_name)
+    delete_branch_head(pig_root, branch_name)
\ No newline at end of file
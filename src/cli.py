@@ -0,0 +1,160 @@
+import argparse
+from pathlib import Path
+from .commands import map_command
+from .errors import PigError
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
+from .tracing import span, get_trace_output_path, start_tracing, stop_tracing
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Pig CLI")
+    parser.add_argument("--trace", action="store_true", help="Time the command's phases and write a Chrome trace to pig-trace.json (also enabled by PIG_TRACE=1 or PIG_TRACE=<file>)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    # init command
+    init_parser = subparsers.add_parser("init", help="Initialize a new pig repository")
+    init_parser.add_argument("--hash", choices=HASH_ALGORITHMS, default=DEFAULT_HASH_ALGORITHM, help="Content hash used to name objects (default: %(default)s)")
+    
+    # add command
+    add_parser = subparsers.add_parser("add", help="Add files to staging")
+    add_parser.add_argument("filepattern", help="File pattern to add")
+
+    # status command
+    subparsers.add_parser("status", help="Show the status of the repository")
+
+    # commit command
+    commit_parser = subparsers.add_parser("commit", help="Commit staged changes")
+    commit_parser.add_argument("-m", "--message", required=True, help="Commit message")
+
+    # checkout command
+    checkout_parser = subparsers.add_parser("checkout", help="Checkout a branch or commit")
+    checkout_parser.add_argument("-b", "--create", action="store_true", help="Checkout a new branch")
+    checkout_parser.add_argument("name", help="Branch name or commit hash to checkout")
+    checkout_parser.add_argument("-s", "--start_point", required=False, help="Starting point for new branch (commit hash or branch name)")
+    checkout_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of threads used to write files (default: number of CPUs + 4, at most 32)")
+
+    # switch command
+    switch_parser = subparsers.add_parser("switch", help="Switch to an existing branch")
+    switch_parser.add_argument("name", help="Branch name to switch to")
+    switch_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of threads used to write files (default: number of CPUs + 4, at most 32)")
+
+    # merge command
+    merge_parser = subparsers.add_parser("merge", help="Merge a branch into the current branch")
+    merge_parser.add_argument("name", help="Branch name to merge from")
+    merge_parser.add_argument("--no-ff", action="store_true", help="Create a merge commit even when the branch could be fast-forwarded")
+    merge_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of threads used to write files (default: number of CPUs + 4, at most 32)")
+
+    # log command
+    log_parser = subparsers.add_parser("log", help="Show commit logs")
+    log_parser.add_argument("-n", "--number", type=int, default=10, help="Number of commits to show")
+    log_parser.add_argument("--topo-order", action="store_true", help="Never show a commit before all of its children")
+    log_parser.add_argument("--oneline", action="store_true", help="Show each commit as '<short hash> <message>'")
+    log_parser.add_argument("--graph", action="store_true", help="Draw the history as a text graph (implies --topo-order)")
+    log_parser.add_argument("--format", required=False, help="Format string using %%H, %%h, %%P, %%p, %%an, %%ad, %%at, %%s and %%n")
+    log_parser.add_argument("paths", nargs="*", help="Only show commits that changed these files or directories, which must be tracked or in the working tree (use after --)")
+
+    # branch command
+    branch_parser = subparsers.add_parser("branch", help="Manage branches")
+    branch_parser.add_argument("-c", "--create", required=False, metavar="BRANCH_NAME", help="Create a new branch")
+    branch_parser.add_argument("-d", "--delete", required=False, metavar="BRANCH_NAME", help="Delete the specified branch")
+    branch_parser.add_argument("-l", "--list", action="store_true", help="List all branches")
+
+    # rm command
+    rm_parser = subparsers.add_parser("rm", help="Remove files from staging")
+    rm_parser.add_argument("filepattern", help="File pattern to remove from staging")
+
+    # git-convert command
+    git_convert_parser = subparsers.add_parser("git-convert", help="Convert a git repository to a pig repository")
+    git_convert_parser.add_argument("git_root", type=Path, help="Path to the root of the git repository")
+    git_convert_parser.add_argument("--hash", choices=HASH_ALGORITHMS, default=DEFAULT_HASH_ALGORITHM, help="Content hash used to name objects (default: %(default)s)")
+
+    # migrate-layout command
+    subparsers.add_parser("migrate-layout", help="Move objects and commits into two-character fan-out directories")
+
+    # migrate-hash command
+    migrate_hash_parser = subparsers.add_parser("migrate-hash", help="Rename every object and commit after a different content hash")
+    migrate_hash_parser.add_argument("algorithm", choices=HASH_ALGORITHMS, help="Hash algorithm to switch the repository to")
+
+    # gc command
+    gc_parser = subparsers.add_parser("gc", help="Delete commits and objects that are no longer reachable")
+    gc_parser.add_argument("--grace-days", type=float, default=14, help="Only delete unreachable files older than this many days")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Report how much would be reclaimed without deleting anything")
+
+    # fsck command
+    fsck_parser = subparsers.add_parser("fsck", help="Verify the integrity of all commits and objects")
+    fsck_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+
+    # pack-refs command
+    subparsers.add_parser("pack-refs", help="Fold loose branch files into BRANCH_HEADS.json")
+
+    # diff command
+    diff_parser = subparsers.add_parser("diff", help="Show changes between commits or between a commit and the working tree")
+    diff_parser.add_argument("commits", nargs="*", help="No commits: HEAD against the working tree; one: that commit against the working tree; two: the first against the second")
+    diff_parser.add_argument("--stat", action="store_true", help="Only show a summary of changed lines per file")
+
+    # blame command
+    blame_parser = subparsers.add_parser("blame", help="Show the commit that last changed each line of a file")
+    blame_parser.add_argument("path", help="File to blame")
+    blame_parser.add_argument("commit", nargs="?", help="Commit or branch to blame the file at (defaults to HEAD)")
+
+    # sparse-checkout command
+    sparse_checkout_parser = subparsers.add_parser("sparse-checkout", help="Only check out files inside the given directories")
+    sparse_checkout_parser.add_argument("action", choices=["set", "list", "disable"], help="Set the included directories, list them, or check out everything again")
+    sparse_checkout_parser.add_argument("prefixes", nargs="*", help="Directories to include (for set)")
+
+    # worktree command
+    worktree_parser = subparsers.add_parser("worktree", help="Manage extra working trees that share this repository's history")
+    worktree_parser.add_argument("action", choices=["add", "list", "remove"], help="Check a branch out into a new directory, list the worktrees, or delete one")
+    worktree_parser.add_argument("path", nargs="?", help="Directory of the worktree (for add and remove)")
+    worktree_parser.add_argument("branch", nargs="?", help="Branch to check out (for add)")
+    worktree_parser.add_argument("-f", "--force", action="store_true", help="Remove the worktree even if it has staged changes")
+    worktree_parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of threads used to write files (default: number of CPUs + 4, at most 32)")
+
+    # clone command
+    clone_parser = subparsers.add_parser("clone", help="Clone another pig repository")
+    clone_parser.add_argument("source", help="Path of the repository to clone")
+    clone_parser.add_argument("directory", nargs="?", help="Directory to clone into (defaults to the source's name in the current directory)")
+    clone_parser.add_argument("--shared", action="store_true", help="Borrow the source's objects through .pig/alternates instead of copying them")
+
+    # fetch command
+    fetch_parser = subparsers.add_parser("fetch", help="Download new commits and update <remote>/<branch> branches")
+    fetch_parser.add_argument("remote", nargs="?", default="origin", help="Remote name or repository path (default: origin)")
+
+    # push command
+    push_parser = subparsers.add_parser("push", help="Upload a branch's new commits to another repository")
+    push_parser.add_argument("remote", nargs="?", default="origin", help="Remote name or repository path (default: origin)")
+    push_parser.add_argument("branch", nargs="?", help="Branch to push (default: the current branch)")
+    push_parser.add_argument("-f", "--force", action="store_true", help="Update the remote branch even if it is not a fast-forward")
+
+    # git-export command
+    git_export_parser = subparsers.add_parser("git-export", help="Write the history of every branch as a git fast-import stream")
+    git_export_parser.add_argument("-o", "--output", required=False, help="File to write the stream to (default: stdout)")
+
+    # fast-import command
+    fast_import_parser = subparsers.add_parser("fast-import", help="Import blobs, commits and branches from a git fast-import style stream on stdin")
+    fast_import_parser.add_argument("--force", action="store_true", help="Update branches even if the imported commits don't descend from them")
+
+    # server side of fetch and push, run by the other repository over stdin/stdout
+    upload_pack_parser = subparsers.add_parser("upload-pack")
+    upload_pack_parser.add_argument("directory")
+    receive_pack_parser = subparsers.add_parser("receive-pack")
+    receive_pack_parser.add_argument("directory")
+
+    # daemon command
+    daemon_parser = subparsers.add_parser("daemon", help="Serve status, log, diff and blame from a background process with warm caches")
+    daemon_parser.add_argument("action", choices=["start", "stop", "status", "run"], help="Start or stop the background daemon, show whether it's running, or run it in the foreground")
+    return parser
+
+def run_command(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    trace_output_path = get_trace_output_path(args.trace)
+    if trace_output_path is not None:
+        start_tracing(trace_output_path.resolve())
+    try:
+        with span(f"pig {args.command}"):
+            exit_code = map_command(args.command)(args)
+    except PigError as e:
+        print(f"pig error: {e}")
+        exit_code = 1
+    finally:
+        stop_tracing()
+    return exit_code or 0
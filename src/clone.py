@@ -0,0 +1,76 @@
+from pathlib import Path
+import os
+import shutil
+from .errors import PigError
+from .models import HeadInfo
+from .repo_utils import get_head_info, update_head, update_config
+from .commit_helpers import get_commits_dir
+from .commit_graph import get_commit_graph_path
+from .bloom import get_bloom_filters_path
+from .file_helpers import get_compressed_files_dir
+from .alternates import write_alternates
+from .hashing import get_format_config, get_hash_algorithm
+from .refs import get_branch_heads, write_packed_refs
+from .staging_helpers import update_staging_info
+from .transport import fetch_pack
+
+def link_or_copy(src_path: Path, dest_path: Path) -> None:
+    # commit files are never modified once written, so a hard link is as good as a copy
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        shutil.copy2(src_path, dest_path)
+
+def link_tree(src_dir: Path, dest_dir: Path) -> None:
+    for dirpath, _, filenames in os.walk(src_dir):
+        relative_dir = Path(dirpath).relative_to(src_dir)
+        (dest_dir / relative_dir).mkdir(parents=True, exist_ok=True)
+        for filename in filenames:
+            link_or_copy(Path(dirpath) / filename, dest_dir / relative_dir / filename)
+
+def get_clone_destination(src_root: Path, dest: str | None) -> Path:
+    dest_root = Path(dest) if dest else Path.cwd() / src_root.name
+    dest_root = dest_root.resolve()
+    if dest_root.exists() and any(dest_root.iterdir()):
+        raise PigError(f"destination path '{dest_root}' already exists and is not an empty directory")
+    return dest_root
+
+def create_clone_skeleton(src_root: Path, dest_root: Path) -> None:
+    dest_root.mkdir(parents=True, exist_ok=True)
+    (dest_root / ".pig").mkdir()
+    get_commits_dir(dest_root).mkdir()
+    get_compressed_files_dir(dest_root).mkdir()
+    update_staging_info(dest_root, {})
+    # the clone keeps the source's object names, so it keeps its hash algorithm too
+    update_config(dest_root, {"remotes": {"origin": str(src_root)}, **get_format_config(get_hash_algorithm(src_root))})
+
+def set_up_cloned_refs(dest_root: Path, remote_refs: dict[str, str], remote_head: tuple[str, str]) -> None:
+    # like git: every remote branch becomes origin/<branch>, and the one checked out there becomes a local branch
+    branch_heads: dict[str, str | None] = {f"origin/{branch_name}": commit_hash for branch_name, commit_hash in remote_refs.items()}
+    head_type, head_value = remote_head
+    if head_type == "branch" and head_value in remote_refs:
+        branch_heads[head_value] = remote_refs[head_value]
+        update_head(dest_root, HeadInfo(type="branch", value=head_value))
+    else:
+        update_head(dest_root, HeadInfo(type="commit", value=remote_refs.get(head_value, head_value)))
+    write_packed_refs(dest_root, branch_heads)
+
+def clone_shared(src_root: Path, dest_root: Path) -> None:
+    # borrows every object from the source through .pig/alternates instead of copying them;
+    # the source must not have objects garbage collected while clones still depend on it
+    create_clone_skeleton(src_root, dest_root)
+    write_alternates(dest_root, [get_compressed_files_dir(src_root)])
+    link_tree(get_commits_dir(src_root), get_commits_dir(dest_root))
+    # the graph and Bloom files get appended to, so they have to be real copies
+    for path_of in (get_commit_graph_path, get_bloom_filters_path):
+        if path_of(src_root).exists():
+            shutil.copyfile(path_of(src_root), path_of(dest_root))
+    head_info = get_head_info(src_root)
+    set_up_cloned_refs(dest_root, get_branch_heads(src_root), (head_info.type, head_info.value))
+
+def clone_repository(src_root: Path, dest_root: Path) -> int:
+    # fetches the whole history into a new repository; returns the number of commits received
+    create_clone_skeleton(src_root, dest_root)
+    remote_refs, remote_head, received_commits = fetch_pack(dest_root, src_root, set())
+    set_up_cloned_refs(dest_root, remote_refs, remote_head)
+    return len(received_commits)
@@ -1,26 +1,36 @@
-import heapq
+import sys
 from .errors import PigError
 from pathlib import Path
 from typing import Callable
-import hashlib
 import time
-from collections import deque
+import os
 from .repo_utils import (
     find_pig_root_dir,
+    get_head_info,
     update_head,
+    read_config,
+    update_config,
+    get_pig_command,
+    get_worktree_roots,
+    read_worktrees,
+    get_main_worktree_root,
 )
 from .file_helpers import (
-    get_file_hash,
-    write_file_info,
+    find_object_path,
+    store_file,
+    read_compressed_bytes,
 )
 from .staging_helpers import (
     get_staging_info,
     update_staging_info,
+    stage_files,
+    unstage_files,
 )
 from .commit_helpers import (
     current_commit_hash,
     get_commit_info,
-    get_new_commit_hash,
+    get_commit_data,
+    write_commit,
     update_commit_info,
     commit_from_commit_or_branch,
 )
@@ -30,6 +40,7 @@ from .branching import (
     get_current_branch,
     update_branch_head,
     get_branch_heads,
+    get_branch_head,
     delete_branch,
 )
 from .merging import (
@@ -37,6 +48,28 @@ from .merging import (
 )
 from .models import CommitInfo, FileInfo, HeadInfo, StagingFileInfo
 from .git_converter import create_pig_from_git_repo
+from .layout import migrate_to_sharded_layout
+from .hashing import get_format_config
+from .hash_migration import migrate_hash_algorithm
+from .garbage_collection import collect_garbage
+from .fsck import check_repository
+from .refs import pack_refs as pack_loose_refs
+from .commit_graph import CommitGraph, add_commit_to_graph
+from .graph_utils import iter_date_order, iter_topo_order
+from .bloom import get_changed_paths
+from .diffing import get_commit_file_hashes, compare_file_maps, write_diff, write_diff_stat
+from .stat_cache import get_worktree_hashes
+from .blame import blame_file, format_blame
+from .sparse_checkout import read_sparse_prefixes, write_sparse_prefixes, in_sparse_cone, normalize_prefix
+from .recreatedirectory import change_sparse_cone, recreate_directory
+from .fast_import import FastImporter
+from .worktrees import add_worktree, remove_worktree
+from .git_export import GitExporter
+from .clone import get_clone_destination, clone_shared, clone_repository
+from .transport import resolve_remote, fetch_pack, push_pack, serve
+from .graph_utils import get_root_commits
+from .daemon import start_daemon, stop_daemon, is_daemon_running, serve_daemon
+from .log_output import DEFAULT_FORMAT, ONELINE_FORMAT, format_commit, GraphRenderer
 
 def map_command(command: str) -> Callable:
     commandsMap = {
@@ -51,6 +84,23 @@ def map_command(command: str) -> Callable:
         "branch": branch,
         "rm": rm,
         "git-convert": git_convert,
+        "migrate-layout": migrate_layout,
+        "migrate-hash": migrate_hash,
+        "gc": gc,
+        "fsck": fsck,
+        "pack-refs": pack_refs,
+        "diff": diff,
+        "blame": blame,
+        "sparse-checkout": sparse_checkout,
+        "clone": clone,
+        "fetch": fetch,
+        "push": push,
+        "fast-import": fast_import,
+        "git-export": git_export,
+        "upload-pack": upload_pack,
+        "receive-pack": receive_pack,
+        "daemon": daemon,
+        "worktree": worktree,
     }
     if command not in commandsMap:
         raise PigError(f"Unknown command: {command}")
@@ -71,7 +121,9 @@ def init(args):
         pig_dir.mkdir()
         (pig_dir / "commits").mkdir()
         update_commit_info(Path.cwd(), "EMPTY-COMMIT", empty_commit_info)
+        add_commit_to_graph(Path.cwd(), "EMPTY-COMMIT", empty_commit_info, set())
         (pig_dir / "compressed-files").mkdir()
+        update_config(Path.cwd(), get_format_config(args.hash))
         update_staging_info(Path.cwd(), {})
         update_head(Path.cwd(), HeadInfo(type="branch", value="main"))
         update_branch_head(Path.cwd(), "main", "EMPTY-COMMIT")
@@ -80,13 +132,6 @@ def init(args):
     print("Initialized empty pig repository in " + str(pig_dir))
 
 
-def calculate_sha256(filepath: Path) -> str:
-    sha256 = hashlib.sha256()
-    with filepath.open("rb") as f:
-        while chunk := f.read(8192):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
 def add(args):
     filepattern = args.filepattern
     pig_root = find_pig_root_dir()
@@ -94,22 +139,32 @@ def add(args):
         raise PigError("not in a pig repository")
     
     any_matches = False
-    staging_info = get_staging_info(pig_root)
+    staged: dict[str, StagingFileInfo] = {}
     prev_commit_info = get_commit_info(pig_root, current_commit_hash(pig_root))
-    for path in Path.cwd().rglob(filepattern):
-        if not path.is_file():
+    matched_paths = [
+        path.relative_to(pig_root).as_posix() for path in Path.cwd().rglob(filepattern)
+        if ".pig" not in path.relative_to(Path.cwd()).parts
+    ]
+    # the stat cache only decides which files can be skipped as unchanged (and records them so the
+    # next status or diff doesn't re-read them); what gets staged is hashed as it is stored
+    file_hashes = get_worktree_hashes(pig_root, matched_paths)
+    for str_rel_path in matched_paths:
+        if str_rel_path not in file_hashes:
             continue
         any_matches = True
 
-        relative_path = path.relative_to(pig_root)
-        str_rel_path = relative_path.as_posix()
-        file_hash = get_file_hash(path)
-        
-        if str_rel_path in prev_commit_info.files and file_hash == prev_commit_info.files[str_rel_path].hash:
+        relative_path = Path(str_rel_path)
+        committed_hash = prev_commit_info.files[str_rel_path].hash if str_rel_path in prev_commit_info.files else None
+        if file_hashes[str_rel_path] != committed_hash:
+            # like git, the content goes into the store now, so commit can use the staged hash as it is
+            file_hash = store_file(pig_root, pig_root / str_rel_path)
+        else:
+            file_hash = committed_hash
+        if file_hash == committed_hash:
             print(f"File {relative_path} unchanged from last commit; skipping.")
             continue   # no changes made to this file
         
-        staging_info[str_rel_path] = StagingFileInfo(
+        staged[str_rel_path] = StagingFileInfo(
             status="added" if str_rel_path not in prev_commit_info.files else "modified",
             hash=file_hash,
             lastEdited=int(time.time())
@@ -118,10 +173,13 @@ def add(args):
     
     # check if it is a file that was deleted
     if not any_matches:
+        sparse_prefixes = read_sparse_prefixes(pig_root)
         for filepath in prev_commit_info.files.keys():
+            if not in_sparse_cone(filepath, sparse_prefixes):
+                continue    # missing because of sparse checkout, not deleted
             if Path(filepath).match(filepattern) and not (pig_root / filepath).exists():
                 any_matches = True
-                staging_info[filepath] = StagingFileInfo(
+                staged[filepath] = StagingFileInfo(
                     status="deleted",
                     hash="",
                     lastEdited=int(time.time())
@@ -132,7 +190,7 @@ def add(args):
         print("No files matched the given pattern.")
         return
     
-    update_staging_info(pig_root, staging_info)
+    stage_files(pig_root, staged)   # appended to the staging journal, so adding one file doesn't rewrite the others
 
 def rm(args):
     filepattern = args.filepattern
@@ -141,18 +199,17 @@ def rm(args):
         raise PigError("not in a pig repository")
     
     staging_info = get_staging_info(pig_root)
-    any_matches = False
-    for filepath in list(staging_info.keys()):
+    removed = []
+    for filepath in staging_info.keys():
         if Path(filepath).match(filepattern):
-            any_matches = True
-            del staging_info[filepath]
+            removed.append(filepath)
             print(f"Removed {filepath} from staging.")
     
-    if not any_matches:
+    if not removed:
         print("No staged files matched the given pattern.")
         return
     
-    update_staging_info(pig_root, staging_info)
+    unstage_files(pig_root, removed)
 
 
 def status(args):
@@ -171,20 +228,16 @@ def status(args):
     for filepath, file_staging_info in staging_info.items():
         print(f" - {filepath} ({file_staging_info.status})")
 
-def commit_file(pig_root: Path, prev_commit_info: CommitInfo, filepath: Path):
-    if not filepath.is_file():
-        raise PigError(f"tried to commit file {filepath} does not exist")
-    file_hash = get_file_hash(filepath)
-    str_path = filepath.as_posix()
-    if str_path in prev_commit_info.files and prev_commit_info.files[str_path].hash == file_hash:
-        return False    # no changes actually made to this file
-    prev_commit_info.files[str_path] = FileInfo(
-        hash = file_hash,
-        lastEdited = int(time.time())
-    )
-        
-    write_file_info(pig_root, file_hash, filepath)
-    return True
+def get_staged_object_hash(pig_root: Path, filepath: str, file_staging_info: StagingFileInfo) -> str:
+    # add stores the object along with the entry; only entries staged by an older version of pig,
+    # or whose object has since been lost, fall back to the working tree file
+    if find_object_path(pig_root, file_staging_info.hash) is not None:
+        return file_staging_info.hash
+    worktree_path = pig_root / filepath
+    worktree_hash = store_file(pig_root, worktree_path) if worktree_path.is_file() else None
+    if worktree_hash != file_staging_info.hash:
+        raise PigError(f"the staged content of {filepath} is not in the object store and the file has changed since it was added; add it again")
+    return worktree_hash
     
 
 def commit(args):
@@ -198,33 +251,45 @@ def commit(args):
     if not staging_info:
         raise PigError("no files staged for commit")
 
-    current_commit_info = get_commit_info(pig_root, current_commit_hash(pig_root))
-    any_changes = False
+    parent_commit_hash = current_commit_hash(pig_root)
+    current_commit_info = get_commit_info(pig_root, parent_commit_hash)
+    changed_filepaths = set()
+    commit_timestamp = int(time.time())
     for filepath, file_staging_info in staging_info.items():
         if file_staging_info.status == "deleted":
             if filepath in current_commit_info.files:
                 del current_commit_info.files[filepath]
-                any_changes = True
-        elif commit_file(pig_root, current_commit_info, Path(filepath)):
-            any_changes = True
-    if not any_changes:
+                changed_filepaths.add(filepath)
+            continue
+        file_hash = get_staged_object_hash(pig_root, filepath, file_staging_info)
+        previous_file_info = current_commit_info.files.get(filepath)
+        if previous_file_info is not None and previous_file_info.hash == file_hash:
+            continue    # no changes actually made to this file
+        current_commit_info.files[filepath] = FileInfo(hash=file_hash, lastEdited=commit_timestamp)
+        changed_filepaths.add(filepath)
+    if not changed_filepaths:
         raise PigError("no changes to commit")
     
-    new_commit_hash = get_new_commit_hash()
     current_commit_info.commitMessage = message
-    current_commit_info.timestamp = int(time.time())
+    current_commit_info.timestamp = commit_timestamp
     current_commit_info.author = "Pete Crowley"  # placeholder for now
-    current_commit_info.parentCommits = [current_commit_hash(pig_root)]
-    update_commit_info(pig_root, new_commit_hash, current_commit_info)
+    current_commit_info.parentCommits = [parent_commit_hash]
+    new_commit_hash = write_commit(pig_root, current_commit_info)
+    add_commit_to_graph(pig_root, new_commit_hash, current_commit_info, changed_filepaths)
     current_branch = get_current_branch(pig_root)
     if current_branch:
-        update_branch_head(pig_root, current_branch, new_commit_hash)
+        update_branch_head(pig_root, current_branch, new_commit_hash, parent_commit_hash)
     else:
         update_head(pig_root, HeadInfo(type="commit", value=new_commit_hash))
     update_staging_info(pig_root, {})   # clear staging area
     print(f"Committed changes as commit {new_commit_hash}")
     
 
+def get_checkout_jobs(args) -> int | None:
+    if args.jobs is not None and args.jobs <= 0:
+        raise PigError("number of jobs must be positive")
+    return args.jobs
+
 def checkout(args):
     pig_root = find_pig_root_dir()
     if pig_root is None:
@@ -237,7 +302,7 @@ def checkout(args):
     if args.create:
         start_point = commit_from_commit_or_branch(pig_root, args.start_point) if args.start_point else current_commit_hash(pig_root)
         create_branch(pig_root, branch_name, start_point)
-    switch_branch(pig_root, branch_name)
+    switch_branch(pig_root, branch_name, get_checkout_jobs(args))
 
     
 def switch(args):
@@ -248,18 +313,35 @@ def switch(args):
     if staging_info:
         raise PigError("cannot switch branches with staged changes; please commit or unstage them first")
     branch_name = args.name
-    switch_branch(pig_root, branch_name)
+    switch_branch(pig_root, branch_name, get_checkout_jobs(args))
 
 def merge(args):
     pig_root = find_pig_root_dir()
     if pig_root is None:
         raise PigError("not in a pig repository")
     branch_name = args.name
-    target_commit_hash = get_branch_heads(pig_root).get(branch_name)
+    target_commit_hash = get_branch_head(pig_root, branch_name)
     if target_commit_hash is None:
         raise PigError(f"branch '{branch_name}' does not exist")
-    merge_commits(pig_root, target_commit_hash)
-    print(f"Succesfully merged branch '{branch_name}' into current branch.")
+    result = merge_commits(pig_root, target_commit_hash, args.no_ff, get_checkout_jobs(args))
+    if result == "up-to-date":
+        print("Already up to date.")
+    elif result == "fast-forward":
+        print(f"Fast-forwarded current branch to '{branch_name}' ({target_commit_hash}).")
+    else:
+        print(f"Succesfully merged branch '{branch_name}' into current branch.")
+
+def path_changed(pig_root: Path, commit_hash: str, commit_data: dict, paths: list[str]) -> tuple[bool, set[str]]:
+    # returns whether any of paths (files or directories) differs from the first parent,
+    # along with every changed file so the commit's Bloom filter can be recorded
+    commit_files = {filepath: file_info["hash"] for filepath, file_info in commit_data["files"].items()}
+    parent_files = {}
+    if commit_data["parentCommits"]:
+        parent_data = get_commit_data(pig_root, commit_data["parentCommits"][0])
+        parent_files = {filepath: file_info["hash"] for filepath, file_info in parent_data["files"].items()}
+    changed_filepaths = get_changed_paths(parent_files, commit_files)
+    changed = any(filepath == path or filepath.startswith(path + "/") for filepath in changed_filepaths for path in paths)
+    return changed, changed_filepaths
 
 def log(args):
     pig_root = find_pig_root_dir()
@@ -267,43 +349,63 @@ def log(args):
         raise PigError("not in a pig repository")
     if args.number <= 0:
         raise PigError("number of commits to show must be positive")
-
+    paths = []
+    for path in args.paths:
+        # relative to the current directory, like blame
+        try:
+            paths.append((Path.cwd() / path).resolve().relative_to(pig_root.resolve()).as_posix())
+        except ValueError:
+            raise PigError(f"{path} is outside the repository")
+    if "." in paths:
+        paths = []      # the repository root contains every path, so nothing is filtered out
+    if paths and args.graph:
+        raise PigError("--graph cannot be combined with a path filter")
     head = current_commit_hash(pig_root)
+    if paths:
+        # like git's "unknown revision or path", so a mistyped name (or a branch) isn't silently an empty filter
+        head_filepaths = get_commit_data(pig_root, head)["files"].keys()
+        for path, arg in zip(paths, args.paths):
+            if not (pig_root / path).exists() and not any(filepath == path or filepath.startswith(path + "/") for filepath in head_filepaths):
+                raise PigError(f"'{arg}' is neither tracked nor in the working tree; log only takes paths")
 
-    heap = []
-
-    # caches & sets
-    commit_infos = {}
-    discovered = set()
-    printed = set()
-
-    def push_commit(hash_):
-        if hash_ in discovered or hash_ in printed:
-            return
-        info = get_commit_info(pig_root, hash_)
-        commit_infos[hash_] = info
-        heapq.heappush(heap, (-info.timestamp, hash_))
-        discovered.add(hash_)
-
-    push_commit(head)
+    if args.format is not None:
+        log_format = args.format
+    elif args.oneline:
+        log_format = ONELINE_FORMAT
+    else:
+        log_format = DEFAULT_FORMAT
+    commit_graph = CommitGraph(pig_root)
+    # like git, --graph only makes sense when children are always shown before their parents
+    if args.topo_order or args.graph:
+        commit_order = iter_topo_order(commit_graph, [head])
+    else:
+        commit_order = iter_date_order(commit_graph, [head])
+    graph_renderer = GraphRenderer() if args.graph else None
 
+    out = sys.stdout
     printed_count = 0
-    while heap and printed_count < args.number:
-        neg_ts, cur = heapq.heappop(heap)
-        info = commit_infos[cur]
-
-        print(f"Commit: {cur}")
-        print(f"Author: {info.author}")
-        print(f"Date: {time.ctime(info.timestamp)}")
-        print(f"\n    {info.commitMessage}\n")
-
-        printed.add(cur)
+    for commit_hash in commit_order:
+        if printed_count >= args.number:
+            break
+        if paths and not any(commit_graph.may_have_changed(commit_hash, path) for path in paths):
+            continue    # the Bloom filter rules it out without opening the commit
+        # only the commits that are actually considered have their JSON read
+        commit_data = get_commit_data(pig_root, commit_hash)
+        if paths:
+            changed, changed_filepaths = path_changed(pig_root, commit_hash, commit_data, paths)
+            if not commit_graph.has_bloom_filter(commit_hash):
+                commit_graph.add_bloom_filter(commit_hash, changed_filepaths)
+            if not changed:
+                continue
+        entry = format_commit(commit_hash, commit_data, log_format)
+        if graph_renderer is not None:
+            entry = graph_renderer.render(commit_hash, commit_graph.parents(commit_hash), entry)
+        elif not entry.endswith("\n"):
+            entry += "\n"
+        out.write(entry)
         printed_count += 1
-
-        parents = list(info.parentCommits)
-        for p in parents:
-            if p not in discovered and p not in printed:
-                push_commit(p)
+    out.flush()
+    commit_graph.flush()
     
     
 def branch(args):
@@ -312,9 +414,6 @@ def branch(args):
         raise PigError("not in a pig repository")
     if args.delete:
         branch_to_delete = args.delete
-        branch_heads = get_branch_heads(pig_root)
-        if branch_to_delete not in branch_heads:
-            raise PigError(f"branch '{branch_to_delete}' does not exist")
         delete_branch(pig_root, branch_to_delete)
     elif args.create:
         branch_to_create = args.create
@@ -327,7 +426,7 @@ def branch(args):
             print(f"{prefix} {branch_name}")
 
 def git_convert(args):
-    init(None)
+    init(args)
     pig_root = find_pig_root_dir()
     if pig_root is None:
         raise PigError("failed to initialize pig repository")
@@ -336,4 +435,274 @@ def git_convert(args):
     
     create_pig_from_git_repo(args.git_root, pig_root)
     print("Successfully converted git repository to pig repository.")
-    
\ No newline at end of file
+
+def migrate_layout(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    objects_moved, commits_moved = migrate_to_sharded_layout(pig_root)
+    print(f"Moved {objects_moved} objects and {commits_moved} commits into the sharded layout.")
+
+def migrate_hash(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    # a running daemon would keep serving commits it read before they were renamed
+    for worktree_root in get_worktree_roots(pig_root):
+        if stop_daemon(worktree_root):
+            print(f"Stopped pig daemon for {worktree_root}.")
+    objects_renamed, commits_renamed = migrate_hash_algorithm(pig_root, args.algorithm)
+    print(f"Renamed {objects_renamed} objects and {commits_renamed} commits to use {args.algorithm}.")
+
+def gc(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    if args.grace_days < 0:
+        raise PigError("grace period must not be negative")
+    commits_removed, objects_removed, bytes_reclaimed = collect_garbage(pig_root, args.grace_days * 24 * 60 * 60, args.dry_run)
+    if not args.dry_run:
+        pack_loose_refs(pig_root)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {commits_removed} unreachable commits and {objects_removed} unreachable objects ({bytes_reclaimed} bytes).")
+
+def fsck(args) -> int:
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    jobs = args.jobs if args.jobs is not None else (os.cpu_count() or 1)
+    if jobs <= 0:
+        raise PigError("number of jobs must be positive")
+    problems = check_repository(pig_root, jobs)
+    for kind in ("missing", "corrupt", "dangling"):
+        for description in problems[kind]:
+            print(f"{kind} {description}")
+    # dangling files are harmless (gc cleans them up) so only missing and corrupt ones fail the check
+    exit_code = 0
+    if problems["missing"]:
+        exit_code |= 2
+    if problems["corrupt"]:
+        exit_code |= 4
+    return exit_code
+
+def pack_refs(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    packed = pack_loose_refs(pig_root)
+    print(f"Packed {packed} loose branch refs.")
+
+def diff(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    if len(args.commits) > 2:
+        raise PigError("diff takes at most two commits")
+
+    def load_from_store(filepath: str, file_hash: str) -> bytes:
+        return read_compressed_bytes(pig_root, file_hash)
+
+    def load_from_worktree(filepath: str, file_hash: str) -> bytes:
+        return (pig_root / filepath).read_bytes()
+
+    old_commit = commit_from_commit_or_branch(pig_root, args.commits[0]) if args.commits else current_commit_hash(pig_root)
+    old_files = get_commit_file_hashes(pig_root, old_commit)
+    if len(args.commits) == 2:
+        new_files = get_commit_file_hashes(pig_root, commit_from_commit_or_branch(pig_root, args.commits[1]))
+        load_new = load_from_store
+    else:
+        # compare against the working tree: the files tracked at HEAD plus staged additions, minus staged
+        # deletions, hashed through the stat cache; HEAD rather than old_commit, which may be an ancestor
+        head_commit = current_commit_hash(pig_root)
+        head_files = old_files if head_commit == old_commit else get_commit_file_hashes(pig_root, head_commit)
+        staging_info = get_staging_info(pig_root)
+        staged_paths = {filepath for filepath, file_staging_info in staging_info.items() if file_staging_info.status != "deleted"}
+        deleted_paths = {filepath for filepath, file_staging_info in staging_info.items() if file_staging_info.status == "deleted"}
+        sparse_prefixes = read_sparse_prefixes(pig_root)
+        tracked_paths = (head_files.keys() | staged_paths) - deleted_paths
+        new_files = get_worktree_hashes(pig_root, {filepath for filepath in tracked_paths if in_sparse_cone(filepath, sparse_prefixes)})
+        # files outside the sparse cone aren't in the working tree, so they count as unchanged from HEAD
+        new_files.update((filepath, file_hash) for filepath, file_hash in head_files.items() if not in_sparse_cone(filepath, sparse_prefixes))
+        load_new = load_from_worktree
+
+    changes = compare_file_maps(old_files, new_files, load_from_store, load_new)
+    if args.stat:
+        write_diff_stat(sys.stdout, changes, load_from_store, load_new)
+    else:
+        write_diff(sys.stdout, changes, load_from_store, load_new)
+    sys.stdout.flush()
+
+def blame(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    commit_hash = commit_from_commit_or_branch(pig_root, args.commit) if args.commit else current_commit_hash(pig_root)
+    try:
+        filepath = (Path.cwd() / args.path).resolve().relative_to(pig_root.resolve()).as_posix()
+    except ValueError:
+        raise PigError(f"{args.path} is outside the repository")
+    lines, origins = blame_file(pig_root, commit_hash, filepath)
+    sys.stdout.write(format_blame(pig_root, lines, origins))
+    sys.stdout.flush()
+
+def sparse_checkout(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    old_prefixes = read_sparse_prefixes(pig_root)
+    if args.action == "list":
+        if old_prefixes is None:
+            print("Sparse checkout is disabled; every file is checked out.")
+        for prefix in old_prefixes or []:
+            print(prefix)
+        return
+    if get_staging_info(pig_root):
+        raise PigError("cannot change the sparse checkout with staged changes; please commit or unstage them first")
+    if args.action == "set":
+        if not args.prefixes:
+            raise PigError("sparse-checkout set needs at least one directory")
+        new_prefixes = sorted({normalize_prefix(prefix) for prefix in args.prefixes})
+    else:
+        new_prefixes = None
+    change_sparse_cone(pig_root, current_commit_hash(pig_root), old_prefixes, new_prefixes)
+    write_sparse_prefixes(pig_root, new_prefixes)
+    if new_prefixes is None:
+        print("Disabled sparse checkout.")
+    else:
+        print(f"Sparse checkout now includes {', '.join(new_prefixes)} and top-level files.")
+
+def clone(args):
+    src_root = Path(args.source).resolve()
+    if not (src_root / ".pig").is_dir():
+        raise PigError(f"'{args.source}' is not a pig repository")
+    dest_root = get_clone_destination(src_root, args.directory)
+    if args.shared:
+        clone_shared(src_root, dest_root)
+        summary = "sharing its objects"
+    else:
+        received_count = clone_repository(src_root, dest_root)
+        summary = f"received {received_count} commits"
+    recreate_directory(dest_root, current_commit_hash(dest_root))
+    print(f"Cloned {src_root} into {dest_root}, {summary}.")
+
+def get_tracking_prefix(pig_root: Path, remote: str) -> str:
+    # remote branches are kept as "<remote>/<branch>" branches; a plain path uses its directory name
+    if remote in read_config(pig_root).get("remotes", {}):
+        return remote
+    return Path(remote).resolve().name
+
+def fetch(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    remote_root = resolve_remote(pig_root, args.remote)
+    remote_refs, _, received_commits = fetch_pack(pig_root, remote_root, get_root_commits(pig_root))
+    prefix = get_tracking_prefix(pig_root, args.remote)
+    for branch_name, commit_hash in sorted(remote_refs.items()):
+        tracking_branch = f"{prefix}/{branch_name}"
+        old_commit_hash = get_branch_head(pig_root, tracking_branch)
+        if old_commit_hash == commit_hash:
+            continue
+        update_branch_head(pig_root, tracking_branch, commit_hash)
+        change = f"{old_commit_hash[:7]}..{commit_hash[:7]}" if old_commit_hash else "* [new branch]"
+        print(f"  {change:<17} {branch_name} -> {tracking_branch}")
+    print(f"Received {len(received_commits)} new commits from {remote_root}.")
+
+def push(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    branch_name = args.branch or get_current_branch(pig_root)
+    if branch_name is None:
+        raise PigError("HEAD is detached; name the branch to push")
+    remote_root = resolve_remote(pig_root, args.remote)
+    old_commit_hash, new_commit_hash = push_pack(pig_root, remote_root, branch_name, args.force)
+    update_branch_head(pig_root, f"{get_tracking_prefix(pig_root, args.remote)}/{branch_name}", new_commit_hash)
+    if old_commit_hash == new_commit_hash:
+        print("Everything up-to-date.")
+        return
+    change = f"{old_commit_hash[:7]}..{new_commit_hash[:7]}" if old_commit_hash else "* [new branch]"
+    print(f"  {change:<17} {branch_name} -> {branch_name}")
+
+def upload_pack(args):
+    serve("upload-pack", resolve_remote(None, args.directory))
+
+def receive_pack(args):
+    serve("receive-pack", resolve_remote(None, args.directory))
+
+def fast_import(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    importer = FastImporter(pig_root)
+    start = time.perf_counter()
+    skipped_branches = importer.run(sys.stdin.buffer, args.force)
+    elapsed = time.perf_counter() - start
+    for branch_name in skipped_branches:
+        print(f"Not updating branch '{branch_name}': the imported commit does not descend from it (use --force)")
+    rate = importer.commit_count / elapsed if elapsed > 0 else 0.0
+    print(f"Imported {importer.commit_count} commits and {importer.blob_count} blobs in {elapsed:.2f}s ({rate:.0f} commits/s).")
+    return 1 if skipped_branches else 0
+
+def git_export(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    # the stream goes to stdout (or a file), so the summary goes to stderr
+    if args.output:
+        with open(args.output, "wb") as out:
+            exporter = GitExporter(pig_root, out)
+            empty_branches = exporter.export()
+    else:
+        exporter = GitExporter(pig_root, sys.stdout.buffer)
+        empty_branches = exporter.export()
+    for branch_name in empty_branches:
+        print(f"Skipped branch '{branch_name}': it has no commits besides the initial empty one", file=sys.stderr)
+    print(f"Exported {exporter.commit_count} commits and {exporter.blob_count} blobs.", file=sys.stderr)
+
+def daemon(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    if args.action == "start":
+        start_daemon(pig_root, get_pig_command("daemon", "run"))
+        print(f"Started pig daemon for {pig_root}.")
+    elif args.action == "stop":
+        if not stop_daemon(pig_root):
+            raise PigError("no daemon is running for this repository")
+        print("Stopped pig daemon.")
+    elif args.action == "status":
+        running = is_daemon_running(pig_root)
+        print(f"pig daemon is {'running' if running else 'not running'}.")
+        return 0 if running else 1
+    else:
+        # imported here because the CLI module imports this one
+        from .cli import run_command
+        serve_daemon(pig_root, run_command)
+
+def worktree(args):
+    pig_root = find_pig_root_dir()
+    if pig_root is None:
+        raise PigError("not in a pig repository")
+    if args.action == "list":
+        main_root = get_main_worktree_root(pig_root)
+        for worktree_root in [main_root, *read_worktrees(pig_root)]:
+            if not (worktree_root / ".pig").is_dir():
+                print(f"{worktree_root}  (missing; remove it with `pig worktree remove`)")
+                continue
+            head_info = get_head_info(worktree_root)
+            if head_info.type == "branch":
+                print(f"{worktree_root}  {current_commit_hash(worktree_root)[:7]} [{head_info.value}]")
+            else:
+                print(f"{worktree_root}  {head_info.value[:7]} (detached HEAD)")
+        return
+    if args.path is None:
+        raise PigError(f"worktree {args.action} needs a path")
+    if args.action == "add":
+        if args.branch is None:
+            raise PigError("worktree add needs a branch to check out")
+        add_worktree(pig_root, Path(args.path), args.branch, get_checkout_jobs(args))
+        print(f"Checked out '{args.branch}' into {Path(args.path).resolve()}.")
+    else:
+        remove_worktree(pig_root, Path(args.path), args.force)
+        print(f"Removed worktree {Path(args.path).resolve()}.")
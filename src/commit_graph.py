@@ -0,0 +1,157 @@
+from pathlib import Path
+from .commit_helpers import get_commit_data
+from .errors import PigError
+from .repo_utils import get_common_dir, append_lines_atomically, write_file_atomically
+from .models import CommitInfo
+from .warm_cache import warm_cached
+from .bloom import (
+    BloomFilter,
+    build_bloom_filter,
+    bloom_filter_may_contain,
+    get_changed_paths,
+    read_bloom_filters,
+    append_bloom_filters,
+)
+
+# The commit graph is an append-only index with one line per commit:
+#   <commit hash> <generation> <timestamp> <parent>,<parent>...
+# so walks over history only need this one file instead of every commit's JSON.
+# Generation numbers are 1 for a root commit and 1 + the largest parent generation otherwise,
+# which means a commit can never be an ancestor of a commit with a lower or equal generation.
+# A line torn by a crash is skipped when reading; the commits it named are read from their
+# files again and appended once more the next time a walk reaches them.
+
+type GraphEntry = tuple[int, int, tuple[str, ...]]   # (generation, timestamp, parents)
+
+def get_commit_graph_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "commit-graph"
+
+@warm_cached("commit-graph", copy=dict)
+def read_commit_graph(pig_root: Path) -> dict[str, GraphEntry]:
+    commit_graph_path = get_commit_graph_path(pig_root)
+    if not commit_graph_path.exists():
+        return {}
+    entries: dict[str, GraphEntry] = {}
+    with open(commit_graph_path) as f:
+        for line in f:
+            if not line.endswith("\n"):
+                continue    # torn by an append that was interrupted
+            try:
+                commit_hash, generation, timestamp, parents = line.split()
+                entries[commit_hash] = (int(generation), int(timestamp), tuple(parents.split(",")) if parents != "-" else ())
+            except ValueError:
+                continue
+    return entries
+
+def format_graph_line(commit_hash: str, entry: GraphEntry) -> str:
+    generation, timestamp, parents = entry
+    return f"{commit_hash} {generation} {timestamp} {','.join(parents) or '-'}\n"
+
+def write_commit_graph(pig_root: Path, entries: dict[str, GraphEntry]) -> None:
+    write_file_atomically(get_commit_graph_path(pig_root), "".join(format_graph_line(commit_hash, entry) for commit_hash, entry in entries.items()))
+
+class CommitGraph:
+    def __init__(self, pig_root: Path) -> None:
+        self._pig_root = pig_root
+        self._entries = read_commit_graph(pig_root)
+        self._unwritten: dict[str, GraphEntry] = {}
+        self._bloom_filters: dict[str, BloomFilter] | None = None    # only loaded by path-limited walks
+        self._unwritten_bloom_filters: dict[str, BloomFilter] = {}
+
+    def __contains__(self, commit_hash: str) -> bool:
+        return commit_hash in self._entries
+
+    def entry(self, commit_hash: str) -> GraphEntry:
+        if commit_hash not in self._entries:
+            self._fill(commit_hash)
+        return self._entries[commit_hash]
+
+    def generation(self, commit_hash: str) -> int:
+        return self.entry(commit_hash)[0]
+
+    def timestamp(self, commit_hash: str) -> int:
+        return self.entry(commit_hash)[1]
+
+    def parents(self, commit_hash: str) -> tuple[str, ...]:
+        return self.entry(commit_hash)[2]
+
+    def add(self, commit_hash: str, commit_info: CommitInfo, changed_filepaths: set[str] | None = None) -> None:
+        # called right after a commit is written so the index never has to be rebuilt;
+        # changed_filepaths (relative to the first parent) saves re-reading the parent when the caller knows them
+        if commit_hash in self._entries:
+            return      # commits are named after their content, so this one was written before
+        generation = 1 + max((self.generation(parent_hash) for parent_hash in commit_info.parentCommits), default=0)
+        entry = (generation, commit_info.timestamp, tuple(commit_info.parentCommits))
+        self._entries[commit_hash] = entry
+        self._unwritten[commit_hash] = entry
+        if changed_filepaths is None:
+            parent_files = {}
+            if commit_info.parentCommits:
+                parent_data = get_commit_data(self._pig_root, commit_info.parentCommits[0])
+                parent_files = {filepath: file_info["hash"] for filepath, file_info in parent_data["files"].items()}
+            commit_files = {filepath: file_info.hash for filepath, file_info in commit_info.files.items()}
+            changed_filepaths = get_changed_paths(parent_files, commit_files)
+        self.add_bloom_filter(commit_hash, changed_filepaths)
+
+    def add_bloom_filter(self, commit_hash: str, changed_filepaths: set[str]) -> None:
+        bloom_filter = build_bloom_filter(changed_filepaths)
+        if self._bloom_filters is not None:
+            self._bloom_filters[commit_hash] = bloom_filter
+        self._unwritten_bloom_filters[commit_hash] = bloom_filter
+
+    def has_bloom_filter(self, commit_hash: str) -> bool:
+        if self._bloom_filters is None:
+            self._bloom_filters = read_bloom_filters(self._pig_root)
+        return commit_hash in self._bloom_filters or commit_hash in self._unwritten_bloom_filters
+
+    def may_have_changed(self, commit_hash: str, path: str) -> bool:
+        # False means the path (a file or a directory) is definitely unchanged from the first parent
+        if not self.has_bloom_filter(commit_hash):
+            return True
+        assert self._bloom_filters is not None
+        bloom_filter = self._bloom_filters.get(commit_hash, self._unwritten_bloom_filters.get(commit_hash))
+        return bloom_filter_may_contain(bloom_filter, path)
+
+    def flush(self) -> None:
+        # if another process holds the lock, the entries are left out; like those of commits from
+        # before the index existed, they are rebuilt from the commit files when next needed
+        if self._unwritten:
+            try:
+                append_lines_atomically(get_commit_graph_path(self._pig_root), "".join(format_graph_line(commit_hash, entry) for commit_hash, entry in self._unwritten.items()))
+            except PigError:
+                pass
+            self._unwritten.clear()
+        if self._unwritten_bloom_filters:
+            try:
+                append_bloom_filters(self._pig_root, self._unwritten_bloom_filters)
+            except PigError:
+                pass
+            self._unwritten_bloom_filters.clear()
+
+    def _fill(self, commit_hash: str) -> None:
+        # commits written before the index existed are read once and then appended to it
+        commit_datas = {}
+        stack = [commit_hash]
+        while stack:
+            current_hash = stack[-1]
+            if current_hash in self._entries:
+                stack.pop()
+                continue
+            if current_hash not in commit_datas:
+                commit_datas[current_hash] = get_commit_data(self._pig_root, current_hash)
+            commit_data = commit_datas[current_hash]
+            missing_parents = [parent_hash for parent_hash in commit_data["parentCommits"] if parent_hash not in self._entries]
+            if missing_parents:
+                stack.extend(missing_parents)
+                continue
+            generation = 1 + max((self._entries[parent_hash][0] for parent_hash in commit_data["parentCommits"]), default=0)
+            entry = (generation, commit_data["timestamp"], tuple(commit_data["parentCommits"]))
+            self._entries[current_hash] = entry
+            self._unwritten[current_hash] = entry
+            stack.pop()
+        self.flush()
+
+def add_commit_to_graph(pig_root: Path, commit_hash: str, commit_info: CommitInfo, changed_filepaths: set[str] | None = None) -> None:
+    commit_graph = CommitGraph(pig_root)
+    commit_graph.add(commit_hash, commit_info, changed_filepaths)
+    commit_graph.flush()
@@ -1,46 +1,100 @@
 import json
 from pathlib import Path
-import hashlib
-import time
-import random
+from typing import Iterator
 from .errors import PigError
-from .repo_utils import get_head_info
+from .repo_utils import get_common_dir, get_head_info, get_sharded_path, write_file_atomically
+from .hashing import get_hash_algorithm, new_hasher
 from .models import CommitInfo
+from .refs import get_branch_head
+from .tracing import span
+from .warm_cache import warm_cached, COMMITS_NAMESPACE
 
 def current_commit_hash(pig_root: Path) -> str:
     head_info = get_head_info(pig_root)
     if head_info.type == "commit":
         return head_info.value
     elif head_info.type == "branch":
-        branch_heads_path = pig_root / ".pig" / "BRANCH_HEADS.json"
-        if not branch_heads_path.exists():
-            raise PigError("BRANCH_HEADS file does not exist")
-        branch_heads = json.loads(branch_heads_path.read_text())
-        if head_info.value not in branch_heads:
+        branch_head = get_branch_head(pig_root, head_info.value)
+        if branch_head is None:
             raise PigError(f"branch '{head_info.value}' does not exist")
-        return branch_heads[head_info.value]
+        return branch_head
     else:
         raise PigError("Invalid HEAD type")
     
-def get_new_commit_hash() -> str:
-    return hashlib.sha256(f"{time.time_ns()}-{random.random()}".encode()).hexdigest()
+def serialize_commit(info: CommitInfo) -> str:
+    # the canonical form a commit is stored in and named after: sorted keys, no whitespace, ASCII only
+    return json.dumps(info.model_dump(), sort_keys=True, separators=(",", ":"))
+
+def get_commit_hash(algorithm: str, content: str) -> str:
+    hasher = new_hasher(algorithm)
+    hasher.update(content.encode())
+    return hasher.hexdigest()
+
+def get_commits_dir(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "commits"
+
+def get_commit_path(pig_root: Path, commit_hash: str) -> Path:
+    return get_sharded_path(get_commits_dir(pig_root), f"{commit_hash}.json")
+
+def iter_commit_hashes(pig_root: Path) -> Iterator[str]:
+    for shard in get_commits_dir(pig_root).iterdir():
+        if not shard.is_dir():
+            continue
+        for commit_path in shard.iterdir():
+            yield shard.name + commit_path.name.removesuffix(".json")
+
+@warm_cached(COMMITS_NAMESPACE)
+def get_commit_data(pig_root: Path, commit_hash: str) -> dict:
+    # raw commit JSON without model validation, for walks over many commits; callers only read it
+    with span("get_commit_data") as s:
+        commit_path = get_commit_path(pig_root, commit_hash)
+        if not commit_path.exists():
+            raise PigError(f"commit {commit_hash} does not exist")
+        content = commit_path.read_bytes()
+        s.add(bytes=len(content))
+        return json.loads(content)
 
 def get_commit_info(pig_root: Path, commit_hash: str) -> CommitInfo:
-    commit_path = pig_root / ".pig" / "commits" / f"{commit_hash}.json"
-    if not commit_path.exists():
-        raise PigError(f"commit {commit_hash} does not exist")
-    return CommitInfo(**json.loads(commit_path.read_text()))
+    with span("get_commit_info") as s:
+        commit_path = get_commit_path(pig_root, commit_hash)
+        if not commit_path.exists():
+            raise PigError(f"commit {commit_hash} does not exist")
+        content = commit_path.read_text()
+        s.add(bytes=len(content))
+        with span("json.loads"):
+            data = json.loads(content)
+        with span("CommitInfo validation"):
+            return CommitInfo(**data)
     
+def write_commit(pig_root: Path, info: CommitInfo, algorithm: str | None = None) -> str:
+    # commits are named after their content, so writing the same commit twice stores it once;
+    # returns the commit hash. algorithm overrides the repository's, for `pig migrate-hash`
+    with span("write_commit") as s:
+        with span("json.dumps"):
+            content = serialize_commit(info)
+        commit_hash = get_commit_hash(algorithm or get_hash_algorithm(pig_root), content)
+        commit_path = get_commit_path(pig_root, commit_hash)
+        if not commit_path.exists():
+            commit_path.parent.mkdir(exist_ok=True)
+            # renamed into place, so a commit file is never seen half-written under its final name
+            write_file_atomically(commit_path, content)
+        s.add(bytes=len(content))
+        return commit_hash
+
 def update_commit_info(pig_root: Path, commit_hash: str, info: CommitInfo):
-    commit_path = pig_root / ".pig" / "commits" / f"{commit_hash}.json"
-    commit_path.write_text(json.dumps(info.model_dump(), indent=4))
+    # for commits with a fixed name, i.e. EMPTY-COMMIT; everything else goes through write_commit
+    with span("update_commit_info") as s:
+        commit_path = get_commit_path(pig_root, commit_hash)
+        commit_path.parent.mkdir(exist_ok=True)
+        with span("json.dumps"):
+            content = serialize_commit(info)
+        commit_path.write_text(content)
+        s.add(bytes=len(content))
 
 def commit_from_commit_or_branch(pig_root: Path, branch_name_or_commit_hash: str) -> str:
-    branch_heads_path = pig_root / ".pig" / "BRANCH_HEADS.json"
-    if branch_heads_path.exists():
-        branch_heads = json.loads(branch_heads_path.read_text())
-        if branch_name_or_commit_hash in branch_heads:
-            return branch_heads[branch_name_or_commit_hash]
-    if (pig_root / ".pig" / "commits" / f"{branch_name_or_commit_hash}.json").exists():
+    branch_head = get_branch_head(pig_root, branch_name_or_commit_hash)
+    if branch_head is not None:
+        return branch_head
+    if get_commit_path(pig_root, branch_name_or_commit_hash).exists():
         return branch_name_or_commit_hash
     raise PigError(f"branch or commit '{branch_name_or_commit_hash}' does not exist")
\ No newline at end of file
@@ -0,0 +1,269 @@
+from pathlib import Path
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+import traceback
+from typing import Callable
+from .errors import PigError
+from .commit_helpers import get_commits_dir
+from .refs import get_loose_refs_dir
+from .repo_utils import get_common_dir
+from .warm_cache import enable_warm_caches, invalidate_commits, invalidate_state
+from .daemon_client import get_daemon_socket_path, send_daemon_request
+
+# `pig daemon run` serves the commands in daemon_client.FORWARDED_COMMANDS for one repository from a
+# single process, so they skip interpreter start-up and imports and reuse parsed state (see
+# warm_cache.py). Requests are handled one at a time, each in the client's working directory with
+# its output captured. Before every request the daemon drains its watcher: any change under .pig
+# (and, in a linked worktree, under the main repository's .pig) drops the cached state, and deleted commit files drop the cached commits. The working tree isn't
+# watched; the stat cache already re-checks every file's mtime and size.
+
+START_TIMEOUT = 10.0
+STOP_TIMEOUT = 10.0
+IDLE_CHECK_INTERVAL = 60.0      # how often an idle daemon checks that its repository still exists
+REQUEST_READ_TIMEOUT = 1.0      # a client that connects but doesn't send its request line is dropped after this
+IGNORED_NAMES = {"daemon.sock", "daemon.log", "blame-cache", "compressed-files", "tmp-recreate", "merge"}
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ONLYDIR = 0x01000000
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+STATE_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+COMMITS_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")   # wd, mask, cookie, name length
+
+def get_daemon_log_path(pig_root: Path) -> Path:
+    return pig_root / ".pig" / "daemon.log"
+
+def is_ignored_name(name: str) -> bool:
+    return name in IGNORED_NAMES or name.endswith(".lock")
+
+class InotifyWatcher:
+    # watches .pig, the loose refs and the commit shards; the events are only read when asked for
+    def __init__(self, pig_root: Path) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._pig_dir = pig_root / ".pig"
+        self._common_dir = get_common_dir(pig_root)
+        self._loose_refs_dir = get_loose_refs_dir(pig_root)
+        self._commits_dir = get_commits_dir(pig_root)
+        self._watches: dict[int, Path] = {}
+        self.add_watch(self._pig_dir, STATE_MASK)
+        if self._common_dir != self._pig_dir:
+            self.add_watch(self._common_dir, STATE_MASK)
+        for refs_dir in (self._loose_refs_dir.parent, self._loose_refs_dir):
+            if refs_dir.is_dir():
+                self.add_watch(refs_dir, STATE_MASK)
+        self.add_watch(self._commits_dir, COMMITS_MASK)
+        for shard in self._commits_dir.iterdir():
+            if shard.is_dir():
+                self.add_watch(shard, COMMITS_MASK)
+
+    def add_watch(self, path: Path, mask: int) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._watches[wd] = path
+
+    def read_events(self) -> list[tuple[Path | None, int, str]]:
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                events.append((self._watches.get(wd), mask, name))
+
+    def get_changes(self) -> tuple[bool, bool]:
+        # (state changed, commits deleted) since the last call
+        state_changed = commits_deleted = False
+        for directory, mask, name in self.read_events():
+            if mask & IN_Q_OVERFLOW:
+                return True, True
+            if directory is None or is_ignored_name(name):
+                continue
+            if directory == self._commits_dir or directory.parent == self._commits_dir:
+                if mask & IN_CREATE and mask & IN_ISDIR and directory == self._commits_dir:
+                    self.add_watch(directory / name, COMMITS_MASK)     # a new shard
+                commits_deleted |= bool(mask & (IN_DELETE | IN_MOVED_FROM))
+                continue
+            if mask & IN_CREATE and mask & IN_ISDIR and directory / name in (self._loose_refs_dir.parent, self._loose_refs_dir):
+                self.add_watch(directory / name, STATE_MASK)
+            state_changed = True
+        return state_changed, commits_deleted
+
+class PollingWatcher:
+    # fallback where inotify isn't available: compares modification times before every request
+    def __init__(self, pig_root: Path) -> None:
+        self._pig_dir = pig_root / ".pig"
+        self._common_dir = get_common_dir(pig_root)
+        self._loose_refs_dir = get_loose_refs_dir(pig_root)
+        self._commits_dir = get_commits_dir(pig_root)
+        self._state, self._commit_shards = self.snapshot()
+
+    def scan(self, directory: Path) -> dict[str, tuple[int, int]]:
+        if not directory.is_dir():
+            return {}
+        with os.scandir(directory) as entries:
+            return {
+                entry.path: (entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in entries if not is_ignored_name(entry.name) and entry.is_file()
+            }
+
+    def snapshot(self) -> tuple[dict, dict]:
+        state = self.scan(self._pig_dir) | self.scan(self._common_dir) | self.scan(self._loose_refs_dir)
+        # a shard's mtime moves when a commit is added or deleted, so this is conservative
+        with os.scandir(self._commits_dir) as shards:
+            commit_shards = {shard.name: shard.stat().st_mtime_ns for shard in shards if shard.is_dir()}
+        return state, commit_shards
+
+    def get_changes(self) -> tuple[bool, bool]:
+        state, commit_shards = self.snapshot()
+        changes = (state != self._state, commit_shards != self._commit_shards)
+        self._state, self._commit_shards = state, commit_shards
+        return changes
+
+def create_watcher(pig_root: Path) -> InotifyWatcher | PollingWatcher:
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(pig_root)
+        except (OSError, AttributeError) as e:     # AttributeError: a libc without inotify
+            print(f"inotify unavailable ({e}); polling for changes instead")
+    return PollingWatcher(pig_root)
+
+def run_forwarded_command(pig_root: Path, run_command: Callable[[list[str]], int], argv: list[str], cwd: str) -> dict:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            exit_code = run_command(argv)
+        except SystemExit as e:     # argparse errors and --help
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            os.chdir(pig_root)
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": exit_code}
+
+def serve_daemon(pig_root: Path, run_command: Callable[[list[str]], int]) -> None:
+    socket_path = get_daemon_socket_path(pig_root)
+    if is_daemon_running(pig_root):
+        raise PigError("a daemon is already running for this repository")
+    socket_path.unlink(missing_ok=True)    # left behind by a daemon that was killed
+    watcher = create_watcher(pig_root)
+    enable_warm_caches()
+    os.chdir(pig_root)
+    # turn SIGTERM into a normal exit so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        try:
+            server.bind(str(socket_path))
+        except OSError as e:
+            raise PigError(f"cannot listen on {socket_path}: {e}")
+        try:
+            os.chmod(socket_path, 0o600)
+            server.listen()
+            server.settimeout(IDLE_CHECK_INTERVAL)
+            print(f"pig daemon {os.getpid()} listening on {socket_path}", flush=True)
+            while True:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    if not socket_path.exists():
+                        return      # the repository (or just the socket) was deleted
+                    continue
+                with connection:
+                    # requests are served one at a time, so a client that stalls mustn't hold up the others
+                    connection.settimeout(REQUEST_READ_TIMEOUT)
+                    try:
+                        with connection.makefile("rb") as f:
+                            request = json.loads(f.readline() or "{}")
+                    except (OSError, ValueError):
+                        continue
+                    connection.settimeout(None)
+                    if request.get("type") == "stop":
+                        connection.sendall(b'{"ok": true}\n')
+                        return
+                    if request.get("type") == "run":
+                        try:
+                            connection.sendall(b'{"accepted": true}\n')
+                        except OSError:
+                            continue    # the client already gave up and is running the command itself
+                        state_changed, commits_deleted = watcher.get_changes()
+                        if state_changed:
+                            invalidate_state()
+                        if commits_deleted:
+                            invalidate_commits()
+                        response = run_forwarded_command(pig_root, run_command, request["argv"], request["cwd"])
+                    else:
+                        response = {"ok": True}
+                    try:
+                        connection.sendall(json.dumps(response).encode() + b"\n")
+                    except OSError:
+                        pass    # the client gave up waiting
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+def is_daemon_running(pig_root: Path) -> bool:
+    try:
+        return send_daemon_request(get_daemon_socket_path(pig_root), {"type": "ping"}, timeout=START_TIMEOUT).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+def start_daemon(pig_root: Path, pig_command: list[str]) -> None:
+    # runs `pig daemon run` in its own session and waits until it answers
+    if is_daemon_running(pig_root):
+        raise PigError("a daemon is already running for this repository")
+    with open(get_daemon_log_path(pig_root), "ab") as log_file:
+        process = subprocess.Popen(
+            pig_command,
+            cwd=pig_root,
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=log_file,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while not is_daemon_running(pig_root):
+        if process.poll() is not None:
+            raise PigError(f"daemon exited with code {process.returncode}; see {get_daemon_log_path(pig_root)}")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise PigError(f"daemon did not start within {START_TIMEOUT:.0f}s; see {get_daemon_log_path(pig_root)}")
+        time.sleep(0.05)
+
+def stop_daemon(pig_root: Path) -> bool:
+    # returns False if no daemon was running
+    socket_path = get_daemon_socket_path(pig_root)
+    try:
+        send_daemon_request(socket_path, {"type": "stop"}, timeout=STOP_TIMEOUT)
+    except (OSError, ValueError):
+        socket_path.unlink(missing_ok=True)
+        return False
+    deadline = time.monotonic() + STOP_TIMEOUT
+    while socket_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return True
@@ -0,0 +1,68 @@
+from pathlib import Path
+import json
+import os
+import socket
+import sys
+
+# The client half of `pig daemon`. main.py calls forward_to_daemon before importing anything else,
+# so this module only uses the standard library: a forwarded command costs one interpreter start,
+# one socket round trip and no pydantic import.
+#
+# Protocol: one JSON request line, one JSON response line.
+#   {"type": "run", "argv": [...], "cwd": "..."} -> {"accepted": true} as soon as the daemon starts on it,
+#                                                  then {"stdout": "...", "stderr": "...", "exit_code": 0}
+#   {"type": "ping"} / {"type": "stop"}        -> {"ok": true}
+
+FORWARDED_COMMANDS = {"status", "log", "diff", "blame"}    # read-only, so a daemon can't act on stale state
+NO_DAEMON_ENV_VAR = "PIG_NO_DAEMON"
+CONNECT_TIMEOUT = 1.0
+FORWARD_TIMEOUT = 10.0      # if the daemon hasn't accepted a command by then it is presumed stuck and the command runs locally
+
+def find_repository_root(start: Path) -> Path | None:
+    # the same search as repo_utils.find_pig_root_dir, which can't be imported without pydantic
+    for directory in [start, *start.parents]:
+        if (directory / ".pig").is_dir():
+            return directory
+        if directory == Path.home():
+            return None
+    return None
+
+def get_daemon_socket_path(pig_root: Path) -> Path:
+    return pig_root / ".pig" / "daemon.sock"
+
+def send_daemon_request(socket_path: Path, request: dict, timeout: float | None = None) -> dict:
+    # raises OSError if nothing is listening and ValueError if the daemon went away mid-request
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(str(socket_path))
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            response = f.readline()
+            if response and json.loads(response).get("accepted"):
+                # the daemon is running the command; however long it takes, running it here too would only double the work
+                sock.settimeout(None)
+                response = f.readline()
+    if not response:
+        raise ValueError("daemon closed the connection without answering")
+    return json.loads(response)
+
+def forward_to_daemon(argv: list[str]) -> int | None:
+    # returns the command's exit code, or None if it has to run in this process instead
+    if not argv or argv[0] not in FORWARDED_COMMANDS:
+        return None     # also covers global options such as --trace, which the daemon can't honor
+    if os.environ.get(NO_DAEMON_ENV_VAR) or os.environ.get("PIG_TRACE"):
+        return None
+    pig_root = find_repository_root(Path.cwd())
+    if pig_root is None:
+        return None
+    socket_path = get_daemon_socket_path(pig_root)
+    if not socket_path.exists():
+        return None
+    try:
+        response = send_daemon_request(socket_path, {"type": "run", "argv": argv, "cwd": os.getcwd()}, timeout=FORWARD_TIMEOUT)
+    except (OSError, ValueError):
+        return None     # a stale socket from a daemon that was killed, or one that is stuck: just run the command here
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
@@ -0,0 +1,179 @@
+from typing import Sequence, Iterator
+
+# Line diffs using Myers' O(ND) algorithm. Opcodes have the same shape as difflib's
+# (tag, i1, i2, j1, j2) with tag one of "equal", "replace", "delete" or "insert".
+
+type Opcode = tuple[str, int, int, int, int]
+
+MAX_EDIT_DISTANCE = 2000    # beyond this Myers gets quadratic, so split on unique lines first
+
+def myers_edit_path(a: Sequence[int], b: Sequence[int], max_d: int) -> list[tuple[int, int]] | None:
+    # returns the (x, y) points where the shortest edit path leaves a diagonal, or None if it is longer than max_d
+    n, m = len(a), len(b)
+    offset = n + m + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(min(n + m, max_d) + 1):
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return backtrack(trace, n, m)
+    return None
+
+def backtrack(trace: list[list[int]], n: int, m: int) -> list[tuple[int, int]]:
+    # walks the saved frontiers backwards, yielding the single-line edits as (x, y) steps
+    x, y = n, m
+    points = [(x, y)]
+    for d in range(len(trace) - 1, 0, -1):
+        v = trace[d]    # frontier before step d, indexed by k + d
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d] < v[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            points.append((x, y))
+        x, y = prev_x, prev_y
+        points.append((x, y))
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        points.append((x, y))
+    points.reverse()
+    return points
+
+def points_to_opcodes(points: list[tuple[int, int]], a_start: int, b_start: int) -> list[Opcode]:
+    opcodes: list[Opcode] = []
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        if x2 - x1 == 1 and y2 - y1 == 1:
+            tag = "equal"
+        elif x2 - x1 == 1:
+            tag = "delete"
+        else:
+            tag = "insert"
+        append_opcode(opcodes, (tag, a_start + x1, a_start + x2, b_start + y1, b_start + y2))
+    return opcodes
+
+def append_opcode(opcodes: list[Opcode], opcode: Opcode) -> None:
+    # merges runs of the same tag and turns neighbouring deletes and inserts into a replace
+    tag, i1, i2, j1, j2 = opcode
+    if i1 == i2 and j1 == j2:
+        return
+    if opcodes:
+        last_tag, last_i1, last_i2, last_j1, last_j2 = opcodes[-1]
+        if last_tag == tag or (last_tag != "equal" and tag != "equal"):
+            merged_tag = tag if last_tag == tag else "replace"
+            opcodes[-1] = (merged_tag, last_i1, i2, last_j1, j2)
+            return
+    opcodes.append(opcode)
+
+def unique_common_anchors(a: Sequence[int], b: Sequence[int]) -> list[tuple[int, int]]:
+    # patience diff: lines that appear exactly once on each side, reduced to their longest increasing run
+    counts: dict[int, list[int]] = {}
+    for i, line in enumerate(a):
+        counts.setdefault(line, [0, 0, i, -1])[0] += 1
+    for j, line in enumerate(b):
+        if line in counts:
+            counts[line][1] += 1
+            counts[line][3] = j
+    pairs = sorted((entry[2], entry[3]) for entry in counts.values() if entry[0] == 1 and entry[1] == 1)
+    # longest increasing subsequence on the b indexes
+    tails: list[int] = []
+    tail_indexes: list[int] = []
+    previous = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < j:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            previous[index] = tail_indexes[lo - 1]
+        if lo == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[lo] = j
+            tail_indexes[lo] = index
+    anchors = []
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index != -1:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+def diff_range(a: Sequence[int], b: Sequence[int], a_start: int, b_start: int, opcodes: list[Opcode]) -> None:
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    append_opcode(opcodes, ("equal", a_start, a_start + prefix, b_start, b_start + prefix))
+    a_core = a[prefix:len(a) - suffix]
+    b_core = b[prefix:len(b) - suffix]
+    a_core_start = a_start + prefix
+    b_core_start = b_start + prefix
+
+    points = myers_edit_path(a_core, b_core, MAX_EDIT_DISTANCE)
+    if points is not None:
+        for opcode in points_to_opcodes(points, a_core_start, b_core_start):
+            append_opcode(opcodes, opcode)
+    else:
+        anchors = unique_common_anchors(a_core, b_core)
+        if not anchors:
+            append_opcode(opcodes, ("replace", a_core_start, a_core_start + len(a_core), b_core_start, b_core_start + len(b_core)))
+        else:
+            last_i, last_j = 0, 0
+            for i, j in anchors:
+                diff_range(a_core[last_i:i], b_core[last_j:j], a_core_start + last_i, b_core_start + last_j, opcodes)
+                append_opcode(opcodes, ("equal", a_core_start + i, a_core_start + i + 1, b_core_start + j, b_core_start + j + 1))
+                last_i, last_j = i + 1, j + 1
+            diff_range(a_core[last_i:], b_core[last_j:], a_core_start + last_i, b_core_start + last_j, opcodes)
+    append_opcode(opcodes, ("equal", a_start + len(a) - suffix, a_start + len(a), b_start + len(b) - suffix, b_start + len(b)))
+
+def get_opcodes(a: Sequence[str], b: Sequence[str]) -> list[Opcode]:
+    # lines are interned to ints so comparisons inside the Myers loop are cheap
+    line_ids: dict[str, int] = {}
+    a_ids = [line_ids.setdefault(line, len(line_ids)) for line in a]
+    b_ids = [line_ids.setdefault(line, len(line_ids)) for line in b]
+    opcodes: list[Opcode] = []
+    diff_range(a_ids, b_ids, 0, 0, opcodes)
+    return opcodes
+
+def group_opcodes(opcodes: list[Opcode], context: int = 3) -> Iterator[list[Opcode]]:
+    # splits opcodes into hunks with at most `context` unchanged lines around each change
+    if not opcodes:
+        return
+    if opcodes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes = [(tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)] + opcodes[1:]
+    if opcodes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes = opcodes[:-1] + [(tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))]
+    group: list[Opcode] = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
@@ -0,0 +1,186 @@
+from pathlib import Path
+from typing import Callable, Literal, NamedTuple, TextIO
+from .commit_helpers import get_commit_data
+from .diff_engine import Opcode, get_opcodes, group_opcodes
+
+SIMILARITY_THRESHOLD = 50   # percent, same default as git's -M
+RENAME_LIMIT = 400          # like git's diff.renameLimit, inexact detection is skipped past this many candidates
+BINARY_CHECK_BYTES = 8000
+
+type ContentLoader = Callable[[str, str], bytes]   # (path, hash) -> file content
+
+class FileChange(NamedTuple):
+    status: Literal["added", "deleted", "modified", "renamed"]
+    old_path: str | None
+    new_path: str | None
+    old_hash: str | None
+    new_hash: str | None
+    similarity: int = 100
+
+def get_commit_file_hashes(pig_root: Path, commit_hash: str) -> dict[str, str]:
+    return {filepath: file_info["hash"] for filepath, file_info in get_commit_data(pig_root, commit_hash)["files"].items()}
+
+def get_similarity_signature(content: bytes) -> dict[bytes, int]:
+    # bytes contributed by each distinct line, a cheap stand-in for git's span hashes
+    signature: dict[bytes, int] = {}
+    for line in content.splitlines(keepends=True):
+        signature[line] = signature.get(line, 0) + len(line)
+    return signature
+
+def get_similarity(old_signature: dict[bytes, int], old_size: int, new_signature: dict[bytes, int], new_size: int) -> int:
+    if max(old_size, new_size) == 0:
+        return 100
+    if old_size > new_size:
+        old_signature, new_signature = new_signature, old_signature
+    shared = sum(min(size, new_signature.get(line, 0)) for line, size in old_signature.items())
+    return shared * 100 // max(old_size, new_size)
+
+def find_renames(deleted: dict[str, str], added: dict[str, str], load_old: ContentLoader, load_new: ContentLoader) -> list[FileChange]:
+    # removes the paths it pairs up from deleted and added
+    renames: list[FileChange] = []
+    deleted_by_hash: dict[str, list[str]] = {}
+    for old_path, old_hash in sorted(deleted.items()):
+        deleted_by_hash.setdefault(old_hash, []).append(old_path)
+    for new_path, new_hash in sorted(added.items()):
+        if deleted_by_hash.get(new_hash):
+            old_path = deleted_by_hash[new_hash].pop(0)
+            renames.append(FileChange("renamed", old_path, new_path, new_hash, new_hash))
+    for rename in renames:
+        del deleted[rename.old_path]
+        del added[rename.new_path]
+
+    if not deleted or not added or len(deleted) * len(added) > RENAME_LIMIT * RENAME_LIMIT:
+        return renames
+    old_signatures = {}
+    for old_path, old_hash in deleted.items():
+        content = load_old(old_path, old_hash)
+        old_signatures[old_path] = (get_similarity_signature(content), len(content))
+    new_signatures = {}
+    for new_path, new_hash in added.items():
+        content = load_new(new_path, new_hash)
+        new_signatures[new_path] = (get_similarity_signature(content), len(content))
+    candidates = []
+    for old_path, (old_signature, old_size) in old_signatures.items():
+        for new_path, (new_signature, new_size) in new_signatures.items():
+            # files of very different sizes can't reach the threshold, so skip comparing them
+            if min(old_size, new_size) * 100 < SIMILARITY_THRESHOLD * max(old_size, new_size):
+                continue
+            similarity = get_similarity(old_signature, old_size, new_signature, new_size)
+            if similarity >= SIMILARITY_THRESHOLD:
+                candidates.append((similarity, old_path, new_path))
+    for similarity, old_path, new_path in sorted(candidates, key=lambda candidate: (-candidate[0], candidate[1], candidate[2])):
+        if old_path not in deleted or new_path not in added:
+            continue
+        renames.append(FileChange("renamed", old_path, new_path, deleted.pop(old_path), added.pop(new_path), similarity))
+    return renames
+
+def compare_file_maps(old_files: dict[str, str], new_files: dict[str, str], load_old: ContentLoader, load_new: ContentLoader) -> list[FileChange]:
+    # only hashes are compared here; content is loaded just for rename candidates
+    changes: list[FileChange] = []
+    for filepath in old_files.keys() & new_files.keys():
+        if old_files[filepath] != new_files[filepath]:
+            changes.append(FileChange("modified", filepath, filepath, old_files[filepath], new_files[filepath]))
+    deleted = {filepath: file_hash for filepath, file_hash in old_files.items() if filepath not in new_files}
+    added = {filepath: file_hash for filepath, file_hash in new_files.items() if filepath not in old_files}
+    changes.extend(find_renames(deleted, added, load_old, load_new))
+    changes.extend(FileChange("deleted", filepath, None, file_hash, None) for filepath, file_hash in deleted.items())
+    changes.extend(FileChange("added", None, filepath, None, file_hash) for filepath, file_hash in added.items())
+    changes.sort(key=lambda change: change.new_path or change.old_path or "")
+    return changes
+
+def is_binary(content: bytes) -> bool:
+    return b"\0" in content[:BINARY_CHECK_BYTES]
+
+def load_change_lines(change: FileChange, load_old: ContentLoader, load_new: ContentLoader) -> tuple[list[str], list[str]] | None:
+    # returns None for binary files
+    old_content = load_old(change.old_path, change.old_hash) if change.old_path and change.old_hash else b""
+    new_content = load_new(change.new_path, change.new_hash) if change.new_path and change.new_hash else b""
+    if is_binary(old_content) or is_binary(new_content):
+        return None
+    return (
+        old_content.decode("utf-8", "replace").splitlines(keepends=True),
+        new_content.decode("utf-8", "replace").splitlines(keepends=True),
+    )
+
+def format_range(start: int, stop: int) -> str:
+    # same convention as unified diff headers: 1-based, length omitted when it is 1
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+def format_diff_line(prefix: str, line: str) -> str:
+    if line.endswith("\n"):
+        return prefix + line
+    return prefix + line + "\n\\ No newline at end of file\n"
+
+def format_patch(change: FileChange, lines: tuple[list[str], list[str]] | None) -> str:
+    old_name = change.old_path or change.new_path
+    new_name = change.new_path or change.old_path
+    header = [f"diff --pig a/{old_name} b/{new_name}\n"]
+    if change.status == "added":
+        header.append("new file\n")
+    elif change.status == "deleted":
+        header.append("deleted file\n")
+    elif change.status == "renamed":
+        header.append(f"similarity index {change.similarity}%\n")
+        header.append(f"rename from {change.old_path}\n")
+        header.append(f"rename to {change.new_path}\n")
+        if change.old_hash == change.new_hash:
+            return "".join(header)
+    if lines is None:
+        header.append(f"Binary files a/{old_name} and b/{new_name} differ\n")
+        return "".join(header)
+    header.append(f"--- {'a/' + change.old_path if change.old_path else '/dev/null'}\n")
+    header.append(f"+++ {'b/' + change.new_path if change.new_path else '/dev/null'}\n")
+    old_lines, new_lines = lines
+    body = []
+    for group in group_opcodes(get_opcodes(old_lines, new_lines)):
+        body.append(f"@@ -{format_range(group[0][1], group[-1][2])} +{format_range(group[0][3], group[-1][4])} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                body.extend(format_diff_line(" ", line) for line in old_lines[i1:i2])
+                continue
+            body.extend(format_diff_line("-", line) for line in old_lines[i1:i2])
+            body.extend(format_diff_line("+", line) for line in new_lines[j1:j2])
+    return "".join(header + body)
+
+def count_changed_lines(opcodes: list[Opcode]) -> tuple[int, int]:
+    insertions = sum(j2 - j1 for tag, _, _, j1, j2 in opcodes if tag != "equal")
+    deletions = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag != "equal")
+    return insertions, deletions
+
+def write_diff(out: TextIO, changes: list[FileChange], load_old: ContentLoader, load_new: ContentLoader) -> None:
+    for change in changes:
+        out.write(format_patch(change, load_change_lines(change, load_old, load_new)))
+
+def write_diff_stat(out: TextIO, changes: list[FileChange], load_old: ContentLoader, load_new: ContentLoader) -> None:
+    rows = []
+    total_insertions = 0
+    total_deletions = 0
+    for change in changes:
+        name = f"{change.old_path} => {change.new_path}" if change.status == "renamed" else (change.new_path or change.old_path or "")
+        if change.status == "renamed" and change.old_hash == change.new_hash:
+            rows.append((name, 0, 0, False))
+            continue
+        lines = load_change_lines(change, load_old, load_new)
+        if lines is None:
+            rows.append((name, 0, 0, True))
+            continue
+        insertions, deletions = count_changed_lines(get_opcodes(*lines))
+        total_insertions += insertions
+        total_deletions += deletions
+        rows.append((name, insertions, deletions, False))
+    if not rows:
+        return
+    name_width = max(len(name) for name, _, _, _ in rows)
+    max_changes = max(insertions + deletions for _, insertions, deletions, _ in rows)
+    bar_width = 40
+    for name, insertions, deletions, binary in rows:
+        if binary:
+            out.write(f" {name.ljust(name_width)} | Bin\n")
+            continue
+        scale = min(1.0, bar_width / max_changes) if max_changes else 1.0
+        bar = "+" * round(insertions * scale) + "-" * round(deletions * scale)
+        out.write(f" {name.ljust(name_width)} | {insertions + deletions:>5} {bar}\n".rstrip() + "\n")
+    out.write(f" {len(rows)} file{'s' if len(rows) != 1 else ''} changed, {total_insertions} insertions(+), {total_deletions} deletions(-)\n")
@@ -0,0 +1,252 @@
+from pathlib import Path
+import re
+import time
+from typing import BinaryIO
+from .errors import PigError
+from .models import CommitInfo, FileInfo
+from .file_helpers import get_file_hash_from_content, write_file_info_from_content
+from .commit_helpers import get_commit_info, get_commit_path, write_commit
+from .commit_graph import CommitGraph
+from .graph_utils import find_merge_base
+from .refs import get_branch_heads, update_branch_heads_packed
+from .git_converter import decode_git_quoted_path
+
+# Reads the subset of git's fast-import format that describes plain file history:
+#
+#   blob / mark :<n> / data <size> + raw bytes
+#   commit <ref> / mark :<n> / author|committer <name> [<email>] <unix time> <tz> / data <size> + message
+#       / from <commit-ish> / merge <commit-ish>... / M <mode> <:mark|inline> <path> / D <path> / deleteall
+#   reset <ref> [/ from <commit-ish>]
+#   progress <message>, checkpoint, done
+#
+# where <commit-ish> is a mark, a branch or a pig commit hash. Objects go straight into the store,
+# each branch's current file map is kept in memory, and branches are written once at the end.
+
+ROOT_COMMIT = "EMPTY-COMMIT"
+SKIPPED_MODES = {"160000", "040000"}    # submodules and directories have no file content to store
+
+class StreamReader:
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self._pending: str | None = None
+        self.line_number = 0
+
+    def read_line(self) -> str | None:
+        # None at the end of the stream; blank lines between commands are skipped
+        if self._pending is not None:
+            line, self._pending = self._pending, None
+            return line
+        while True:
+            raw_line = self._stream.readline()
+            if not raw_line:
+                return None
+            self.line_number += 1
+            line = raw_line.decode("utf-8", "surrogateescape").rstrip("\n")
+            if line and not line.startswith("#"):
+                return line
+
+    def unread_line(self, line: str) -> None:
+        self._pending = line
+
+    def read_data(self, line: str | None) -> bytes:
+        if line is None or not line.startswith("data "):
+            raise self.error(f"expected 'data <size>', got {line!r}")
+        size = line[5:]
+        if not size.isdigit():
+            raise self.error("only the 'data <size>' form of data is supported")
+        content = self._stream.read(int(size))
+        if len(content) != int(size):
+            raise self.error("stream ended in the middle of a data block")
+        self.line_number += content.count(b"\n")
+        return content
+
+    def error(self, message: str) -> PigError:
+        return PigError(f"fast-import stream line {self.line_number}: {message}")
+
+IDENTITY_PATTERN = re.compile(r"^(?P<name>.*?)\s*(?:<[^>]*>)?\s*(?:(?P<time>\d+)\s+[+-]\d{4})?$")
+
+def parse_identity(value: str) -> tuple[str, int | None]:
+    # "<name> <<email>> <unix time> <tz>" -> (name, unix time)
+    match = IDENTITY_PATTERN.match(value)
+    assert match is not None    # every part of the pattern is optional
+    return match.group("name") or "Unknown", int(match.group("time")) if match.group("time") else None
+
+def get_branch_name(ref: str) -> str:
+    return ref.removeprefix("refs/heads/")
+
+class FastImporter:
+    def __init__(self, pig_root: Path) -> None:
+        self._pig_root = pig_root
+        self._marks: dict[str, str] = {}
+        self._original_heads = get_branch_heads(pig_root)
+        self._branch_heads: dict[str, str] = {}
+        self._file_maps: dict[str, dict[str, FileInfo]] = {}    # commit hash -> files, for branch tips only
+        self._commit_graph = CommitGraph(pig_root)
+        self.commit_count = 0
+        self.blob_count = 0
+
+    def resolve_commit(self, commit_ish: str, reader: StreamReader) -> str:
+        if commit_ish.startswith(":"):
+            if commit_ish not in self._marks:
+                raise reader.error(f"unknown mark {commit_ish}")
+            return self._marks[commit_ish]
+        branch_name = get_branch_name(commit_ish)
+        if branch_name in self._branch_heads:
+            return self._branch_heads[branch_name]
+        if branch_name in self._original_heads:
+            return self._original_heads[branch_name]
+        if get_commit_path(self._pig_root, commit_ish).exists():
+            return commit_ish
+        raise reader.error(f"unknown commit or branch '{commit_ish}'")
+
+    def get_files(self, commit_hash: str) -> dict[str, FileInfo]:
+        if commit_hash not in self._file_maps:
+            self._file_maps[commit_hash] = get_commit_info(self._pig_root, commit_hash).files
+        return self._file_maps[commit_hash]
+
+    def store_blob(self, content: bytes) -> str:
+        file_hash = get_file_hash_from_content(self._pig_root, content)
+        write_file_info_from_content(self._pig_root, file_hash, content)
+        self.blob_count += 1
+        return file_hash
+
+    def read_blob(self, reader: StreamReader) -> None:
+        line = reader.read_line()
+        mark = None
+        if line is not None and line.startswith("mark "):
+            mark = line[5:]
+            line = reader.read_line()
+        file_hash = self.store_blob(reader.read_data(line))
+        if mark is not None:
+            self._marks[mark] = file_hash
+
+    def read_commit(self, reader: StreamReader, ref: str) -> None:
+        branch_name = get_branch_name(ref)
+        mark = None
+        author = None
+        timestamp = None
+        line = reader.read_line()
+        while line is not None and line.split(" ", 1)[0] in ("mark", "author", "committer", "original-oid", "encoding"):
+            kind, _, value = line.partition(" ")
+            if kind == "mark":
+                mark = value
+            elif kind == "author" or author is None:    # the author wins over the committer
+                author, timestamp = parse_identity(value)
+            line = reader.read_line()
+        message = reader.read_data(line).decode("utf-8", "replace").rstrip("\n")
+
+        parent_hashes: list[str] = []
+        line = reader.read_line()
+        if line is not None and line.startswith("from "):
+            parent_hashes.append(self.resolve_commit(line[5:], reader))
+            line = reader.read_line()
+        elif branch_name in self._branch_heads or branch_name in self._original_heads:
+            branch_head = self.resolve_commit(branch_name, reader)
+            if branch_head != ROOT_COMMIT:
+                parent_hashes.append(branch_head)
+        while line is not None and line.startswith("merge "):
+            parent_hashes.append(self.resolve_commit(line[6:], reader))
+            line = reader.read_line()
+        if not parent_hashes:
+            parent_hashes = [ROOT_COMMIT]    # like git-convert, every history starts from the empty commit
+
+        commit_timestamp = timestamp if timestamp is not None else int(time.time())
+        parent_files = self.get_files(parent_hashes[0])
+        files = dict(parent_files)
+        while line is not None and (line[:2] in ("M ", "D ") or line == "deleteall"):
+            if line == "deleteall":
+                files.clear()
+            elif line.startswith("D "):
+                files.pop(decode_git_quoted_path(line[2:]), None)
+            else:
+                mode, data_ref, path = line[2:].split(" ", 2)
+                path = decode_git_quoted_path(path)
+                if data_ref == "inline":
+                    file_hash = self.store_blob(reader.read_data(reader.read_line()))
+                elif mode in SKIPPED_MODES:
+                    file_hash = None
+                elif data_ref.startswith(":"):
+                    if data_ref not in self._marks:
+                        raise reader.error(f"unknown mark {data_ref}")
+                    file_hash = self._marks[data_ref]
+                else:
+                    raise reader.error("files must refer to a blob mark or be inline")
+                if file_hash is not None:
+                    existing = files.get(path)
+                    if existing is None or existing.hash != file_hash:
+                        files[path] = FileInfo(hash=file_hash, lastEdited=commit_timestamp)
+            line = reader.read_line()
+        if line is not None:
+            reader.unread_line(line)
+
+        changed_filepaths = {
+            filepath for filepath in parent_files.keys() | files.keys()
+            if filepath not in parent_files or filepath not in files or parent_files[filepath].hash != files[filepath].hash
+        }
+        # the file map was built from already valid entries, so validating it again would only cost time
+        commit_info = CommitInfo.model_construct(
+            commitMessage=message,
+            author=author or "Unknown",
+            timestamp=commit_timestamp,
+            parentCommits=parent_hashes,
+            files=files,
+        )
+        commit_hash = write_commit(self._pig_root, commit_info)
+        self._commit_graph.add(commit_hash, commit_info, changed_filepaths)
+        previous_head = self._branch_heads.get(branch_name)
+        self._branch_heads[branch_name] = commit_hash
+        self._file_maps[commit_hash] = files
+        if previous_head is not None and previous_head not in self._branch_heads.values():
+            self._file_maps.pop(previous_head, None)    # only branch tips are kept in memory
+        if mark is not None:
+            self._marks[mark] = commit_hash
+        self.commit_count += 1
+
+    def read_reset(self, reader: StreamReader, ref: str) -> None:
+        line = reader.read_line()
+        if line is not None and line.startswith("from "):
+            self._branch_heads[get_branch_name(ref)] = self.resolve_commit(line[5:], reader)
+        else:
+            if line is not None:
+                reader.unread_line(line)
+            # the branch's next commit is a root commit, so its head before the import mustn't be used
+            self._branch_heads[get_branch_name(ref)] = ROOT_COMMIT
+
+    def flush(self, force: bool) -> list[str]:
+        # writes the commit graph and every branch in one go; returns branches not updated because
+        # the new head doesn't descend from the old one (unless force)
+        self._commit_graph.flush()
+        updates = {}
+        skipped = []
+        for branch_name, commit_hash in self._branch_heads.items():
+            if commit_hash == ROOT_COMMIT:
+                continue    # reset without any commit after it; the branch is left as it was
+            old_commit_hash = self._original_heads.get(branch_name)
+            if not force and old_commit_hash is not None and find_merge_base(self._pig_root, old_commit_hash, commit_hash) != old_commit_hash:
+                skipped.append(branch_name)
+                continue
+            updates[branch_name] = commit_hash
+        if updates:
+            update_branch_heads_packed(self._pig_root, updates)
+        self._original_heads.update(updates)
+        return skipped
+
+    def run(self, stream: BinaryIO, force: bool) -> list[str]:
+        reader = StreamReader(stream)
+        while (line := reader.read_line()) is not None:
+            command, _, argument = line.partition(" ")
+            if command == "blob":
+                self.read_blob(reader)
+            elif command == "commit":
+                self.read_commit(reader, argument)
+            elif command == "reset":
+                self.read_reset(reader, argument)
+            elif command == "progress":
+                print(argument)
+            elif command == "checkpoint":
+                self.flush(force)
+            elif command == "done":
+                break
+            elif command not in ("feature", "option"):
+                raise reader.error(f"unsupported command '{command}'")
+        return self.flush(force)
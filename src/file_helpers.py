@@ -1,42 +1,142 @@
 
 from pathlib import Path
 import gzip
-import shutil
-import hashlib
+import os
+import tempfile
+from typing import Iterable, Iterator
 from .errors import PigError
+from .repo_utils import get_common_dir, get_sharded_path
+from .alternates import get_alternate_object_dirs
+from .hashing import get_hash_algorithm, new_hasher
+from .tracing import span
 
-def write_file_info(pig_root: Path, file_hash: str, filepath: Path):
-    compressed_dir = pig_root / ".pig" / "compressed-files"
-    dest_path = compressed_dir / file_hash
-    if dest_path.exists():
+def get_compressed_files_dir(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "compressed-files"
+
+def get_object_path(pig_root: Path, file_hash: str) -> Path:
+    return get_sharded_path(get_compressed_files_dir(pig_root), file_hash)
+
+def find_object_path(pig_root: Path, file_hash: str) -> Path | None:
+    # the repository's own store first, then any alternates; None if the object is nowhere
+    object_path = get_object_path(pig_root, file_hash)
+    if object_path.exists():
+        return object_path
+    for object_dir in get_alternate_object_dirs(pig_root):
+        object_path = get_sharded_path(object_dir, file_hash)
+        if object_path.exists():
+            return object_path
+    return None
+
+def iter_object_hashes(pig_root: Path) -> Iterator[str]:
+    for shard in get_compressed_files_dir(pig_root).iterdir():
+        if not shard.is_dir():
+            continue
+        for object_path in shard.iterdir():
+            yield shard.name + object_path.name
+
+def freshen_object(object_path: Path) -> None:
+    # like git, an object that is about to be referenced again gets a new mtime so gc's grace
+    # period protects it; one in an alternate we can't write to is left as it is
+    try:
+        os.utime(object_path)
+    except OSError:
+        pass
+
+def install_object(pig_root: Path, file_hash: str, tmp_path: Path) -> None:
+    # moves a fully written temp file under its object name, unless the object is already stored
+    existing_path = find_object_path(pig_root, file_hash)
+    if existing_path is not None:
+        freshen_object(existing_path)
         return
-    with open(filepath, "rb") as f_in:
-        with gzip.open(dest_path, "wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
+    dest_path = get_object_path(pig_root, file_hash)
+    dest_path.parent.mkdir(exist_ok=True)
+    tmp_path.replace(dest_path)
 
-def write_file_info_from_content(pig_root: Path, file_hash: str, content: bytes):
-    compressed_dir = pig_root / ".pig" / "compressed-files"
-    dest_path = compressed_dir / file_hash
-    if dest_path.exists():
+def write_object(pig_root: Path, file_hash: str, chunks: Iterable[bytes]) -> None:
+    # compresses into a temp file that is only renamed under its name once complete, so a crash or
+    # a concurrent reader (the daemon, a repository borrowing through alternates) never sees half an object
+    existing_path = find_object_path(pig_root, file_hash)
+    if existing_path is not None:
+        freshen_object(existing_path)      # already stored here or in an alternate
         return
-    with gzip.open(dest_path, "wb") as f_out:
-        f_out.write(content)
+    fd, tmp_name = tempfile.mkstemp(prefix="tmp-", dir=get_compressed_files_dir(pig_root))
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f_tmp, gzip.GzipFile(fileobj=f_tmp, mode="wb") as f_out:
+            for chunk in chunks:
+                f_out.write(chunk)
+        install_object(pig_root, file_hash, tmp_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def write_file_info(pig_root: Path, file_hash: str, filepath: Path):
+    with span("write_file_info") as s:
+        with open(filepath, "rb") as f_in:
+            write_object(pig_root, file_hash, iter(lambda: f_in.read(1 << 16), b""))
+            s.add(bytes=f_in.tell())
+
+def store_file(pig_root: Path, filepath: Path) -> str:
+    # hashes the bytes as they are compressed and names the object after that digest, so an edit
+    # racing with the store (or a stale stat cache entry) can't put content under the wrong name;
+    # returns the hash
+    with span("store_file") as s:
+        objects_dir = get_compressed_files_dir(pig_root)
+        hasher = new_hasher(get_hash_algorithm(pig_root))
+        fd, tmp_name = tempfile.mkstemp(prefix="tmp-", dir=objects_dir)
+        tmp_path = Path(tmp_name)
+        try:
+            with open(filepath, "rb") as f_in, os.fdopen(fd, "wb") as f_tmp, gzip.GzipFile(fileobj=f_tmp, mode="wb") as f_out:
+                while chunk := f_in.read(1 << 16):
+                    hasher.update(chunk)
+                    f_out.write(chunk)
+                s.add(bytes=f_in.tell())
+            file_hash = hasher.hexdigest()
+            install_object(pig_root, file_hash, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return file_hash
+
+def write_file_info_from_content(pig_root: Path, file_hash: str, content: bytes):
+    with span("write_file_info", bytes=len(content)):
+        write_object(pig_root, file_hash, [content])
 
 def read_compressed_file(pig_root: Path, file_hash: str) -> list[str]:
-    compressed_file_path = pig_root / ".pig" / "compressed-files" / file_hash
-    if not compressed_file_path.exists():
-        raise PigError(f"compressed file {file_hash} does not exist")
-    with gzip.open(compressed_file_path, "rt") as f:
-        return f.readlines()
+    with span("read_compressed_file"):
+        compressed_file_path = find_object_path(pig_root, file_hash)
+        if compressed_file_path is None:
+            raise PigError(f"compressed file {file_hash} does not exist")
+        with gzip.open(compressed_file_path, "rt") as f:
+            return f.readlines()
     
-def get_file_hash(filepath: Path) -> str:
-    hasher = hashlib.sha256()
-    with open(filepath, "rb") as f:
-        while chunk := f.read(8192):
+def read_compressed_bytes(pig_root: Path, file_hash: str) -> bytes:
+    with span("read_compressed_file") as s:
+        compressed_file_path = find_object_path(pig_root, file_hash)
+        if compressed_file_path is None:
+            raise PigError(f"compressed file {file_hash} does not exist")
+        with gzip.open(compressed_file_path, "rb") as f:
+            content = f.read()
+        s.add(bytes=len(content))
+        return content
+
+def get_compressed_file_hash(compressed_file_path: Path, algorithm: str) -> str:
+    # streams the decompression so objects never have to fit in memory
+    hasher = new_hasher(algorithm)
+    with gzip.open(compressed_file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
             hasher.update(chunk)
     return hasher.hexdigest()
 
-def get_file_hash_from_content(content: bytes) -> str:
-    hasher = hashlib.sha256()
-    hasher.update(content)
-    return hasher.hexdigest()
\ No newline at end of file
+def get_file_hash(pig_root: Path, filepath: Path) -> str:
+    with span("get_file_hash") as s:
+        hasher = new_hasher(get_hash_algorithm(pig_root))
+        with open(filepath, "rb") as f:
+            while chunk := f.read(1 << 16):
+                hasher.update(chunk)
+            s.add(bytes=f.tell())
+        return hasher.hexdigest()
+
+def get_file_hash_from_content(pig_root: Path, content: bytes) -> str:
+    with span("get_file_hash", bytes=len(content)):
+        hasher = new_hasher(get_hash_algorithm(pig_root))
+        hasher.update(content)
+        return hasher.hexdigest()
@@ -0,0 +1,93 @@
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import batched
+import json
+import zlib
+from .file_helpers import get_object_path, find_object_path, get_compressed_file_hash, iter_object_hashes
+from .commit_helpers import get_commit_path, iter_commit_hashes
+from .branching import get_branch_heads
+from .repo_utils import get_head_info, get_worktree_roots
+from .staging_helpers import get_staging_info
+from .hashing import get_hash_algorithm
+
+OBJECT_BATCH_SIZE = 256
+
+def verify_object_batch(pig_root: Path, algorithm: str, file_hashes: list[str]) -> list[str]:
+    # runs in a worker process; returns the hashes that are corrupt
+    corrupt = []
+    for file_hash in file_hashes:
+        try:
+            if get_compressed_file_hash(get_object_path(pig_root, file_hash), algorithm) != file_hash:
+                corrupt.append(file_hash)
+        except (OSError, EOFError, zlib.error):
+            corrupt.append(file_hash)
+    return corrupt
+
+def verify_objects(pig_root: Path, file_hashes: set[str], jobs: int) -> list[str]:
+    corrupt: list[str] = []
+    algorithm = get_hash_algorithm(pig_root)     # read here so the workers don't each read the config
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # only keep a couple of batches per worker in flight so memory stays bounded
+        pending = set()
+        for batch in batched(file_hashes, OBJECT_BATCH_SIZE):
+            if len(pending) >= jobs * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    corrupt.extend(future.result())
+            pending.add(executor.submit(verify_object_batch, pig_root, algorithm, list(batch)))
+        for future in pending:
+            corrupt.extend(future.result())
+    return corrupt
+
+def check_repository(pig_root: Path, jobs: int) -> dict[str, list[str]]:
+    problems: dict[str, list[str]] = {"missing": [], "corrupt": [], "dangling": []}
+    present_objects = set(iter_object_hashes(pig_root))
+    present_commits = set(iter_commit_hashes(pig_root))
+    referenced_objects: set[str] = set()
+    referenced_commits: set[str] = set()
+
+    for file_hash in verify_objects(pig_root, present_objects, jobs):
+        problems["corrupt"].append(f"object {file_hash}")
+
+    for commit_hash in present_commits:
+        try:
+            commit_data = json.loads(get_commit_path(pig_root, commit_hash).read_bytes())
+            parent_hashes = commit_data["parentCommits"]
+            # every entry is checked before any is used, so a malformed one marks the whole commit corrupt
+            file_hashes = {filepath: file_info["hash"] for filepath, file_info in commit_data["files"].items()}
+            if not isinstance(parent_hashes, list) or not all(isinstance(value, str) for value in [*parent_hashes, *file_hashes.values()]):
+                raise TypeError("commit hashes must be strings")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            problems["corrupt"].append(f"commit {commit_hash}")
+            continue
+        for parent_hash in parent_hashes:
+            referenced_commits.add(parent_hash)
+            if parent_hash not in present_commits:
+                problems["missing"].append(f"commit {parent_hash} (parent of {commit_hash})")
+        for filepath, file_hash in file_hashes.items():
+            referenced_objects.add(file_hash)
+            if file_hash not in present_objects and find_object_path(pig_root, file_hash) is None:
+                problems["missing"].append(f"object {file_hash} ({filepath} in commit {commit_hash})")
+
+    root_commits = {"EMPTY-COMMIT": "the initial commit"}
+    root_commits.update({commit_hash: f"branch '{name}'" for name, commit_hash in get_branch_heads(pig_root).items()})
+    for worktree_root in get_worktree_roots(pig_root):
+        head_info = get_head_info(worktree_root)
+        if head_info.type == "commit":
+            root_commits[head_info.value] = "HEAD" if worktree_root == pig_root else f"HEAD of worktree {worktree_root}"
+    for commit_hash, referrer in root_commits.items():
+        referenced_commits.add(commit_hash)
+        if commit_hash not in present_commits:
+            problems["missing"].append(f"commit {commit_hash} ({referrer})")
+    for worktree_root in get_worktree_roots(pig_root):
+        for filepath, staging_file_info in get_staging_info(worktree_root).items():
+            if not staging_file_info.hash:
+                continue
+            referenced_objects.add(staging_file_info.hash)
+
+    # like git, dangling means nothing refers to it at all, not merely unreachable from a branch
+    for commit_hash in sorted(present_commits - referenced_commits):
+        problems["dangling"].append(f"commit {commit_hash}")
+    for file_hash in sorted(present_objects - referenced_objects):
+        problems["dangling"].append(f"object {file_hash}")
+    return problems
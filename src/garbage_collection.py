@@ -0,0 +1,75 @@
+from pathlib import Path
+import time
+from .file_helpers import find_object_path, get_compressed_files_dir, get_object_path, iter_object_hashes
+from .commit_helpers import get_commits_dir, get_commit_path, iter_commit_hashes
+from .graph_utils import get_root_commits, find_reachable
+from .commit_graph import read_commit_graph, write_commit_graph
+from .bloom import read_bloom_filters, write_bloom_filters
+from .blame import get_blame_cache_dir
+
+def remove_empty_shards(directory: Path) -> None:
+    for shard in directory.iterdir():
+        if shard.is_dir() and not any(shard.iterdir()):
+            shard.rmdir()
+
+def sweep_paths(paths: list[Path], cutoff: float, dry_run: bool) -> tuple[int, int]:
+    # returns (number of files removed, bytes reclaimed)
+    removed = 0
+    reclaimed = 0
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue    # e.g. a temp file renamed into place by an add that just finished
+        if stat.st_mtime > cutoff:
+            continue    # still inside the grace period, a running command may be about to reference it
+        removed += 1
+        reclaimed += stat.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    return removed, reclaimed
+
+def prune_blame_cache(pig_root: Path) -> None:
+    # drops the cached blames of commits and objects that no longer exist
+    blame_cache_dir = get_blame_cache_dir(pig_root)
+    if not blame_cache_dir.exists():
+        return
+    for cache_path in blame_cache_dir.glob("*/*.json"):
+        # sharded like objects, so the first two characters of the name are the directory's
+        file_hash, _, commit_hash = (cache_path.parent.name + cache_path.stem).partition("-")
+        if not get_commit_path(pig_root, commit_hash).exists() or find_object_path(pig_root, file_hash) is None:
+            cache_path.unlink()
+    remove_empty_shards(blame_cache_dir)
+
+def collect_garbage(pig_root: Path, grace_period_seconds: float, dry_run: bool = False) -> tuple[int, int, int]:
+    # returns (commits removed, objects removed, bytes reclaimed)
+    reachable_commits, reachable_objects = find_reachable(pig_root, get_root_commits(pig_root))
+    cutoff = time.time() - grace_period_seconds
+
+    unreachable_commit_paths = [
+        get_commit_path(pig_root, commit_hash)
+        for commit_hash in iter_commit_hashes(pig_root)
+        if commit_hash not in reachable_commits
+    ]
+    unreachable_object_paths = [
+        get_object_path(pig_root, file_hash)
+        for file_hash in iter_object_hashes(pig_root)
+        if file_hash not in reachable_objects
+    ]
+    commits_removed, commit_bytes = sweep_paths(unreachable_commit_paths, cutoff, dry_run)
+    objects_removed, object_bytes = sweep_paths(unreachable_object_paths, cutoff, dry_run)
+    # temp files of an add that crashed before renaming its object into place; a running add's are
+    # still inside the grace period
+    _, tmp_bytes = sweep_paths(list(get_compressed_files_dir(pig_root).glob("tmp-*")), cutoff, dry_run)
+
+    if not dry_run:
+        if commits_removed:
+            def still_exists(commit_hash: str) -> bool:
+                return commit_hash in reachable_commits or get_commit_path(pig_root, commit_hash).exists()
+            write_commit_graph(pig_root, {commit_hash: entry for commit_hash, entry in read_commit_graph(pig_root).items() if still_exists(commit_hash)})
+            write_bloom_filters(pig_root, {commit_hash: bloom_filter for commit_hash, bloom_filter in read_bloom_filters(pig_root).items() if still_exists(commit_hash)})
+        if commits_removed or objects_removed:
+            prune_blame_cache(pig_root)
+        remove_empty_shards(get_commits_dir(pig_root))
+        remove_empty_shards(get_compressed_files_dir(pig_root))
+    return commits_removed, objects_removed, commit_bytes + object_bytes + tmp_bytes
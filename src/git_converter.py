@@ -2,10 +2,18 @@ from pathlib import Path
 import subprocess
 from typing import Optional
 from .file_helpers import get_file_hash_from_content, write_file_info_from_content
-from .commit_helpers import update_commit_info, get_commit_info, get_new_commit_hash
+from .commit_helpers import get_commit_info, write_commit
 from .models import CommitInfo, FileInfo
 from .branching import update_branch_head
+from .refs import pack_refs
+from .commit_graph import CommitGraph
+from .tracing import span
 
+def run_git(git_root: Path, args: list[str], **kwargs) -> subprocess.CompletedProcess:
+    with span(f"git {args[0]}") as s:
+        result = subprocess.run(["git", *args], cwd=git_root, capture_output=True, **kwargs)
+        s.add(bytes=len(result.stdout))
+        return result
 
 class CatFileBatch:
     def __init__(self, git_root: Path) -> None:
@@ -32,6 +40,13 @@ class CatFileBatch:
     def get_blob(self, object_spec: str) -> tuple[Optional[bytes], Optional[str]]:
         if not self._proc.stdin or not self._proc.stdout:
             raise RuntimeError("cat-file batch process not initialized")
+        with span("git cat-file") as s:
+            content, obj_type = self._read_object(object_spec)
+            s.add(bytes=len(content) if content is not None else 0)
+        return content, obj_type
+
+    def _read_object(self, object_spec: str) -> tuple[Optional[bytes], Optional[str]]:
+        assert self._proc.stdin and self._proc.stdout
         self._proc.stdin.write(f"{object_spec}\n".encode())
         self._proc.stdin.flush()
 
@@ -72,7 +87,7 @@ def get_all_branch_heads(git_root: Path) -> dict[str, str]:
     return branch_heads
 
 def get_all_commits_for_branch(git_root: Path, branch_name: str) -> list[str]:
-    result = subprocess.run(["git", "rev-list", "--topo-order", branch_name], cwd=git_root, capture_output=True, text=True)
+    result = run_git(git_root, ["rev-list", "--topo-order", branch_name], text=True)
     print(branch_name)
     if result.returncode != 0:
         raise Exception(f"Git command failed: {result.stderr}")
@@ -133,7 +148,7 @@ def convert_file_to_pig(
         if obj_type and obj_type != "blob":
             print(f"Warning: Skipping non-blob path at {git_commit_hash}:{file_path}")
         return None
-    file_hash = get_file_hash_from_content(content)
+    file_hash = get_file_hash_from_content(pig_root, content)
     write_file_info_from_content(pig_root, file_hash, content)
 
 
@@ -146,8 +161,9 @@ def add_git_commit_to_pig_repo(
     commit_hash: str,
     parents_map: dict[str, str],
     cat_file_batch: CatFileBatch,
+    commit_graph: CommitGraph,
 ) -> str:
-    result = subprocess.run(["git", "show", "--pretty=format:%an%n%at%n%P%n%s%n", "--name-status", "--no-renames", commit_hash], cwd=git_root, capture_output=True, text=True, errors="ignore")
+    result = run_git(git_root, ["show", "--pretty=format:%an%n%at%n%P%n%s%n", "--name-status", "--no-renames", commit_hash], text=True, errors="ignore")
     if result.returncode != 0:
         raise Exception(f"Git command failed: {result.stderr}")
     output_lines = result.stdout.strip().split('\n')
@@ -162,6 +178,7 @@ def add_git_commit_to_pig_repo(
         file_info_list.append((status, decode_git_quoted_path(file_path)))
 
     commit_files: dict[str, FileInfo] = {}
+    changed_filepaths: set[str] | None = None
 
     if len(parent_git_hashes) < 2:
         deleted_files = []
@@ -182,11 +199,12 @@ def add_git_commit_to_pig_repo(
             if file_path in parent_commit_files:
                 del parent_commit_files[file_path]
         commit_files = parent_commit_files
+        changed_filepaths = {file_path for _, file_path in file_info_list}
     else:
         if len(parent_git_hashes) > 2:
-            merge_base_result = subprocess.run(["git", "merge-base", "--octopus", *(parent_git_hashes)], cwd=git_root, capture_output=True, text=True)
+            merge_base_result = run_git(git_root, ["merge-base", "--octopus", *(parent_git_hashes)], text=True)
         else:
-            merge_base_result = subprocess.run(["git", "merge-base", *(parent_git_hashes)], cwd=git_root, capture_output=True, text=True)
+            merge_base_result = run_git(git_root, ["merge-base", *(parent_git_hashes)], text=True)
         if merge_base_result.returncode != 0:
             merge_base_hash = None
         else:
@@ -194,10 +212,9 @@ def add_git_commit_to_pig_repo(
             merge_base_files = get_commit_info(pig_root, parents_map[merge_base_hash]).files
         changed_files = None
         if merge_base_hash is not None:
-            diff_result = subprocess.run(
-                ["git", "diff", "--name-only", merge_base_hash, commit_hash],
-                cwd=git_root,
-                capture_output=True,
+            diff_result = run_git(
+                git_root,
+                ["diff", "--name-only", merge_base_hash, commit_hash],
                 text=True,
                 errors="ignore",
             )
@@ -205,7 +222,7 @@ def add_git_commit_to_pig_repo(
                 raise Exception(f"Git command failed: {diff_result.stderr}")
             changed_files = set(decode_git_quoted_path(result) for result in diff_result.stdout.strip().split('\n'))
         # Merge commit so let's just get all of the files getting the diff is sort of complicated
-        result = subprocess.run(["git", "ls-tree", "-r", "--name-only", commit_hash], cwd=git_root, capture_output=True, text=True, errors="ignore")
+        result = run_git(git_root, ["ls-tree", "-r", "--name-only", commit_hash], text=True, errors="ignore")
         if result.returncode != 0:
             raise Exception(f"Git command failed: {result.stderr}")
         file_paths = [decode_git_quoted_path(result) for result in result.stdout.strip().split('\n')]
@@ -234,14 +251,15 @@ def add_git_commit_to_pig_repo(
         parentCommits=parentCommits,
         files=commit_files
     )
-    new_commit_hash = get_new_commit_hash()
-    update_commit_info(pig_root, new_commit_hash, commit_info)
+    new_commit_hash = write_commit(pig_root, commit_info)
+    commit_graph.add(new_commit_hash, commit_info, changed_filepaths)
     return new_commit_hash
     
 
 def create_pig_from_git_repo(git_root: Path, pig_root: Path) -> None:
     all_branches = get_all_branch_heads(git_root)
     commits_recreated: dict[str, str] = {}
+    commit_graph = CommitGraph(pig_root)
     with CatFileBatch(git_root) as cat_file_batch:
         for branch_name in all_branches:
             commit_hashes = get_all_commits_for_branch(git_root, branch_name)
@@ -256,10 +274,14 @@ def create_pig_from_git_repo(git_root: Path, pig_root: Path) -> None:
                     commit_hash,
                     commits_recreated,
                     cat_file_batch,
+                    commit_graph,
                 )
                 commits_recreated[commit_hash] = pig_commit_hash
+            commit_graph.flush()
             # Update branch head
             update_branch_head(pig_root, branch_name, commits_recreated[commit_hashes[0]])
+    # fold the thousands of loose branch files a big repo produces into the packed snapshot
+    pack_refs(pig_root)
         
         
         
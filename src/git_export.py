@@ -0,0 +1,127 @@
+from pathlib import Path
+from collections import OrderedDict
+from typing import BinaryIO
+from .commit_helpers import get_commit_data
+from .commit_graph import CommitGraph
+from .file_helpers import read_compressed_bytes
+from .refs import get_branch_heads
+
+# Writes the history reachable from every branch as a `git fast-import` stream. Commits go out
+# parents first (by generation number), each listing only the paths that differ from its first
+# parent, and each blob is sent once and referred to by its mark afterwards. EMPTY-COMMIT has no
+# git equivalent, so commits on top of it become root commits.
+
+MAX_CACHED_FILE_MAPS = 64   # recent file maps kept around for the children that follow; the rest are re-read
+GIT_FILE_MODE = "100644"
+
+def quote_git_path(path: str) -> str:
+    # fast-import only needs quoting for paths with a quote, backslash or newline in them
+    if not any(ch in path for ch in '"\\\n'):
+        return path
+    return '"' + path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+def write_data(out: BinaryIO, content: bytes) -> None:
+    out.write(f"data {len(content)}\n".encode())
+    out.write(content)
+    out.write(b"\n")
+
+def get_reachable_in_generation_order(commit_graph: CommitGraph, start_commits: set[str]) -> list[str]:
+    reachable = set()
+    stack = list(start_commits)
+    while stack:
+        commit_hash = stack.pop()
+        if commit_hash in reachable:
+            continue
+        reachable.add(commit_hash)
+        stack.extend(commit_graph.parents(commit_hash))
+    reachable.discard("EMPTY-COMMIT")
+    return sorted(reachable, key=lambda commit_hash: (commit_graph.generation(commit_hash), commit_hash))
+
+class GitExporter:
+    def __init__(self, pig_root: Path, out: BinaryIO) -> None:
+        self._pig_root = pig_root
+        self._out = out
+        self._next_mark = 1
+        self._blob_marks: dict[str, int] = {}
+        self._commit_marks: dict[str, int] = {}
+        self._file_maps: OrderedDict[str, dict[str, str]] = OrderedDict()
+        self.commit_count = 0
+        self.blob_count = 0
+
+    def new_mark(self) -> int:
+        mark = self._next_mark
+        self._next_mark += 1
+        return mark
+
+    def get_file_map(self, commit_hash: str) -> dict[str, str]:
+        if commit_hash in self._file_maps:
+            self._file_maps.move_to_end(commit_hash)
+            return self._file_maps[commit_hash]
+        files = {filepath: file_info["hash"] for filepath, file_info in get_commit_data(self._pig_root, commit_hash)["files"].items()}
+        self.remember_file_map(commit_hash, files)
+        return files
+
+    def remember_file_map(self, commit_hash: str, files: dict[str, str]) -> None:
+        self._file_maps[commit_hash] = files
+        if len(self._file_maps) > MAX_CACHED_FILE_MAPS:
+            self._file_maps.popitem(last=False)
+
+    def export_blob(self, file_hash: str) -> int:
+        if file_hash not in self._blob_marks:
+            mark = self.new_mark()
+            self._out.write(f"blob\nmark :{mark}\n".encode())
+            write_data(self._out, read_compressed_bytes(self._pig_root, file_hash))
+            self._blob_marks[file_hash] = mark
+            self.blob_count += 1
+        return self._blob_marks[file_hash]
+
+    def export_commit(self, commit_hash: str, ref: str) -> None:
+        commit_data = get_commit_data(self._pig_root, commit_hash)
+        files = {filepath: file_info["hash"] for filepath, file_info in commit_data["files"].items()}
+        parent_hashes = [parent_hash for parent_hash in commit_data["parentCommits"] if parent_hash != "EMPTY-COMMIT"]
+        first_parent = commit_data["parentCommits"][0] if commit_data["parentCommits"] else "EMPTY-COMMIT"
+        parent_files = {} if first_parent == "EMPTY-COMMIT" else self.get_file_map(first_parent)
+
+        changed = sorted(filepath for filepath in parent_files.keys() | files.keys() if parent_files.get(filepath) != files.get(filepath))
+        file_commands = []
+        for filepath in changed:
+            if filepath not in files:
+                file_commands.append(f"D {quote_git_path(filepath)}\n")
+            else:
+                file_commands.append(f"M {GIT_FILE_MODE} :{self.export_blob(files[filepath])} {quote_git_path(filepath)}\n")
+
+        mark = self.new_mark()
+        identity = f"{commit_data['author']} <> {commit_data['timestamp']} +0000"
+        if first_parent == "EMPTY-COMMIT":
+            self._out.write(f"reset {ref}\n".encode())    # otherwise a root commit would continue the ref's history
+        self._out.write(f"commit {ref}\nmark :{mark}\nauthor {identity}\ncommitter {identity}\n".encode())
+        write_data(self._out, (commit_data["commitMessage"] + "\n").encode())
+        if first_parent != "EMPTY-COMMIT":
+            self._out.write(f"from :{self._commit_marks[first_parent]}\n".encode())
+        for parent_hash in parent_hashes[1 if first_parent != "EMPTY-COMMIT" else 0:]:
+            self._out.write(f"merge :{self._commit_marks[parent_hash]}\n".encode())
+        self._out.write("".join(file_commands).encode())
+        self._out.write(b"\n")
+        self._commit_marks[commit_hash] = mark
+        self.remember_file_map(commit_hash, files)
+        self.commit_count += 1
+
+    def export(self) -> list[str]:
+        # returns the branches that were left out because they only point at EMPTY-COMMIT
+        branch_heads = get_branch_heads(self._pig_root)
+        commit_graph = CommitGraph(self._pig_root)
+        # commits are written to one branch's ref, then every ref is reset to its real head at the end
+        exported_branches = sorted(branch_name for branch_name, commit_hash in branch_heads.items() if commit_hash != "EMPTY-COMMIT")
+        work_ref = f"refs/heads/{'main' if 'main' in exported_branches else (exported_branches or ['main'])[0]}"
+        for commit_hash in get_reachable_in_generation_order(commit_graph, set(branch_heads.values())):
+            self.export_commit(commit_hash, work_ref)
+        commit_graph.flush()
+        empty_branches = []
+        for branch_name, commit_hash in sorted(branch_heads.items()):
+            if commit_hash == "EMPTY-COMMIT":
+                empty_branches.append(branch_name)
+                continue
+            self._out.write(f"reset refs/heads/{branch_name}\nfrom :{self._commit_marks[commit_hash]}\n\n".encode())
+        self._out.write(b"done\n")
+        self._out.flush()
+        return empty_branches
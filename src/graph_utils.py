@@ -1,59 +1,143 @@
 from pathlib import Path
-from collections import deque
-import time
-
-from .errors import PigError
-from .repo_utils import find_pig_root_dir
-from .commit_helpers import current_commit_hash, get_commit_info
-
-def topological_log(pig_root: Path, num_to_print: int):
-    if pig_root is None:
-        raise PigError("not in a pig repository")
-    if num_to_print <= 0:
-        raise PigError("number of commits to show must be positive")
-    
-    head_commit = current_commit_hash(pig_root)
-    commit_infos = {}
-    parent_map = {}
-
-    stack = [head_commit]
-    count = 0
+import heapq
+from typing import Iterator
+
+from .repo_utils import get_head_info, get_worktree_roots
+from .commit_helpers import get_commit_data
+from .commit_graph import CommitGraph
+from .branching import get_branch_heads
+from .staging_helpers import get_staging_info
+
+def get_root_commits(pig_root: Path) -> set[str]:
+    root_commits = set(get_branch_heads(pig_root).values())
+    for worktree_root in get_worktree_roots(pig_root):     # every worktree's HEAD, not just this one's
+        head_info = get_head_info(worktree_root)
+        if head_info.type == "commit":
+            root_commits.add(head_info.value)
+    root_commits.add("EMPTY-COMMIT")
+    return root_commits
+
+def find_reachable(pig_root: Path, root_commits: set[str]) -> tuple[set[str], set[str]]:
+    # returns (reachable commit hashes, reachable object hashes)
+    reachable_commits: set[str] = set()
+    reachable_objects: set[str] = set()
+    stack = list(root_commits)
     while stack:
         commit_hash = stack.pop()
-        commit_info = get_commit_info(pig_root, commit_hash)
-        commit_infos[commit_hash] = commit_info
-        parent_map[commit_hash] = list(commit_info.parentCommits)
-        for parent_hash in commit_info.parentCommits:
-            if parent_hash not in commit_infos:
+        if commit_hash in reachable_commits:
+            continue
+        reachable_commits.add(commit_hash)
+        commit_data = get_commit_data(pig_root, commit_hash)
+        for file_info in commit_data["files"].values():
+            reachable_objects.add(file_info["hash"])
+        for parent_hash in commit_data["parentCommits"]:
+            if parent_hash not in reachable_commits:
                 stack.append(parent_hash)
-        count += 1
-        print(count, end="\n")
-
-    indegree = {commit_hash: 0 for commit_hash in commit_infos}
-    for _, parents in parent_map.items():
-        for parent_hash in parents:
-            if parent_hash in indegree:
-                indegree[parent_hash] += 1
-
-    commits_printed = 0
-    queue = deque([head_commit])
-    seen = set()
-    while queue:
-        commit_hash = queue.popleft()
-        seen.add(commit_hash)
-        commit_info = commit_infos[commit_hash]
-
-        for parent_hash in parent_map.get(commit_hash, []):
-            if parent_hash in indegree:
-                indegree[parent_hash] -= 1
-                if indegree[parent_hash] == 0 and parent_hash not in seen:
-                    queue.append(parent_hash)
-    
-        print(f"Commit: {commit_hash}")
-        print(f"Author: {commit_info.author}")
-        print(f"Date: {time.ctime(commit_info.timestamp)}")
-        print(f"\n    {commit_info.commitMessage}\n")
-        commits_printed += 1
-        if commits_printed >= num_to_print:
-            break
-    
+    # staged files, in any worktree, are about to be committed so they count as reachable too
+    for worktree_root in get_worktree_roots(pig_root):
+        for staging_file_info in get_staging_info(worktree_root).values():
+            if staging_file_info.hash:
+                reachable_objects.add(staging_file_info.hash)
+    return reachable_commits, reachable_objects
+
+def find_merge_base(pig_root: Path, commit_hash1: str, commit_hash2: str) -> str | None:
+    # git's paint-down-to-common: walk both histories highest generation first, painting each commit
+    # with the side(s) it is reachable from; the first commit painted by both sides is the merge base
+    if commit_hash1 == commit_hash2:
+        return commit_hash1
+    commit_graph = CommitGraph(pig_root)
+    def priority(commit_hash: str) -> tuple[int, int]:
+        return (-commit_graph.generation(commit_hash), -commit_graph.timestamp(commit_hash))
+
+    paint = {commit_hash1: 1, commit_hash2: 2}
+    heap = [(priority(commit_hash1), commit_hash1), (priority(commit_hash2), commit_hash2)]
+    while heap:
+        _, commit_hash = heapq.heappop(heap)
+        commit_paint = paint[commit_hash]
+        if commit_paint == 3:
+            return commit_hash
+        for parent_hash in commit_graph.parents(commit_hash):
+            parent_paint = paint.get(parent_hash, 0)
+            if parent_paint | commit_paint != parent_paint:
+                paint[parent_hash] = parent_paint | commit_paint
+                heapq.heappush(heap, (priority(parent_hash), parent_hash))
+    return None
+
+def iter_date_order(commit_graph: CommitGraph, start_commits: list[str]) -> Iterator[str]:
+    # newest first, only looking at the commits we are about to yield and their parents
+    heap = [(-commit_graph.timestamp(commit_hash), commit_hash) for commit_hash in set(start_commits)]
+    heapq.heapify(heap)
+    seen = set(start_commits)
+    while heap:
+        _, commit_hash = heapq.heappop(heap)
+        yield commit_hash
+        for parent_hash in commit_graph.parents(commit_hash):
+            if parent_hash not in seen:
+                seen.add(parent_hash)
+                heapq.heappush(heap, (-commit_graph.timestamp(parent_hash), parent_hash))
+
+def iter_topo_order(commit_graph: CommitGraph, start_commits: list[str]) -> Iterator[str]:
+    # git's incremental topo-order walk: indegrees are only computed down to the generation of the
+    # commits about to be shown, so printing the first N commits visits roughly N commits. (git's
+    # third phase, the explore walk, only matters for excluded ranges like A..B, which pig log has not.)
+    # indegree holds 1 + the number of not yet shown children, 1 meaning the commit is ready to show.
+    indegree: dict[str, int] = {}
+    indegree_heap: list[tuple[int, str]] = []
+    for commit_hash in start_commits:
+        if commit_hash not in indegree:
+            indegree[commit_hash] = 1
+            heapq.heappush(indegree_heap, (-commit_graph.generation(commit_hash), commit_hash))
+
+    def compute_indegrees_to_depth(generation_cutoff: int) -> None:
+        while indegree_heap and -indegree_heap[0][0] >= generation_cutoff:
+            _, commit_hash = heapq.heappop(indegree_heap)
+            for parent_hash in commit_graph.parents(commit_hash):
+                if parent_hash in indegree:
+                    indegree[parent_hash] += 1
+                else:
+                    indegree[parent_hash] = 2
+                    heapq.heappush(indegree_heap, (-commit_graph.generation(parent_hash), parent_hash))
+
+    compute_indegrees_to_depth(min(commit_graph.generation(commit_hash) for commit_hash in indegree))
+    topo_stack = [commit_hash for commit_hash in reversed(indegree) if indegree[commit_hash] == 1]
+    while topo_stack:
+        commit_hash = topo_stack.pop()
+        yield commit_hash
+        # reversed so the first parent is shown next and its line of history stays together
+        for parent_hash in reversed(commit_graph.parents(commit_hash)):
+            compute_indegrees_to_depth(commit_graph.generation(parent_hash))
+            indegree[parent_hash] -= 1
+            if indegree[parent_hash] == 1:
+                topo_stack.append(parent_hash)
+
+def find_missing_commits(commit_graph: CommitGraph, want_commits: set[str], have_commits: set[str]) -> list[str]:
+    # commits reachable from want_commits but not from have_commits, like `git rev-list wants --not haves`,
+    # oldest generation first so they can be written parents before children. Walking highest generation
+    # first means a commit's children are all visited before it, so the walk can stop as soon as only
+    # commits reachable from a have are left, without exploring the history both sides share.
+    uninteresting = set(have_commits)
+    queued: set[str] = set()
+    heap: list[tuple[int, str]] = []
+    interesting_queued = 0
+    for commit_hash in want_commits | have_commits:
+        queued.add(commit_hash)
+        heapq.heappush(heap, (-commit_graph.generation(commit_hash), commit_hash))
+        interesting_queued += commit_hash not in uninteresting
+    missing: list[str] = []
+    while heap and interesting_queued:
+        _, commit_hash = heapq.heappop(heap)
+        is_interesting = commit_hash not in uninteresting
+        if is_interesting:
+            interesting_queued -= 1
+            missing.append(commit_hash)
+        for parent_hash in commit_graph.parents(commit_hash):
+            if not is_interesting and parent_hash not in uninteresting:
+                uninteresting.add(parent_hash)
+                if parent_hash in queued:
+                    interesting_queued -= 1
+            if parent_hash not in queued:
+                queued.add(parent_hash)
+                heapq.heappush(heap, (-commit_graph.generation(parent_hash), parent_hash))
+                interesting_queued += parent_hash not in uninteresting
+    missing.reverse()
+    return missing
@@ -0,0 +1,136 @@
+from pathlib import Path
+import json
+import shutil
+from .errors import PigError
+from .models import CommitInfo, FileInfo, HeadInfo
+from .alternates import get_alternate_object_dirs
+from .file_helpers import get_object_path, get_compressed_file_hash, iter_object_hashes
+from .commit_helpers import get_commit_path, iter_commit_hashes, write_commit
+from .commit_graph import read_commit_graph, write_commit_graph
+from .bloom import read_bloom_filters, write_bloom_filters
+from .refs import get_branch_heads, update_branch_heads_packed
+from .staging_helpers import get_staging_info, update_staging_info
+from .stat_cache import get_stat_cache_path
+from .blame import get_blame_cache_dir
+from .hashing import get_hash_algorithm, set_hash_algorithm
+from .repo_utils import get_head_info, update_head, get_worktree_roots
+from .clone import link_or_copy
+
+# `pig migrate-hash` renames every object after its content hash under another algorithm, and
+# since commits are named after their content (file hashes and parent hashes included), every commit
+# gets a new name too. Nothing is deleted until the new names are in place: objects are linked under
+# their new names, commits are written again parents first, then the branches, every worktree's
+# HEAD and staging area and the commit graph are switched over, then the config, and only then do
+# the old names go. Anything already named under the new algorithm maps to itself, so a migration
+# that was interrupted before the config changed can simply be run again.
+
+ROOT_COMMIT = "EMPTY-COMMIT"
+
+def get_object_renames(pig_root: Path, algorithm: str) -> dict[str, str]:
+    return {
+        file_hash: get_compressed_file_hash(get_object_path(pig_root, file_hash), algorithm)
+        for file_hash in iter_object_hashes(pig_root)
+    }
+
+def read_commits(pig_root: Path, object_renames: dict[str, str]) -> dict[str, dict]:
+    # every commit's raw data, checking that each one can be rewritten before anything is touched
+    commits = {commit_hash: json.loads(get_commit_path(pig_root, commit_hash).read_bytes()) for commit_hash in iter_commit_hashes(pig_root)}
+    for commit_hash, commit_data in commits.items():
+        for parent_hash in commit_data["parentCommits"]:
+            if parent_hash not in commits:
+                raise PigError(f"commit {parent_hash} (parent of {commit_hash}) is missing; run `pig fsck`")
+        for filepath, file_info in commit_data["files"].items():
+            if file_info["hash"] not in object_renames:
+                raise PigError(f"object {file_info['hash']} ({filepath} in commit {commit_hash}) is missing; run `pig fsck`")
+    return commits
+
+def rewrite_commits(pig_root: Path, commits: dict[str, dict], object_renames: dict[str, str], algorithm: str) -> dict[str, str]:
+    # writes every commit under its new name, parents before children; returns old name -> new name
+    commit_renames = {ROOT_COMMIT: ROOT_COMMIT}
+    for start_hash in commits:
+        stack = [start_hash]
+        while stack:
+            commit_hash = stack[-1]
+            if commit_hash in commit_renames:
+                stack.pop()
+                continue
+            commit_data = commits[commit_hash]
+            pending_parents = [parent_hash for parent_hash in commit_data["parentCommits"] if parent_hash not in commit_renames]
+            if pending_parents:
+                stack.extend(pending_parents)
+                continue
+            stack.pop()
+            commit_info = CommitInfo(
+                commitMessage=commit_data["commitMessage"],
+                author=commit_data["author"],
+                timestamp=commit_data["timestamp"],
+                parentCommits=[commit_renames[parent_hash] for parent_hash in commit_data["parentCommits"]],
+                files={
+                    filepath: FileInfo(hash=object_renames[file_info["hash"]], lastEdited=file_info["lastEdited"])
+                    for filepath, file_info in commit_data["files"].items()
+                },
+            )
+            commit_renames[commit_hash] = write_commit(pig_root, commit_info, algorithm)
+    return commit_renames
+
+def rename_commit_references(pig_root: Path, commit_renames: dict[str, str]) -> None:
+    branch_heads = get_branch_heads(pig_root)
+    for branch_name, commit_hash in branch_heads.items():
+        if commit_hash not in commit_renames:
+            raise PigError(f"commit {commit_hash} (branch '{branch_name}') is missing; run `pig fsck`")
+    update_branch_heads_packed(pig_root, {branch_name: commit_renames[commit_hash] for branch_name, commit_hash in branch_heads.items()})
+    for worktree_root in get_worktree_roots(pig_root):
+        head_info = get_head_info(worktree_root)
+        if head_info.type == "commit":
+            update_head(worktree_root, HeadInfo(type="commit", value=commit_renames.get(head_info.value, head_info.value)))
+    # generations, timestamps and changed paths are the same under the new names
+    write_commit_graph(pig_root, {
+        commit_renames[commit_hash]: (generation, timestamp, tuple(commit_renames[parent_hash] for parent_hash in parents))
+        for commit_hash, (generation, timestamp, parents) in read_commit_graph(pig_root).items()
+        if commit_hash in commit_renames
+    })
+    write_bloom_filters(pig_root, {
+        commit_renames[commit_hash]: bloom_filter
+        for commit_hash, bloom_filter in read_bloom_filters(pig_root).items()
+        if commit_hash in commit_renames
+    })
+
+def migrate_hash_algorithm(pig_root: Path, algorithm: str) -> tuple[int, int]:
+    # returns (objects renamed, commits renamed)
+    if get_hash_algorithm(pig_root) == algorithm:
+        raise PigError(f"repository already uses {algorithm}")
+    if get_alternate_object_dirs(pig_root):
+        raise PigError("cannot migrate a repository that borrows objects through alternates")
+
+    object_renames = get_object_renames(pig_root, algorithm)
+    commits = read_commits(pig_root, object_renames)
+
+    for old_hash, new_hash in object_renames.items():
+        new_path = get_object_path(pig_root, new_hash)
+        if new_hash != old_hash and not new_path.exists():
+            new_path.parent.mkdir(exist_ok=True)
+            link_or_copy(get_object_path(pig_root, old_hash), new_path)
+    commit_renames = rewrite_commits(pig_root, commits, object_renames, algorithm)
+    rename_commit_references(pig_root, commit_renames)
+    for worktree_root in get_worktree_roots(pig_root):
+        # a staged file whose object is missing keeps its old hash; commit then asks for it to be added again
+        staging_info = get_staging_info(worktree_root)
+        update_staging_info(worktree_root, {
+            filepath: info.model_copy(update={"hash": object_renames.get(info.hash, info.hash)})
+            for filepath, info in staging_info.items()
+        })
+        get_stat_cache_path(worktree_root).unlink(missing_ok=True)
+    # the stat and blame caches are keyed by names under the old algorithm and rebuild themselves
+    shutil.rmtree(get_blame_cache_dir(pig_root), ignore_errors=True)
+    set_hash_algorithm(pig_root, algorithm)
+
+    objects_renamed = commits_renamed = 0
+    for old_hash, new_hash in object_renames.items():
+        if new_hash != old_hash:
+            get_object_path(pig_root, old_hash).unlink(missing_ok=True)
+            objects_renamed += 1
+    for old_hash, new_hash in commit_renames.items():
+        if new_hash != old_hash:
+            get_commit_path(pig_root, old_hash).unlink(missing_ok=True)
+            commits_renamed += 1
+    return objects_renamed, commits_renamed
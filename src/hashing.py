@@ -0,0 +1,45 @@
+from pathlib import Path
+import hashlib
+from .errors import PigError
+from .repo_utils import read_config, update_config
+from .warm_cache import invalidate, warm_cached
+
+# The content hash that names objects is a repository format setting, recorded in .pig/config as
+#   {"formatVersion": 1, "hashAlgorithm": "sha256" | "blake2b"}
+# and chosen by `pig init --hash` / `pig git-convert --hash`. Repositories from before the setting
+# have no formatVersion and use sha256. Both algorithms give 32-byte digests, so object names keep
+# their 64 hex characters whichever one a repository uses. blake2b is the faster of the two on
+# machines without SHA extensions; `pig migrate-hash` rewrites a repository from one to the other.
+
+FORMAT_VERSION = 1
+HASH_ALGORITHMS = ("sha256", "blake2b")
+DEFAULT_HASH_ALGORITHM = "sha256"
+HASH_ALGORITHM_NAMESPACE = "hash-algorithm"
+
+def new_hasher(algorithm: str):
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=32)
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    raise PigError(f"unknown hash algorithm '{algorithm}'")
+
+def get_format_config(algorithm: str) -> dict:
+    if algorithm not in HASH_ALGORITHMS:
+        raise PigError(f"unknown hash algorithm '{algorithm}'; choose from {', '.join(HASH_ALGORITHMS)}")
+    return {"formatVersion": FORMAT_VERSION, "hashAlgorithm": algorithm}
+
+# every hashed file asks for this, so it is read once per process rather than once per file
+@warm_cached(HASH_ALGORITHM_NAMESPACE, always=True)
+def get_hash_algorithm(pig_root: Path) -> str:
+    config = read_config(pig_root)
+    format_version = config.get("formatVersion", 0)
+    if format_version > FORMAT_VERSION:
+        raise PigError(f"repository format version {format_version} is newer than this pig supports ({FORMAT_VERSION})")
+    algorithm = config.get("hashAlgorithm", DEFAULT_HASH_ALGORITHM)
+    if algorithm not in HASH_ALGORITHMS:
+        raise PigError(f"repository uses unknown hash algorithm '{algorithm}'")
+    return algorithm
+
+def set_hash_algorithm(pig_root: Path, algorithm: str) -> None:
+    update_config(pig_root, get_format_config(algorithm))
+    invalidate(HASH_ALGORITHM_NAMESPACE)
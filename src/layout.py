@@ -0,0 +1,24 @@
+from pathlib import Path
+from .repo_utils import get_sharded_path
+from .file_helpers import get_compressed_files_dir
+from .commit_helpers import get_commits_dir
+
+def move_flat_entries_to_shards(directory: Path, suffix: str = "") -> int:
+    moved = 0
+    for item in directory.iterdir():
+        if not item.is_file() or not item.name.endswith(suffix):
+            continue
+        dest_path = get_sharded_path(directory, item.name)
+        dest_path.parent.mkdir(exist_ok=True)
+        if dest_path.exists():
+            item.unlink()   # already migrated, the flat copy is a leftover
+        else:
+            item.rename(dest_path)
+        moved += 1
+    return moved
+
+def migrate_to_sharded_layout(pig_root: Path) -> tuple[int, int]:
+    # returns (objects moved, commits moved)
+    objects_moved = move_flat_entries_to_shards(get_compressed_files_dir(pig_root))
+    commits_moved = move_flat_entries_to_shards(get_commits_dir(pig_root), ".json")
+    return objects_moved, commits_moved
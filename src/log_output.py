@@ -0,0 +1,61 @@
+import re
+import time
+
+DEFAULT_FORMAT = "Commit: %H%nAuthor: %an%nDate: %ad%n%n    %s%n%n"
+ONELINE_FORMAT = "%h %s"
+
+PLACEHOLDER_PATTERN = re.compile(r"%(an|ad|at|H|h|P|p|s|n|%)")
+
+def format_commit(commit_hash: str, commit_data: dict, log_format: str) -> str:
+    # supports a small subset of git's --format placeholders
+    def expand(match: re.Match) -> str:
+        match match.group(1):
+            case "H":
+                return commit_hash
+            case "h":
+                return commit_hash[:7]
+            case "P":
+                return " ".join(commit_data["parentCommits"])
+            case "p":
+                return " ".join(parent_hash[:7] for parent_hash in commit_data["parentCommits"])
+            case "an":
+                return commit_data["author"]
+            case "ad":
+                return time.ctime(commit_data["timestamp"])
+            case "at":
+                return str(commit_data["timestamp"])
+            case "s":
+                return commit_data["commitMessage"]
+            case "n":
+                return "\n"
+            case _:
+                return "%"
+    return PLACEHOLDER_PATTERN.sub(expand, log_format)
+
+class GraphRenderer:
+    # draws a simplified version of git's --graph: one column per line of history that is still open
+    def __init__(self) -> None:
+        self._columns: list[str] = []
+
+    def render(self, commit_hash: str, parents: tuple[str, ...], text: str) -> str:
+        if commit_hash not in self._columns:
+            self._columns.append(commit_hash)
+        column = self._columns.index(commit_hash)
+        width = len(self._columns)
+        lanes_right = width - column - 1
+        lines = text.rstrip("\n").split("\n")
+        rendered = ["".join("* " if i == column else "| " for i in range(width)) + lines[0]]
+        rendered.extend(("| " * width + line).rstrip() for line in lines[1:])
+
+        new_parents = [parent_hash for parent_hash in parents if parent_hash not in self._columns]
+        joins_left = bool(parents) and not new_parents and self._columns.index(parents[0]) < column
+        self._columns[column:column + 1] = new_parents
+        if len(new_parents) > 1:
+            # a merge opens a new column for each extra parent
+            rendered.append("| " * column + "|\\" + " \\" * (len(new_parents) - 2 + lanes_right))
+        elif not new_parents and joins_left:
+            # this line of history joins one to its left
+            rendered.append("| " * (column - 1) + "|/" + " /" * lanes_right)
+        elif not new_parents and lanes_right:
+            rendered.append("| " * column + " /" * lanes_right)
+        return "\n".join(rendered) + "\n"
@@ -1,14 +1,14 @@
 from pathlib import Path
 import difflib
 import time
+from typing import Literal
 from .errors import PigError
 from .branching import get_current_branch, update_branch_head
 from .models import CommitInfo, FileInfo, HeadInfo
 from .commit_helpers import (
     current_commit_hash,
     get_commit_info,
-    get_new_commit_hash,
-    update_commit_info,
+    write_commit,
 )
 from .staging_helpers import get_staging_info
 from .file_helpers import (
@@ -17,34 +17,23 @@ from .file_helpers import (
     get_file_hash,
 )
 from .repo_utils import update_head
-from .recreatedirectory import clear_directory, recreate_directory
+from .recreatedirectory import clear_directory, recreate_directory, checkout_changed_paths
+from .graph_utils import find_merge_base
+from .commit_graph import add_commit_to_graph
+from .tracing import traced
 
 def find_common_ancestor(pig_root: Path, commit_hash1: str, commit_hash2: str) -> str:
-    ancestors1 = set()
-    batch_size = 50
-    chash1 = commit_hash1
-    chash2 = commit_hash2
-    while commit_hash1 is not None and commit_hash2 is not None:
-        for _ in range(batch_size):
-            ancestors1.add(chash1)
-            commit_info1 = get_commit_info(pig_root, chash1)
-            chash1 = commit_info1.parentCommit
-            if chash1 is None:
-                break
-        for _ in range(batch_size):
-            if chash2 and chash2 in ancestors1:
-                return chash2
-            commit_info2 = get_commit_info(pig_root, chash2)
-            chash2 = commit_info2.parentCommit
-            if chash2 is None:
-                break
-    raise PigError("no common ancestor found")
+    merge_base = find_merge_base(pig_root, commit_hash1, commit_hash2)
+    if merge_base is None:
+        raise PigError("no common ancestor found")
+    return merge_base
 
+@traced("merge_files")
 def merge_files(pig_root: Path, file_path: str, file1_info: FileInfo, file2_info: FileInfo, base_file_info: FileInfo | None) -> FileInfo:
     # if manual merge file exists, use that
     manual_merge_path = pig_root / ".pig" / "merge" / file_path
     if manual_merge_path.exists():
-        merged_hash = get_file_hash(manual_merge_path)
+        merged_hash = get_file_hash(pig_root, manual_merge_path)
         write_file_info(pig_root, merged_hash, manual_merge_path)
         manual_merge_path.unlink()
         return FileInfo(
@@ -140,7 +129,7 @@ def merge_files(pig_root: Path, file_path: str, file1_info: FileInfo, file2_info
         raise PigError("merge conflicts detected, please resolve them manually in the indicated file")
     
     # Write merged content to a file and get its hash
-    merged_hash = get_file_hash(manual_merge_path)
+    merged_hash = get_file_hash(pig_root, manual_merge_path)
     write_file_info(pig_root, merged_hash, manual_merge_path)
 
     # Remove file from temporary merge directory
@@ -151,12 +140,26 @@ def merge_files(pig_root: Path, file_path: str, file1_info: FileInfo, file2_info
         lastEdited=max(file1_info.lastEdited, file2_info.lastEdited)
     )
 
-def merge_commits(pig_root: Path, target_commit_hash: str) -> None:
+def move_head_to(pig_root: Path, current_commit: str, new_commit: str) -> None:
+    current_branch = get_current_branch(pig_root)
+    if current_branch:
+        update_branch_head(pig_root, current_branch, new_commit, current_commit)
+    else:
+        update_head(pig_root, HeadInfo(type="commit", value=new_commit))
+
+def merge_commits(pig_root: Path, target_commit_hash: str, no_ff: bool = False, jobs: int | None = None) -> Literal["up-to-date", "fast-forward", "merge"]:
     if get_staging_info(pig_root) != {}:
         raise PigError("cannot merge commits with staged changes; please commit or unstage them first")
     
     current_commit = current_commit_hash(pig_root)
     base_commit = find_common_ancestor(pig_root, current_commit, target_commit_hash)
+    if base_commit == target_commit_hash:
+        return "up-to-date"     # target is already part of our history, nothing to touch
+    if base_commit == current_commit and not no_ff:
+        # target is a strict descendant: just move the pointer and rewrite the paths that differ
+        checkout_changed_paths(pig_root, current_commit, target_commit_hash, jobs)
+        move_head_to(pig_root, current_commit, target_commit_hash)
+        return "fast-forward"
 
     current_commit_info = get_commit_info(pig_root, current_commit)
     target_commit_info = get_commit_info(pig_root, target_commit_hash)
@@ -200,22 +203,19 @@ def merge_commits(pig_root: Path, target_commit_hash: str) -> None:
                 base_file_info
             )
             merge_commit_info.files[file] = merged_file_info
+    for file in target_commit_files - current_commit_files:
+        # keep files the target added or changed; drop the ones we deleted and they left untouched
+        base_file_info = base_commit_info.files.get(file)
+        if base_file_info is None or base_file_info.hash != target_commit_info.files[file].hash:
+            merge_commit_info.files[file] = target_commit_info.files[file]
     
-    merge_commit_hash = get_new_commit_hash()
-    update_commit_info(pig_root, merge_commit_hash, merge_commit_info)
-    recreate_directory(pig_root, merge_commit_hash)
-    current_branch = get_current_branch(pig_root)
-    if current_branch:
-        update_branch_head(pig_root, current_branch, merge_commit_hash)
-    else:
-        update_head(pig_root, HeadInfo(type="commit", value=merge_commit_hash))
-    
-    clear_directory(pig_root / ".pig" / "merge")
-    (pig_root / ".pig" / "merge").rmdir()
-    
-
-
-
-
+    merge_commit_hash = write_commit(pig_root, merge_commit_info)
+    add_commit_to_graph(pig_root, merge_commit_hash, merge_commit_info)
+    recreate_directory(pig_root, merge_commit_hash, jobs)
+    move_head_to(pig_root, current_commit, merge_commit_hash)
     
-    
\ No newline at end of file
+    merge_dir = pig_root / ".pig" / "merge"
+    if merge_dir.exists():
+        clear_directory(merge_dir)
+        merge_dir.rmdir()
+    return "merge"
@@ -1,7 +1,17 @@
 import gzip
+import os
 from pathlib import Path
 import shutil
-from .commit_helpers import get_commit_info
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from .errors import PigError
+from .commit_helpers import get_commit_data
+from .file_helpers import find_object_path
+from .sparse_checkout import read_sparse_prefixes, in_sparse_cone
+from .stat_cache import get_worktree_hashes
+from .tracing import span, traced
+
+COPY_BUFFER_SIZE = 1 << 20
+MAX_REPORTED_FAILURES = 10
 
 
 def clear_directory(path: Path, ignoreFiles: set | None = None) -> None:
@@ -14,30 +24,150 @@ def clear_directory(path: Path, ignoreFiles: set | None = None) -> None:
         else:
             item.unlink()
 
-def recreate_directory(pig_root: Path, commit_hash: str) -> None:
-    commit_info = get_commit_info(pig_root, commit_hash)
+def restore_file(pig_root: Path, file_hash: str, dest_path: Path) -> None:
+    with span("restore_file") as s:
+        object_path = find_object_path(pig_root, file_hash)
+        if object_path is None:
+            raise PigError(f"compressed file {file_hash} does not exist")
+        with gzip.open(object_path, "rb") as f_in:
+            with open(dest_path, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, COPY_BUFFER_SIZE)
+                s.add(bytes=f_out.tell())
+
+def get_default_jobs() -> int:
+    return min(32, (os.cpu_count() or 1) + 4)    # same default as ThreadPoolExecutor, the work is mostly I/O
+
+def restore_files(pig_root: Path, files: dict[str, str], dest_root: Path, jobs: int | None = None) -> list[str]:
+    # decompresses path -> hash into dest_root on a thread pool (zlib and file writes release the GIL)
+    # and returns "<path>: <error>" for every file that couldn't be written
+    for directory in sorted({(dest_root / filepath).parent for filepath in files}):
+        directory.mkdir(parents=True, exist_ok=True)
+    jobs = jobs or get_default_jobs()
+    failures: list[str] = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        # only a few files per thread in flight so a huge checkout doesn't queue every file at once
+        pending: dict[Future, str] = {}
+        for filepath, file_hash in files.items():
+            if len(pending) >= jobs * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    failed_path = pending.pop(future)
+                    if future.exception() is not None:
+                        failures.append(f"{failed_path}: {future.exception()}")
+            pending[executor.submit(restore_file, pig_root, file_hash, dest_root / filepath)] = filepath
+        for future, filepath in pending.items():
+            if future.exception() is not None:
+                failures.append(f"{filepath}: {future.exception()}")
+    failures.sort()
+    return failures
+
+def format_paths(filepaths: list[str]) -> str:
+    shown = "\n  ".join(filepaths[:MAX_REPORTED_FAILURES])
+    more = f"\n  ... and {len(filepaths) - MAX_REPORTED_FAILURES} more" if len(filepaths) > MAX_REPORTED_FAILURES else ""
+    return f"  {shown}{more}"
+
+def raise_for_failures(failures: list[str]) -> None:
+    if not failures:
+        return
+    raise PigError(f"failed to check out {len(failures)} file{'s' if len(failures) != 1 else ''}:\n{format_paths(failures)}")
+
+def find_local_changes(pig_root: Path, files: dict[str, str]) -> list[str]:
+    # the paths whose working tree copy exists but isn't the given version, hashed through the stat cache;
+    # a file that is already gone has nothing left to lose
+    worktree_hashes = get_worktree_hashes(pig_root, files)
+    return sorted(filepath for filepath, file_hash in files.items() if filepath in worktree_hashes and worktree_hashes[filepath] != file_hash)
+
+def remove_file(pig_root: Path, filepath: str) -> None:
+    # also removes any directories the file leaves empty
+    dest_path = pig_root / filepath
+    dest_path.unlink(missing_ok=True)
+    parent = dest_path.parent
+    while parent != pig_root and parent.exists() and not any(parent.iterdir()):
+        parent.rmdir()
+        parent = parent.parent
+
+def get_commit_file_hashes(pig_root: Path, commit_hash: str, sparse_prefixes: list[str] | None) -> dict[str, str]:
+    # path -> hash for the files of the commit inside the sparse cone; the raw JSON is used
+    # so big commits don't pay for validating entries that are about to be filtered out
+    files = get_commit_data(pig_root, commit_hash)["files"]
+    return {filepath: file_info["hash"] for filepath, file_info in files.items() if in_sparse_cone(filepath, sparse_prefixes)}
+
+@traced("recreate_directory")
+def recreate_directory(pig_root: Path, commit_hash: str, jobs: int | None = None) -> None:
+    files = get_commit_file_hashes(pig_root, commit_hash, read_sparse_prefixes(pig_root))
     tmp_dir = pig_root / ".pig" / "tmp-recreate"
     if tmp_dir.exists():
         clear_directory(tmp_dir)
-    for filepath, fileinfo in commit_info.files.items():
-        dest_path: Path  = tmp_dir / filepath
-        if not dest_path.parent.exists():
-            dest_path.parent.mkdir(parents=True)
-        compressed_file_path: Path  = pig_root / ".pig" / "compressed-files" / fileinfo.hash
-        # print(f"Recreating file {filepath}...")
-        try:
-            with gzip.open(compressed_file_path, "rb") as f_in:
-                with open(dest_path, "wb") as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-        except Exception as e:
-            print(f"Error recreating file {filepath}: {e}")
-    clear_directory(pig_root, ignoreFiles={".pig"})
-    if not tmp_dir.exists():
-        return
-    for item in tmp_dir.iterdir():
-        shutil.move(str(item), str(pig_root))
+    with span("restore_files", files=len(files)):
+        failures = restore_files(pig_root, files, tmp_dir, jobs)
+    if failures:
+        # leave the working tree as it was rather than replacing it with a partial checkout
+        clear_directory(tmp_dir)
+        tmp_dir.rmdir()
+        raise_for_failures(failures)
+    with span("swap working tree"):
+        clear_directory(pig_root, ignoreFiles={".pig"})
+        if not tmp_dir.exists():
+            return
+        for item in tmp_dir.iterdir():
+            shutil.move(str(item), str(pig_root))
     clear_directory(tmp_dir)
     tmp_dir.rmdir()
-    
-        
-        
+
+@traced("checkout_changed_paths")
+def checkout_changed_paths(pig_root: Path, old_commit_hash: str, new_commit_hash: str, jobs: int | None = None) -> None:
+    # moves the working tree from one commit to another touching only the paths that differ
+    sparse_prefixes = read_sparse_prefixes(pig_root)
+    old_files = get_commit_file_hashes(pig_root, old_commit_hash, sparse_prefixes)
+    new_files = get_commit_file_hashes(pig_root, new_commit_hash, sparse_prefixes)
+    changed_files = {filepath: file_hash for filepath, file_hash in new_files.items() if old_files.get(filepath) != file_hash}
+    removed_paths = old_files.keys() - new_files.keys()
+    # like git, refuse before touching anything if that would drop uncommitted edits to a tracked file
+    # being changed or removed, or overwrite an untracked file where the new commit adds one
+    touched_files = {filepath: old_files.get(filepath, file_hash) for filepath, file_hash in changed_files.items()}
+    touched_files.update((filepath, old_files[filepath]) for filepath in removed_paths)
+    modified_paths = find_local_changes(pig_root, touched_files)
+    if modified_paths:
+        raise PigError(f"your local changes to these files would be overwritten; commit them first:\n{format_paths(modified_paths)}")
+    # like recreate_directory, the new versions are written aside first so a missing object or a
+    # failed write leaves the working tree untouched; only then do files get removed and moved in
+    tmp_dir = pig_root / ".pig" / "tmp-checkout"
+    if tmp_dir.exists():
+        clear_directory(tmp_dir)
+    with span("restore_files", files=len(changed_files)):
+        failures = restore_files(pig_root, changed_files, tmp_dir, jobs)
+    if failures:
+        if tmp_dir.exists():
+            clear_directory(tmp_dir)
+            tmp_dir.rmdir()
+        raise_for_failures(failures)
+    with span("swap changed paths"):
+        for filepath in removed_paths:
+            remove_file(pig_root, filepath)
+        for filepath in changed_files:
+            dest_path = pig_root / filepath
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_dir / filepath, dest_path)
+    if tmp_dir.exists():
+        clear_directory(tmp_dir)
+        tmp_dir.rmdir()
+
+def change_sparse_cone(pig_root: Path, commit_hash: str, old_prefixes: list[str] | None, new_prefixes: list[str] | None) -> None:
+    # writes the files that enter the cone and removes the ones that leave it
+    files = get_commit_data(pig_root, commit_hash)["files"]
+    leaving_files = {}
+    entering_files = {}
+    for filepath, file_info in files.items():
+        was_included = in_sparse_cone(filepath, old_prefixes)
+        is_included = in_sparse_cone(filepath, new_prefixes)
+        if was_included and not is_included:
+            leaving_files[filepath] = file_info["hash"]
+        elif is_included and not was_included:
+            entering_files[filepath] = file_info["hash"]
+    # like git, a file with uncommitted edits is never removed just because it left the cone
+    modified_paths = find_local_changes(pig_root, leaving_files)
+    if modified_paths:
+        raise PigError(f"cannot change the sparse checkout; these files have local changes that would be lost:\n{format_paths(modified_paths)}")
+    for filepath in leaving_files:
+        remove_file(pig_root, filepath)
+    raise_for_failures(restore_files(pig_root, entering_files, pig_root))
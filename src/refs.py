@@ -0,0 +1,128 @@
+from pathlib import Path
+import json
+import os
+from urllib.parse import quote, unquote
+from .errors import PigError
+from .models import BranchInfo
+from .repo_utils import acquire_lock, commit_lock, release_lock, get_common_dir
+from .warm_cache import warm_cached
+
+# Branches live in two places, like git's refs/heads and packed-refs:
+# - .pig/refs/heads/<branch>: one small "loose" file per branch, updated with lock-and-rename
+# - .pig/BRANCH_HEADS.json: a packed snapshot of every branch, read in bulk
+# A loose ref always wins over the packed one; pack_refs folds loose refs back into the snapshot.
+
+def get_packed_refs_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "BRANCH_HEADS.json"
+
+def get_loose_refs_dir(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "refs" / "heads"
+
+def get_loose_ref_path(pig_root: Path, branch_name: str) -> Path:
+    # branch names can contain "/" so they are quoted to keep the directory flat
+    return get_loose_refs_dir(pig_root) / quote(branch_name, safe="")
+
+@warm_cached("packed-refs", copy=dict)
+def read_packed_refs(pig_root: Path) -> BranchInfo:
+    packed_refs_path = get_packed_refs_path(pig_root)
+    if not packed_refs_path.exists():
+        return {}
+    return json.loads(packed_refs_path.read_text())
+
+@warm_cached("loose-refs", copy=dict)
+def read_loose_refs(pig_root: Path) -> BranchInfo:
+    loose_refs_dir = get_loose_refs_dir(pig_root)
+    if not loose_refs_dir.exists():
+        return {}
+    loose_refs: BranchInfo = {}
+    with os.scandir(loose_refs_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".lock"):
+                continue
+            loose_refs[unquote(entry.name)] = Path(entry.path).read_text().strip()
+    return loose_refs
+
+def get_branch_heads(pig_root: Path) -> BranchInfo:
+    # when everything is packed the loose directory is empty and this is a single file read
+    branch_heads = read_packed_refs(pig_root)
+    branch_heads.update(read_loose_refs(pig_root))
+    return branch_heads
+
+def get_branch_head(pig_root: Path, branch_name: str) -> str | None:
+    loose_ref_path = get_loose_ref_path(pig_root, branch_name)
+    if loose_ref_path.exists():
+        return loose_ref_path.read_text().strip()
+    return read_packed_refs(pig_root).get(branch_name)
+
+def update_branch_head(pig_root: Path, branch_name: str, new_commit_hash: str, old_commit_hash: str | None = None) -> None:
+    # old_commit_hash turns the update into a compare-and-swap so concurrent updates are not lost
+    loose_ref_path = get_loose_ref_path(pig_root, branch_name)
+    loose_ref_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = acquire_lock(loose_ref_path)
+    try:
+        if old_commit_hash is not None and get_branch_head(pig_root, branch_name) != old_commit_hash:
+            raise PigError(f"branch '{branch_name}' was updated by another process")
+        commit_lock(lock_path, loose_ref_path, new_commit_hash)
+    except BaseException:
+        release_lock(lock_path)
+        raise
+
+def write_packed_refs(pig_root: Path, update: dict[str, str | None]) -> None:
+    # applies update to the packed snapshot; a value of None removes the branch
+    packed_refs_path = get_packed_refs_path(pig_root)
+    lock_path = acquire_lock(packed_refs_path)
+    try:
+        packed_refs = read_packed_refs(pig_root)
+        for branch_name, commit_hash in update.items():
+            if commit_hash is None:
+                packed_refs.pop(branch_name, None)
+            else:
+                packed_refs[branch_name] = commit_hash
+        commit_lock(lock_path, packed_refs_path, json.dumps(packed_refs, indent=4))
+    except BaseException:
+        release_lock(lock_path)
+        raise
+
+def delete_branch_head(pig_root: Path, branch_name: str) -> None:
+    loose_ref_path = get_loose_ref_path(pig_root, branch_name)
+    # the lock is taken even when the branch is only packed, so refs/heads may not exist yet
+    loose_ref_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_path = acquire_lock(loose_ref_path)
+    try:
+        # drop the packed entry first so the old value can't reappear once the loose file is gone
+        if branch_name in read_packed_refs(pig_root):
+            write_packed_refs(pig_root, {branch_name: None})
+        loose_ref_path.unlink(missing_ok=True)
+    finally:
+        release_lock(lock_path)
+
+def pack_refs(pig_root: Path) -> int:
+    # returns the number of loose refs folded into the packed snapshot
+    loose_refs = read_loose_refs(pig_root)
+    if not loose_refs:
+        return 0
+    write_packed_refs(pig_root, dict(loose_refs))
+    for branch_name, commit_hash in loose_refs.items():
+        loose_ref_path = get_loose_ref_path(pig_root, branch_name)
+        try:
+            lock_path = acquire_lock(loose_ref_path)
+        except PigError:
+            continue    # being updated right now; it stays loose until the next pack
+        try:
+            if loose_ref_path.exists() and loose_ref_path.read_text().strip() == commit_hash:
+                loose_ref_path.unlink()
+        finally:
+            release_lock(lock_path)
+    return len(loose_refs)
+
+def update_branch_heads_packed(pig_root: Path, branch_heads: dict[str, str]) -> None:
+    # sets many branches with a single write of the packed snapshot, for bulk imports;
+    # loose files for those branches would shadow the new values, so they are removed
+    write_packed_refs(pig_root, dict(branch_heads))
+    for branch_name in branch_heads.keys() & read_loose_refs(pig_root).keys():
+        loose_ref_path = get_loose_ref_path(pig_root, branch_name)
+        lock_path = acquire_lock(loose_ref_path)
+        try:
+            loose_ref_path.unlink(missing_ok=True)
+        finally:
+            release_lock(lock_path)
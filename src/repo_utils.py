@@ -1,8 +1,13 @@
 from pathlib import Path
+import os
+import sys
+import json
 from .errors import PigError
 from .models import HeadInfo
+from .warm_cache import warm_cached
 
-def find_pig_root_dir(start: Path = Path.cwd()) -> Path | None:
+def find_pig_root_dir(start: Path | None = None) -> Path | None:
+    start = start or Path.cwd()     # not a default argument, which would be fixed at import time
     for directory in [start] + list(start.parents):
         if (directory / ".pig").is_dir():
             return directory
@@ -10,9 +15,89 @@ def find_pig_root_dir(start: Path = Path.cwd()) -> Path | None:
             return None
     return None
 
+# A repository can have extra working trees (`pig worktree add`). Each one has its own .pig
+# directory with the state of that working tree: HEAD, the staging area, the stat cache, the
+# sparse-checkout cone and checkout/merge scratch space. Its .pig/commondir holds the path of the
+# main repository's .pig directory, which keeps everything shared: objects, commits, refs, the
+# commit graph, config and the list of linked worktrees in .pig/worktrees.
+
+@warm_cached("common-dir", always=True)
+def get_common_dir(pig_root: Path) -> Path:
+    # looked up for every object and commit path, so it is only read once per process
+    commondir_path = pig_root / ".pig" / "commondir"
+    if not commondir_path.exists():
+        return pig_root / ".pig"
+    return Path(commondir_path.read_text().strip())
+
+def get_main_worktree_root(pig_root: Path) -> Path:
+    return get_common_dir(pig_root).parent
+
+def get_worktrees_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "worktrees"
+
+def read_worktrees(pig_root: Path) -> list[Path]:
+    # the linked worktrees, one path per line, including any whose directory has since been deleted
+    worktrees_path = get_worktrees_path(pig_root)
+    if not worktrees_path.exists():
+        return []
+    return [Path(line.strip()) for line in worktrees_path.read_text().splitlines() if line.strip()]
+
+def write_worktrees(pig_root: Path, worktree_roots: list[Path]) -> None:
+    write_file_atomically(get_worktrees_path(pig_root), "".join(f"{worktree_root}\n" for worktree_root in worktree_roots))
+
+def get_worktree_roots(pig_root: Path) -> list[Path]:
+    # the main working tree first, then every linked one that still exists
+    return [get_main_worktree_root(pig_root)] + [worktree_root for worktree_root in read_worktrees(pig_root) if (worktree_root / ".pig").is_dir()]
+
+def get_sharded_path(directory: Path, name: str) -> Path:
+    # fan out into two-character subdirectories like git's objects/ab/cdef...
+    return directory / name[:2] / name[2:]
+
+def acquire_lock(path: Path) -> Path:
+    # the lock file doubles as the staging file for the new content, like git's "<ref>.lock"
+    lock_path = path.with_name(path.name + ".lock")
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        raise PigError(f"unable to lock {path}: {lock_path.name} exists; another pig process may be running, otherwise remove it")
+    os.close(fd)
+    return lock_path
+
+def commit_lock(lock_path: Path, path: Path, content: str) -> None:
+    lock_path.write_text(content)
+    os.replace(lock_path, path)
+
+def release_lock(lock_path: Path) -> None:
+    lock_path.unlink(missing_ok=True)
+
+def write_file_atomically(path: Path, content: str) -> None:
+    lock_path = acquire_lock(path)
+    try:
+        commit_lock(lock_path, path, content)
+    except BaseException:
+        release_lock(lock_path)
+        raise
+
+def append_lines_atomically(path: Path, content: str) -> None:
+    # for line-per-entry index files whose readers skip a last line without its newline:
+    # a torn line left by an append that crashed part-way is cut off before the new lines go on
+    lock_path = acquire_lock(path)
+    try:
+        with open(path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b"\n") + 1)
+            f.write(content.encode())
+    finally:
+        release_lock(lock_path)
+
 def get_head_path(pig_root: Path) -> Path:
     return pig_root / ".pig" / "HEAD"
 
+@warm_cached("head")
 def get_head_info(pig_root: Path) -> HeadInfo:
     head_path = get_head_path(pig_root)
     if not head_path.exists():
@@ -27,4 +112,24 @@ def get_head_info(pig_root: Path) -> HeadInfo:
 
 def update_head(pig_root: Path, new_head_info: HeadInfo) -> None:
     head_path = get_head_path(pig_root)
-    head_path.write_text(new_head_info.type + ": " + new_head_info.value)
+    write_file_atomically(head_path, new_head_info.type + ": " + new_head_info.value)
+
+def get_pig_command(*args: str) -> list[str]:
+    # runs pig in a new process with the same interpreter
+    main_path = Path(__file__).resolve().parent.parent / "main.py"
+    return [sys.executable, str(main_path), *args]
+
+def get_config_path(pig_root: Path) -> Path:
+    return get_common_dir(pig_root) / "config"
+
+@warm_cached("config", copy=dict)
+def read_config(pig_root: Path) -> dict:
+    config_path = get_config_path(pig_root)
+    if not config_path.exists():
+        return {}
+    return json.loads(config_path.read_text())
+
+def update_config(pig_root: Path, update: dict) -> None:
+    config = read_config(pig_root)
+    config.update(update)
+    write_file_atomically(get_config_path(pig_root), json.dumps(config, indent=4))
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+# Sparse checkout in the style of git's cone mode: .pig/sparse-checkout lists one directory
+# per line, and only files inside one of them (plus files at the top level of the repository)
+# are written to the working tree. Commits are unaffected, they still carry every file.
+
+def get_sparse_checkout_path(pig_root: Path) -> Path:
+    return pig_root / ".pig" / "sparse-checkout"
+
+def normalize_prefix(prefix: str) -> str:
+    return Path(prefix).as_posix().strip("/")
+
+def read_sparse_prefixes(pig_root: Path) -> list[str] | None:
+    # None means sparse checkout is disabled and every file is checked out
+    sparse_checkout_path = get_sparse_checkout_path(pig_root)
+    if not sparse_checkout_path.exists():
+        return None
+    return [line for line in sparse_checkout_path.read_text().splitlines() if line]
+
+def write_sparse_prefixes(pig_root: Path, prefixes: list[str] | None) -> None:
+    sparse_checkout_path = get_sparse_checkout_path(pig_root)
+    if prefixes is None:
+        sparse_checkout_path.unlink(missing_ok=True)
+        return
+    sparse_checkout_path.write_text("".join(prefix + "\n" for prefix in sorted(set(prefixes))))
+
+def in_sparse_cone(filepath: str, prefixes: list[str] | None) -> bool:
+    if prefixes is None or "/" not in filepath:
+        return True
+    return any(prefix == "" or filepath == prefix or filepath.startswith(prefix + "/") for prefix in prefixes)
@@ -1,18 +1,111 @@
 from pathlib import Path
 import json
+import os
+from typing import Iterable
+from .errors import PigError
 from .models import StagingInfo, StagingFileInfo
+from .repo_utils import acquire_lock, commit_lock, release_lock, write_file_atomically
+from .warm_cache import warm_cached
+
+# The staging area is an append-only journal, .pig/staging.log, with one compact JSON array per line:
+#   [path, status, hash, lastEdited]    stage path
+#   [path]                              unstage path
+# and later lines winning. Staging a file appends a line instead of rewriting every entry, and
+# reading replays the lines into entries without validating each one (they were valid when written).
+# Once superseded lines clearly outnumber live entries, a read rewrites the journal with just the
+# live ones. Repositories from before the journal keep their .pig/staging.json until the next write.
+
+COMPACTION_MIN_RECORDS = 256
 
 def get_staging_path(pig_root: Path) -> Path:
+    return pig_root / ".pig" / "staging.log"
+
+def get_legacy_staging_path(pig_root: Path) -> Path:
     return pig_root / ".pig" / "staging.json"
 
-def get_staging_info(pig_root: Path) -> StagingInfo:
-    staging_path = get_staging_path(pig_root)
-    if not staging_path.exists():
+def format_staging_record(filepath: str, info: StagingFileInfo | None) -> str:
+    record = [filepath] if info is None else [filepath, info.status, info.hash, info.lastEdited]
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def format_staging_records(info: StagingInfo) -> str:
+    return "".join(format_staging_record(filepath, file_staging_info) for filepath, file_staging_info in info.items())
+
+def read_legacy_staging_info(pig_root: Path) -> StagingInfo:
+    legacy_staging_path = get_legacy_staging_path(pig_root)
+    if not legacy_staging_path.exists():
         return {}
-    data = json.loads(staging_path.read_text())
+    data = json.loads(legacy_staging_path.read_text())
     return {k: StagingFileInfo(**v) for k, v in data.items()}
 
-def update_staging_info(pig_root: Path, info: StagingInfo):
+def read_staging_log(pig_root: Path) -> tuple[StagingInfo, int]:
+    # returns the live entries and the number of records they were replayed from
+    staging_path = get_staging_path(pig_root)
+    if not staging_path.exists():
+        return read_legacy_staging_info(pig_root), 0
+    info: StagingInfo = {}
+    record_count = 0
+    with open(staging_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue    # torn by a write that was interrupted
+            record_count += 1
+            if len(record) == 1:
+                info.pop(record[0], None)
+            else:
+                filepath, status, file_hash, last_edited = record
+                info[filepath] = StagingFileInfo.model_construct(status=status, hash=file_hash, lastEdited=last_edited)
+    return info, record_count
+
+@warm_cached("staging", copy=dict)
+def get_staging_info(pig_root: Path) -> StagingInfo:
+    info, record_count = read_staging_log(pig_root)
+    if record_count > max(COMPACTION_MIN_RECORDS, 2 * len(info)):
+        compact_staging_log(pig_root)
+    return info
+
+def compact_staging_log(pig_root: Path) -> None:
+    staging_path = get_staging_path(pig_root)
+    try:
+        lock_path = acquire_lock(staging_path)
+    except PigError:
+        return      # someone else is writing; they or a later read can compact instead
+    try:
+        info, _ = read_staging_log(pig_root)     # again, now that nothing can append
+        commit_lock(lock_path, staging_path, format_staging_records(info))
+    except BaseException:
+        release_lock(lock_path)
+        raise
+
+def append_staging_records(pig_root: Path, records: str) -> None:
     staging_path = get_staging_path(pig_root)
-    info_dict = {k: v.model_dump() if hasattr(v, 'model_dump') else v for k, v in info.items()}
-    staging_path.write_text(json.dumps(info_dict, indent=4))
\ No newline at end of file
+    lock_path = acquire_lock(staging_path)
+    try:
+        if not staging_path.exists():
+            # the first write after an upgrade carries the old staging.json entries over
+            records = format_staging_records(read_legacy_staging_info(pig_root)) + records
+        with open(staging_path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    records = "\n" + records     # ends the torn record so it can't swallow the first new one
+            f.write(records.encode("utf-8"))
+    finally:
+        release_lock(lock_path)
+    get_legacy_staging_path(pig_root).unlink(missing_ok=True)
+
+def stage_files(pig_root: Path, info: StagingInfo) -> None:
+    if info:
+        append_staging_records(pig_root, format_staging_records(info))
+
+def unstage_files(pig_root: Path, filepaths: Iterable[str]) -> None:
+    records = "".join(format_staging_record(filepath, None) for filepath in filepaths)
+    if records:
+        append_staging_records(pig_root, records)
+
+def update_staging_info(pig_root: Path, info: StagingInfo):
+    # replaces the whole staging area, e.g. with {} after a commit
+    write_file_atomically(get_staging_path(pig_root), format_staging_records(info))
+    get_legacy_staging_path(pig_root).unlink(missing_ok=True)
@@ -0,0 +1,74 @@
+from pathlib import Path
+import json
+import os
+import stat
+from typing import Iterable
+from .errors import PigError
+from .file_helpers import get_file_hash
+from .repo_utils import acquire_lock, commit_lock, release_lock
+from .tracing import traced
+from .warm_cache import warm_cached
+
+# Remembers the hash of each working tree file together with its mtime and size, so files
+# that haven't been touched since they were last hashed don't have to be read again.
+# Stored as {path: [mtime_ns, size, hash]} in .pig/stat-cache.json.
+# Like git's "racily clean" index entries, a file whose mtime is not older than the moment the
+# cache is written could still change without its mtime moving, so its size is written as -1
+# and it is hashed again until a later write records it with an older mtime.
+
+RACILY_CLEAN_SIZE = -1
+
+def get_stat_cache_path(pig_root: Path) -> Path:
+    return pig_root / ".pig" / "stat-cache.json"
+
+@warm_cached("stat-cache", copy=dict)
+def read_stat_cache(pig_root: Path) -> dict[str, list]:
+    stat_cache_path = get_stat_cache_path(pig_root)
+    if not stat_cache_path.exists():
+        return {}
+    return json.loads(stat_cache_path.read_text())
+
+def write_stat_cache(pig_root: Path, cache: dict[str, list]) -> None:
+    stat_cache_path = get_stat_cache_path(pig_root)
+    try:
+        lock_path = acquire_lock(stat_cache_path)
+    except PigError:
+        return      # another process is writing it; the files are just hashed again next time
+    try:
+        # the new lock file's mtime is the filesystem's idea of "now", at the same granularity as the files'
+        written_ns = lock_path.stat().st_mtime_ns
+        cache = {
+            filepath: [mtime_ns, RACILY_CLEAN_SIZE if mtime_ns >= written_ns else size, file_hash]
+            for filepath, (mtime_ns, size, file_hash) in cache.items()
+        }
+        commit_lock(lock_path, stat_cache_path, json.dumps(cache, separators=(",", ":")))
+    except BaseException:
+        release_lock(lock_path)
+        raise
+
+@traced("get_worktree_hashes")
+def get_worktree_hashes(pig_root: Path, filepaths: Iterable[str]) -> dict[str, str]:
+    # returns path -> hash for the given paths that exist as regular files in the working tree
+    cache = read_stat_cache(pig_root)
+    hashes: dict[str, str] = {}
+    cache_changed = False
+    for filepath in filepaths:
+        try:
+            file_stat = os.stat(pig_root / filepath)
+        except (FileNotFoundError, NotADirectoryError):
+            # a parent directory replaced by a file means the path is gone too
+            cache_changed |= cache.pop(filepath, None) is not None
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            continue
+        entry = cache.get(filepath)
+        if entry is not None and entry[0] == file_stat.st_mtime_ns and entry[1] == file_stat.st_size:
+            hashes[filepath] = entry[2]
+            continue
+        file_hash = get_file_hash(pig_root, pig_root / filepath)
+        cache[filepath] = [file_stat.st_mtime_ns, file_stat.st_size, file_hash]
+        cache_changed = True
+        hashes[filepath] = file_hash
+    if cache_changed:
+        write_stat_cache(pig_root, cache)
+    return hashes
@@ -0,0 +1,144 @@
+from pathlib import Path
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, TypeVar, cast
+
+# Optional timing of nested spans, enabled with `pig --trace <command>` or PIG_TRACE=1 (or
+# PIG_TRACE=<file>). Instrumented code wraps its work in `with span("name") as s:` and can attach
+# counts such as `s.add(bytes=n)`. While tracing is off, span() hands back one shared no-op object,
+# so the cost is a function call. At exit the spans are written as Chrome trace-event JSON (open it
+# in chrome://tracing or https://ui.perfetto.dev) and summarized per span name on stderr.
+
+TRACE_ENV_VAR = "PIG_TRACE"
+DEFAULT_TRACE_FILENAME = "pig-trace.json"
+
+F = TypeVar("F", bound=Callable)
+
+class NullSpan:
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def add(self, **counts: int) -> None:
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    def __init__(self, tracer: "Tracer", name: str, args: dict) -> None:
+        self._tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+        self.child_time = 0.0
+
+    def __enter__(self) -> "Span":
+        self._tracer.get_stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        stack = self._tracer.get_stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += end - self.start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self._tracer.record(self, end)
+
+    def add(self, **counts: int) -> None:
+        for key, value in counts.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+class Tracer:
+    def __init__(self, output_path: Path) -> None:
+        self.output_path = output_path
+        self._origin = time.perf_counter()
+        self._local = threading.local()     # each thread nests its own spans
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        self._totals: dict[str, list[float]] = {}   # name -> [count, total seconds, self seconds, bytes]
+
+    def get_stack(self) -> list[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def record(self, span: Span, end: float) -> None:
+        duration = end - span.start
+        event = {
+            "name": span.name,
+            "cat": "pig",
+            "ph": "X",
+            "ts": round((span.start - self._origin) * 1e6, 3),
+            "dur": round(duration * 1e6, 3),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": span.args,
+        }
+        with self._lock:
+            self._events.append(event)
+            totals = self._totals.setdefault(span.name, [0, 0.0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += duration - span.child_time
+            totals[3] += span.args.get("bytes", 0)
+
+    def write(self) -> None:
+        with self._lock:
+            events = sorted(self._events, key=lambda event: event["ts"])
+        with open(self.output_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def print_summary(self, file=sys.stderr) -> None:
+        # sorted by self time, i.e. time not spent in a nested span, which is where the work actually happened
+        print(f"{'span':<28} {'count':>8} {'total ms':>10} {'self ms':>10} {'MiB':>9}", file=file)
+        for name, (count, total, self_time, byte_count) in sorted(self._totals.items(), key=lambda item: -item[1][2]):
+            print(f"{name:<28} {count:>8} {total * 1000:>10.1f} {self_time * 1000:>10.1f} {byte_count / 1024 / 1024:>9.2f}", file=file)
+        print(f"trace written to {self.output_path}", file=file)
+
+_tracer: Tracer | None = None
+
+def span(name: str, **args) -> Span | NullSpan:
+    if _tracer is None:
+        return NULL_SPAN
+    return Span(_tracer, name, args)
+
+def traced(name: str) -> Callable[[F], F]:
+    # decorator form of span() for functions that are timed as a whole
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with Span(_tracer, name, {}):
+                return func(*args, **kwargs)
+        return cast(F, wrapper)
+    return decorator
+
+def get_trace_output_path(flag_enabled: bool) -> Path | None:
+    # PIG_TRACE=1 (or the --trace flag) writes pig-trace.json in the current directory; any other value is the path to write
+    env_value = os.environ.get(TRACE_ENV_VAR, "")
+    if env_value in ("", "0"):
+        return Path(DEFAULT_TRACE_FILENAME) if flag_enabled else None
+    return Path(DEFAULT_TRACE_FILENAME) if env_value == "1" else Path(env_value)
+
+def start_tracing(output_path: Path) -> None:
+    global _tracer
+    _tracer = Tracer(output_path)
+
+def stop_tracing() -> None:
+    global _tracer
+    if _tracer is None:
+        return
+    tracer, _tracer = _tracer, None
+    tracer.write()
+    tracer.print_summary()
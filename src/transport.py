@@ -0,0 +1,314 @@
+from pathlib import Path
+import heapq
+import json
+import os
+import subprocess
+import sys
+from typing import BinaryIO
+from urllib.parse import quote, unquote
+from .errors import PigError
+from .models import CommitInfo
+from .repo_utils import get_head_info, read_config, get_pig_command
+from .commit_helpers import get_commit_path
+from .commit_graph import CommitGraph
+from .file_helpers import get_object_path, find_object_path
+from .hashing import get_hash_algorithm
+from .graph_utils import find_missing_commits, find_merge_base
+from .refs import get_branch_heads, update_branch_head
+
+# Moves history between repositories the way git's smart protocol does, with the other side
+# running as `main.py upload-pack <repo>` (for fetch) or `main.py receive-pack <repo>` (for push)
+# talking over its stdin and stdout:
+#
+#   server: "ref <branch> <hash>" for every branch, "head branch|commit <value>", "end"
+#   fetch:  client "want <hash>"..., then rounds of up to HAVE_BATCH_SIZE "have <hash>" + "flush",
+#           each answered by "ack <hash>" for the ones the server has + "flush"; finally "done"
+#   push:   client "update <branch> <old hash or -> <new hash> [force]"..., "flush"
+#
+# followed by a bundle of every missing object and then every missing commit, each record being a
+# "object|commit <hash> <size>" line and that many raw bytes (objects stay gzip-compressed), and "end".
+# A push is answered with "ok <branch>" or "ng <branch> <reason>" per update and "end". Either side
+# can send "error <message>" instead of the next line. Branch names are url-quoted like loose refs.
+
+HAVE_BATCH_SIZE = 32
+MAX_HAVES = 1024    # past this the server just sends a bit more than needed
+
+def write_line(out: BinaryIO, line: str) -> None:
+    out.write(line.encode() + b"\n")
+
+def read_line(inp: BinaryIO) -> str:
+    line = inp.readline()
+    if not line:
+        raise PigError("the remote end hung up unexpectedly")
+    text = line.decode().rstrip("\n")
+    if text.startswith("error "):
+        raise PigError(f"remote: {text[6:]}")
+    return text
+
+def resolve_remote(pig_root: Path | None, remote: str) -> Path:
+    # a remote name from .pig/config or the path of another repository
+    remotes = read_config(pig_root).get("remotes", {}) if pig_root is not None else {}
+    remote_root = Path(remotes.get(remote, remote)).resolve()
+    if not (remote_root / ".pig").is_dir():
+        raise PigError(f"'{remote}' is not a pig repository or a configured remote")
+    return remote_root
+
+def advertise_refs(pig_root: Path, out: BinaryIO) -> None:
+    for branch_name, commit_hash in sorted(get_branch_heads(pig_root).items()):
+        write_line(out, f"ref {quote(branch_name, safe='')} {commit_hash}")
+    head_info = get_head_info(pig_root)
+    write_line(out, f"head {head_info.type} {quote(head_info.value, safe='')}")
+    write_line(out, "end")
+    out.flush()
+
+def read_ref_advertisement(inp: BinaryIO) -> tuple[dict[str, str], tuple[str, str]]:
+    # returns (branch -> hash, (head type, head value))
+    refs: dict[str, str] = {}
+    head = ("branch", "main")
+    while (line := read_line(inp)) != "end":
+        kind, first, second = line.split(" ")
+        if kind == "ref":
+            refs[unquote(first)] = second
+        elif kind == "head":
+            head = (first, unquote(second))
+    return refs, head
+
+def has_commit(pig_root: Path, commit_hash: str) -> bool:
+    return get_commit_path(pig_root, commit_hash).exists()
+
+def get_objects_for_commits(pig_root: Path, commit_hashes: list[str]) -> list[str]:
+    # every object a commit introduced relative to its first parent; anything else is already on the
+    # receiving side through the parent (either it's sent too, or the receiver has it already)
+    object_hashes: dict[str, None] = {}
+    for commit_hash in commit_hashes:
+        commit_data = json.loads(get_commit_path(pig_root, commit_hash).read_bytes())
+        parent_files = {}
+        if commit_data["parentCommits"]:
+            parent_files = json.loads(get_commit_path(pig_root, commit_data["parentCommits"][0]).read_bytes())["files"]
+        for filepath, file_info in commit_data["files"].items():
+            parent_file_info = parent_files.get(filepath)
+            if parent_file_info is None or parent_file_info["hash"] != file_info["hash"]:
+                object_hashes[file_info["hash"]] = None
+    return list(object_hashes)
+
+def write_record(out: BinaryIO, kind: str, name: str, path: Path) -> None:
+    content = path.read_bytes()
+    write_line(out, f"{kind} {name} {len(content)}")
+    out.write(content)
+
+def send_bundle(pig_root: Path, commit_hashes: list[str], out: BinaryIO) -> None:
+    # objects go first so a receiver that stops halfway never has a commit without its files
+    for file_hash in get_objects_for_commits(pig_root, commit_hashes):
+        object_path = find_object_path(pig_root, file_hash)
+        if object_path is None:
+            raise PigError(f"compressed file {file_hash} does not exist")
+        write_record(out, "object", file_hash, object_path)
+    for commit_hash in commit_hashes:
+        write_record(out, "commit", commit_hash, get_commit_path(pig_root, commit_hash))
+    write_line(out, "end")
+    out.flush()
+
+def store_received_file(dest_path: Path, content: bytes) -> None:
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest_path.with_name(dest_path.name + ".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, dest_path)
+
+def receive_bundle(pig_root: Path, inp: BinaryIO) -> list[str]:
+    # stores every record and adds the new commits to the commit graph; returns the new commit hashes
+    received_commits = []
+    while (line := read_line(inp)) != "end":
+        kind, name, size = line.split(" ")
+        content = inp.read(int(size))
+        if len(content) != int(size):
+            raise PigError("the remote end hung up in the middle of a bundle")
+        if kind == "object":
+            if find_object_path(pig_root, name) is None:
+                store_received_file(get_object_path(pig_root, name), content)
+        elif kind == "commit":
+            if not has_commit(pig_root, name):
+                store_received_file(get_commit_path(pig_root, name), content)
+                received_commits.append(name)
+        else:
+            raise PigError(f"unexpected bundle record '{kind}'")
+    commit_graph = CommitGraph(pig_root)
+    for commit_hash in received_commits:    # parents always come before their children
+        if commit_hash not in commit_graph:
+            commit_info = CommitInfo(**json.loads(get_commit_path(pig_root, commit_hash).read_bytes()))
+            commit_graph.add(commit_hash, commit_info)
+    commit_graph.flush()
+    return received_commits
+
+def send_haves(pig_root: Path, local_tips: set[str], remote_refs: dict[str, str], inp: BinaryIO, out: BinaryIO) -> None:
+    # walks local history newest generation first, offering commits in batches; once the server
+    # acknowledges one, its ancestors are known to be shared too and are no longer offered
+    commit_graph = CommitGraph(pig_root)
+    common: set[str] = set()
+    # remote branches we already have are certainly shared, so they are offered first
+    offered_first = [commit_hash for commit_hash in remote_refs.values() if has_commit(pig_root, commit_hash)]
+    queued: set[str] = set()
+    heap: list[tuple[int, str]] = []
+    for commit_hash in local_tips | set(offered_first):
+        queued.add(commit_hash)
+        heapq.heappush(heap, (-commit_graph.generation(commit_hash), commit_hash))
+    uncommon_queued = len(queued)
+    haves_sent = 0
+
+    def mark_common(commit_hash: str) -> None:
+        nonlocal uncommon_queued
+        if commit_hash not in common:
+            common.add(commit_hash)
+            if commit_hash in queued:
+                uncommon_queued -= 1
+
+    while uncommon_queued and haves_sent < MAX_HAVES:
+        batch = [commit_hash for commit_hash in offered_first if commit_hash not in common]
+        offered_first = []
+        while heap and uncommon_queued and len(batch) < HAVE_BATCH_SIZE:
+            _, commit_hash = heapq.heappop(heap)
+            queued.discard(commit_hash)
+            is_common = commit_hash in common
+            if not is_common:
+                uncommon_queued -= 1
+                if commit_hash not in batch:
+                    batch.append(commit_hash)
+            for parent_hash in commit_graph.parents(commit_hash):
+                if is_common:
+                    mark_common(parent_hash)
+                if parent_hash not in queued and parent_hash not in common:
+                    queued.add(parent_hash)
+                    heapq.heappush(heap, (-commit_graph.generation(parent_hash), parent_hash))
+                    uncommon_queued += 1
+        if not batch:
+            break
+        for commit_hash in batch:
+            write_line(out, f"have {commit_hash}")
+        write_line(out, "flush")
+        out.flush()
+        haves_sent += len(batch)
+        while (line := read_line(inp)) != "flush":
+            acked_hash = line.split(" ")[1]
+            mark_common(acked_hash)
+            for parent_hash in commit_graph.parents(acked_hash):
+                mark_common(parent_hash)
+    commit_graph.flush()
+    write_line(out, "done")
+    out.flush()
+
+def check_hash_algorithms(pig_root: Path, remote_root: Path) -> None:
+    # objects are named after their hash, so both sides have to agree on what that is
+    local_algorithm, remote_algorithm = get_hash_algorithm(pig_root), get_hash_algorithm(remote_root)
+    if local_algorithm != remote_algorithm:
+        raise PigError(f"the remote uses {remote_algorithm} object names and this repository uses {local_algorithm}; run `pig migrate-hash` in one of them")
+
+def fetch_pack(pig_root: Path, remote_root: Path, local_tips: set[str]) -> tuple[dict[str, str], tuple[str, str], list[str]]:
+    # brings over every commit the remote's branches reach that we don't have;
+    # returns (remote branches, remote HEAD, received commit hashes)
+    check_hash_algorithms(pig_root, remote_root)
+    process = subprocess.Popen(get_pig_command("upload-pack", str(remote_root)), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert process.stdin is not None and process.stdout is not None
+    try:
+        remote_refs, remote_head = read_ref_advertisement(process.stdout)
+        want_commits = {commit_hash for commit_hash in remote_refs.values() if not has_commit(pig_root, commit_hash)}
+        for commit_hash in sorted(want_commits):
+            write_line(process.stdin, f"want {commit_hash}")
+        if want_commits:
+            send_haves(pig_root, local_tips, remote_refs, process.stdout, process.stdin)
+        else:
+            write_line(process.stdin, "done")
+            process.stdin.flush()
+        received_commits = receive_bundle(pig_root, process.stdout)
+    finally:
+        process.stdin.close()
+        process.wait()
+    return remote_refs, remote_head, received_commits
+
+def serve_upload_pack(pig_root: Path, inp: BinaryIO, out: BinaryIO) -> None:
+    advertise_refs(pig_root, out)
+    want_commits: set[str] = set()
+    common_commits: set[str] = set()
+    while (line := read_line(inp)) != "done":
+        kind, _, commit_hash = line.partition(" ")
+        if kind == "want":
+            if not has_commit(pig_root, commit_hash):
+                raise PigError(f"unknown commit {commit_hash} requested")
+            want_commits.add(commit_hash)
+        elif kind == "have":
+            if has_commit(pig_root, commit_hash):
+                common_commits.add(commit_hash)
+                write_line(out, f"ack {commit_hash}")
+        elif kind == "flush":
+            write_line(out, "flush")
+            out.flush()
+    missing_commits = find_missing_commits(CommitGraph(pig_root), want_commits, common_commits) if want_commits else []
+    send_bundle(pig_root, missing_commits, out)
+
+def push_pack(pig_root: Path, remote_root: Path, branch_name: str, force: bool) -> tuple[str | None, str]:
+    # pushes the local branch to the same name on the remote; returns (old remote hash, new hash)
+    check_hash_algorithms(pig_root, remote_root)
+    process = subprocess.Popen(get_pig_command("receive-pack", str(remote_root)), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert process.stdin is not None and process.stdout is not None
+    try:
+        remote_refs, _ = read_ref_advertisement(process.stdout)
+        new_hash = get_branch_heads(pig_root).get(branch_name)
+        if new_hash is None:
+            raise PigError(f"branch '{branch_name}' does not exist")
+        old_hash = remote_refs.get(branch_name)
+        if old_hash is not None and not force:
+            if not has_commit(pig_root, old_hash):
+                raise PigError(f"the remote '{branch_name}' has commits you don't have; fetch them first or use --force")
+            if find_merge_base(pig_root, old_hash, new_hash) != old_hash:
+                raise PigError(f"pushing '{branch_name}' would not be a fast-forward; merge the remote changes first or use --force")
+        # the remote has everything its branches reach, so only what those don't reach is sent
+        have_commits = {commit_hash for commit_hash in remote_refs.values() if has_commit(pig_root, commit_hash)}
+        missing_commits = find_missing_commits(CommitGraph(pig_root), {new_hash}, have_commits)
+        write_line(process.stdin, f"update {quote(branch_name, safe='')} {old_hash or '-'} {new_hash}{' force' if force else ''}")
+        write_line(process.stdin, "flush")
+        send_bundle(pig_root, missing_commits, process.stdin)
+        while (line := read_line(process.stdout)) != "end":
+            if line.startswith("ng "):
+                raise PigError(f"the remote rejected '{branch_name}': {line.split(' ', 2)[2]}")
+    finally:
+        process.stdin.close()
+        process.wait()
+    return old_hash, new_hash
+
+def serve_receive_pack(pig_root: Path, inp: BinaryIO, out: BinaryIO) -> None:
+    advertise_refs(pig_root, out)
+    updates = []
+    while (line := read_line(inp)) != "flush":
+        _, name, old_hash, new_hash, *flags = line.split(" ")
+        updates.append((unquote(name), None if old_hash == "-" else old_hash, new_hash, "force" in flags))
+    receive_bundle(pig_root, inp)
+    head_info = get_head_info(pig_root)
+    for branch_name, old_hash, new_hash, force in updates:
+        if head_info.type == "branch" and head_info.value == branch_name:
+            # like git's receive.denyCurrentBranch, the remote's working tree would silently go stale
+            write_line(out, f"ng {quote(branch_name, safe='')} branch is currently checked out")
+            continue
+        if not has_commit(pig_root, new_hash):
+            write_line(out, f"ng {quote(branch_name, safe='')} missing commit {new_hash}")
+            continue
+        if old_hash is not None and not force and find_merge_base(pig_root, old_hash, new_hash) != old_hash:
+            write_line(out, f"ng {quote(branch_name, safe='')} not a fast-forward")
+            continue
+        try:
+            update_branch_head(pig_root, branch_name, new_hash, old_hash)
+        except PigError as e:
+            write_line(out, f"ng {quote(branch_name, safe='')} {e}")
+            continue
+        write_line(out, f"ok {quote(branch_name, safe='')}")
+    write_line(out, "end")
+    out.flush()
+
+def serve(service: str, pig_root: Path) -> None:
+    # entry point of the server side; errors are sent to the client instead of printed
+    inp, out = sys.stdin.buffer, sys.stdout.buffer
+    try:
+        if service == "upload-pack":
+            serve_upload_pack(pig_root, inp, out)
+        else:
+            serve_receive_pack(pig_root, inp, out)
+    except PigError as e:
+        write_line(out, f"error {e}")
+        out.flush()
@@ -0,0 +1,55 @@
+import functools
+from typing import Callable, Iterable, TypeVar, cast
+
+# In-memory caches for `pig daemon`, which runs many commands in one long-lived process.
+# Outside the daemon they are disabled and every call goes straight to disk. The daemon drops
+# the cached repository state (refs, HEAD, staging, the commit graph...) whenever its watcher sees
+# a file under .pig change. Commits never change once written, so they are only dropped when
+# commit files are deleted, e.g. by gc.
+#
+# Cached values are shared between calls: functions either name a `copy` that callers get instead
+# of the cached value, or return data that callers only read. A namespace marked `always` is cached
+# in every process, for values looked up far too often to read from disk each time and that only
+# change through a command that invalidates them itself.
+
+COMMITS_NAMESPACE = "commits"
+MAX_ENTRIES_PER_NAMESPACE = 4096
+
+F = TypeVar("F", bound=Callable)
+
+_enabled = False
+_caches: dict[str, dict[tuple, object]] = {}
+
+def enable_warm_caches() -> None:
+    global _enabled
+    _enabled = True
+
+def invalidate_commits() -> None:
+    _caches.pop(COMMITS_NAMESPACE, None)
+
+def invalidate(namespace: str) -> None:
+    _caches.pop(namespace, None)
+
+def invalidate_state() -> None:
+    for namespace in list(_caches):
+        if namespace != COMMITS_NAMESPACE:
+            del _caches[namespace]
+
+def warm_cached(namespace: str, copy: Callable | None = None, always: bool = False) -> Callable[[F], F]:
+    # the positional arguments are the cache key, so decorated functions must only be called with those
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args):
+            if not (_enabled or always):
+                return func(*args)
+            cache = _caches.setdefault(namespace, {})
+            if args in cache:
+                value = cache[args]
+            else:
+                value = func(*args)
+                if len(cache) >= MAX_ENTRIES_PER_NAMESPACE:
+                    del cache[next(iter(cache))]    # oldest first
+                cache[args] = value
+            return copy(value) if copy is not None else value
+        return cast(F, wrapper)
+    return decorator
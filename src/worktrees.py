@@ -0,0 +1,69 @@
+from pathlib import Path
+import shutil
+from .errors import PigError
+from .models import HeadInfo
+from .repo_utils import (
+    get_common_dir,
+    get_head_info,
+    get_worktree_roots,
+    read_worktrees,
+    update_head,
+    write_worktrees,
+)
+from .refs import get_branch_head
+from .staging_helpers import get_staging_info, update_staging_info
+from .recreatedirectory import recreate_directory
+
+# `pig worktree add <path> <branch>` checks a branch out into another directory that shares this
+# repository's objects, commits and refs (see repo_utils.get_common_dir). Like git, a branch can only
+# be checked out in one worktree at a time, since committing in one would silently move the files
+# of the other out from under it.
+
+def find_branch_worktree(pig_root: Path, branch_name: str) -> Path | None:
+    # the worktree, this one included, that has branch_name checked out
+    for worktree_root in get_worktree_roots(pig_root):
+        head_info = get_head_info(worktree_root)
+        if head_info.type == "branch" and head_info.value == branch_name:
+            return worktree_root
+    return None
+
+def check_branch_not_checked_out_elsewhere(pig_root: Path, branch_name: str) -> None:
+    worktree_root = find_branch_worktree(pig_root, branch_name)
+    if worktree_root is not None and worktree_root.resolve() != pig_root.resolve():
+        raise PigError(f"branch '{branch_name}' is already checked out at '{worktree_root}'")
+
+def add_worktree(pig_root: Path, worktree_root: Path, branch_name: str, jobs: int | None = None) -> None:
+    worktree_root = worktree_root.resolve()
+    commit_hash = get_branch_head(pig_root, branch_name)
+    if commit_hash is None:
+        raise PigError(f"branch '{branch_name}' does not exist")
+    checked_out_at = find_branch_worktree(pig_root, branch_name)
+    if checked_out_at is not None:
+        raise PigError(f"branch '{branch_name}' is already checked out at '{checked_out_at}'")
+    if worktree_root.exists() and any(worktree_root.iterdir()):
+        raise PigError(f"'{worktree_root}' already exists and is not an empty directory")
+    for existing_root in get_worktree_roots(pig_root):
+        if worktree_root.is_relative_to(existing_root.resolve()):
+            raise PigError(f"'{worktree_root}' is inside the working tree at '{existing_root}'")
+
+    pig_dir = worktree_root / ".pig"
+    pig_dir.mkdir(parents=True)
+    (pig_dir / "commondir").write_text(f"{get_common_dir(pig_root)}\n")
+    update_staging_info(worktree_root, {})
+    update_head(worktree_root, HeadInfo(type="branch", value=branch_name))
+    # registered before the files are written so gc already counts its HEAD if the checkout fails
+    write_worktrees(pig_root, read_worktrees(pig_root) + [worktree_root])
+    recreate_directory(worktree_root, commit_hash, jobs)
+
+def remove_worktree(pig_root: Path, worktree_root: Path, force: bool = False) -> None:
+    worktree_root = worktree_root.resolve()
+    registered = read_worktrees(pig_root)
+    if worktree_root not in registered:
+        raise PigError(f"'{worktree_root}' is not a linked worktree of this repository")
+    if worktree_root == pig_root.resolve():
+        raise PigError("cannot remove the worktree you are in")
+    if (worktree_root / ".pig").is_dir():
+        if get_staging_info(worktree_root) and not force:
+            raise PigError(f"'{worktree_root}' has staged changes; use --force to remove it anyway")
+        shutil.rmtree(worktree_root)
+    write_worktrees(pig_root, [root for root in registered if root != worktree_root])